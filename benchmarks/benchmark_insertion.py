@@ -0,0 +1,164 @@
+"""
+Benchmark the source insertion step of MARTINI.
+
+Run with, for example::
+
+    python benchmarks/benchmark_insertion.py --npart 20000 --npx 64 --nchannels 32
+
+The loop over pixels (``engine="pixel"``) works on the plain arrays cached by
+:meth:`~martini.martini._BaseMartini._unitless_array`. For comparison, the same
+loop is also timed with :mod:`astropy.units` quantities carried through the loop, as
+it was done before the cache was introduced. Both loops are timed over the same pixels
+and should give the same spectra. The kernel integrals themselves are now always
+evaluated on plain arrays, so the comparison understates the overhead that was removed.
+Both insertion engines are then timed for the full data cube, serially and with
+``--ncpu`` threads (and processes, for the pixel engine, if :mod:`multiprocess` is
+installed).
+
+The thread backend gives no speedup with ``engine="pixel"``: most of the time of the
+loop over pixels is spent in short Python and :mod:`numpy` calls for a few particles
+each, during which the global interpreter lock is held, so the threads take turns.
+Use ``backend="process"`` or ``"shared_memory"`` with the pixel engine, and
+``backend="thread"`` with the particle engine.
+
+For example, with ``--npart 5000 --npx 48 --nchannels 32 --ncpu 4`` on a machine
+limited to a single core, the pixel engine took 2.53 s serially, 2.57 s with threads
+and 2.49 s with processes, and the particle engine 0.92 s serially and 0.55 s with
+threads. With one core these numbers show the overhead of each backend, not its
+scaling with the number of cores.
+"""
+
+import argparse
+import time
+from itertools import product
+import numpy as np
+import astropy.units as U
+from martini import DataCube, Martini, demo_source
+from martini.beams import GaussianBeam
+from martini.sph_kernels import CubicSplineKernel
+from martini.spectral_models import GaussianSpectrum
+
+
+def quantity_pixel_loop(m, ij_pxs):
+    """
+    Evaluate pixel spectra with units attached throughout, for comparison.
+
+    Parameters
+    ----------
+    m : ~martini.martini.Martini
+        Initialized Martini instance.
+
+    ij_pxs : list
+        List of 2-tuples specifying the indices (i, j) of pixels in the grid.
+
+    Returns
+    -------
+    out : list
+        List of pixel spectra, each a :class:`~astropy.units.Quantity` with dimensions
+        of Jy/pix^2.
+    """
+    result = list()
+    for ij_px in ij_pxs:
+        ij = np.array(ij_px)[..., np.newaxis] * U.pix
+        mask = m.spatial_index.query(ij_px)
+        weights = m.sph_kernel._px_weight(m.source.pixcoords[:2, mask] - ij, mask=mask)
+        result.append(
+            (m.spectral_model.spectra[mask] * weights[..., np.newaxis]).sum(axis=-2)
+        )
+    return result
+
+
+def main():
+    """
+    Set up a toy source and data cube and time the source insertion.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--npart", type=int, default=20000, help="Number of particles.")
+    parser.add_argument("--npx", type=int, default=64, help="Pixels along each side.")
+    parser.add_argument("--nchannels", type=int, default=32, help="Spectral channels.")
+    parser.add_argument(
+        "--npx-compare",
+        type=int,
+        default=1024,
+        help="Approximate number of pixels used to compare the unitless and quantity"
+        " loops.",
+    )
+    parser.add_argument(
+        "--ncpu", type=int, default=4, help="Processes or threads for parallel runs."
+    )
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    source = demo_source(N=args.npart)
+    datacube = DataCube(
+        n_px_x=args.npx,
+        n_px_y=args.npx,
+        n_channels=args.nchannels,
+        px_size=10.0 * U.arcsec,
+        channel_width=10.0 * U.km * U.s**-1,
+        spectral_centre=source.vsys,
+    )
+    m = Martini(
+        source=source,
+        datacube=datacube,
+        beam=GaussianBeam(bmaj=30.0 * U.arcsec, bmin=30.0 * U.arcsec),
+        noise=None,
+        sph_kernel=CubicSplineKernel(),
+        spectral_model=GaussianSpectrum(sigma=7 * U.km * U.s**-1),
+        quiet=True,
+    )
+    print(
+        f"{m.source.npart} particles, {m._datacube._array.shape[0]}x"
+        f"{m._datacube._array.shape[1]} pixels (incl. padding), "
+        f"{args.nchannels} channels."
+    )
+
+    # compare the per-pixel loop over the same pixels, spread over the cube
+    ij_pxs = list(
+        product(
+            np.arange(m._datacube._array.shape[0]),
+            np.arange(m._datacube._array.shape[1]),
+        )
+    )
+    ij_pxs = ij_pxs[:: max(len(ij_pxs) // args.npx_compare, 1)]
+    t0 = time.perf_counter()
+    quantity_spectra = quantity_pixel_loop(m, ij_pxs)
+    t_quantity = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    unitless_spectra = [
+        spectrum
+        for _, spectrum in m._evaluate_pixel_spectrum((0, ij_pxs), progressbar=False)
+    ]
+    t_unitless = time.perf_counter() - t0
+    assert np.allclose(
+        [s.to_value(U.Jy * U.pix**-2) for s in quantity_spectra], unitless_spectra
+    )
+    print(
+        f"Pixel loop over {len(ij_pxs)} pixels: quantities {t_quantity:.2f} s, "
+        f"unitless {t_unitless:.2f} s (x{t_quantity / t_unitless:.1f})."
+    )
+
+    configurations = [
+        dict(engine="pixel"),
+        dict(engine="pixel", ncpu=args.ncpu, backend="thread"),
+        dict(engine="particle"),
+        dict(engine="particle", ncpu=args.ncpu, backend="thread"),
+    ]
+    try:
+        import multiprocess  # noqa: F401
+    except ImportError:
+        print("multiprocess is not available, skipping backend='process'.")
+    else:
+        configurations.insert(
+            2, dict(engine="pixel", ncpu=args.ncpu, backend="process")
+        )
+    for kwargs in configurations:
+        m.reset()
+        t0 = time.perf_counter()
+        m.insert_source_in_cube(progressbar=False, **kwargs)
+        options = ", ".join(f"{key}={value!r}" for key, value in kwargs.items())
+        print(f"insert_source_in_cube({options}): {time.perf_counter() - t0:.2f} s.")
+
+
+if __name__ == "__main__":
+    main()
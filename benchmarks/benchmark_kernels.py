@@ -0,0 +1,125 @@
+"""
+Benchmark the SPH kernel integrals of MARTINI.
+
+Run with, for example::
+
+    python benchmarks/benchmark_kernels.py --npairs 1000000 --median-h 3
+
+Particle-pixel pairs are drawn as they occur during source insertion: smoothing lengths
+follow a log-normal distribution (as in simulated galaxies, where the dense centre has
+small smoothing lengths and the outskirts large ones) and each pixel lies within the
+support of the kernel of its particle. The :mod:`numpy` kernel integrals are timed
+against the tabulated integrals (``tabulate=True``) and, if :mod:`numba` is
+available, the compiled integrals of :mod:`martini._kernel_accel`.
+"""
+
+import argparse
+import time
+import numpy as np
+from martini import _kernel_accel
+from martini.sph_kernels import (
+    _WendlandC2Kernel,
+    _WendlandC6Kernel,
+    _CubicSplineKernel,
+    _QuarticSplineKernel,
+    _GaussianKernel,
+)
+
+# kernels, and whether each offers a tabulated integral
+kernels = (
+    (_WendlandC2Kernel, True),
+    (_WendlandC6Kernel, True),
+    (_CubicSplineKernel, True),
+    (_QuarticSplineKernel, True),
+    (_GaussianKernel, False),
+)
+
+
+def timed(f, *args, repeat=3):
+    """
+    Time a function call, keeping the best of several calls.
+
+    Parameters
+    ----------
+    f : callable
+        The function to time. Array arguments are copied for each call, since some
+        kernel integrals modify their arguments in place.
+
+    *args : tuple
+        Arguments to pass to the function.
+
+    repeat : int, optional
+        Number of calls. (Default: ``3``)
+
+    Returns
+    -------
+    out : tuple
+        A 2-tuple containing the shortest time taken, in seconds, and the result of
+        the last call.
+    """
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = f(*(arg.copy() for arg in args))
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    """
+    Draw particle-pixel pairs and time the kernel integrals.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--npairs", type=int, default=1000000, help="Number of particle-pixel pairs."
+    )
+    parser.add_argument(
+        "--median-h", type=float, default=3.0, help="Median smoothing length in pixels."
+    )
+    parser.add_argument(
+        "--sigma-lnh",
+        type=float,
+        default=0.7,
+        help="Standard deviation of the natural log of the smoothing lengths.",
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(seed=0)
+    h = args.median_h * np.exp(rng.normal(0, args.sigma_lnh, size=args.npairs))
+    # pixels uniformly distributed over the kernel support
+    dij = rng.uniform(-1, 1, size=(2, args.npairs)) * h
+    print(
+        f"{args.npairs} pairs, smoothing lengths {np.percentile(h, 5):.2f} to "
+        f"{np.percentile(h, 95):.2f} px (5th to 95th percentile)."
+    )
+
+    for kernel, tabulated in kernels:
+        k = kernel()
+        use_compiled = _kernel_accel.use_compiled
+        _kernel_accel.use_compiled = False
+        try:
+            t_numpy, exact = timed(k._kernel_integral, dij, h)
+        finally:
+            _kernel_accel.use_compiled = use_compiled
+        line = f"{kernel.__name__}: numpy {t_numpy:.3f} s"
+        if tabulated:
+            k.tabulate = True
+            k._kernel_table()  # build the table before timing
+            t_table, table_result = timed(k._pixel_integral, dij, h)
+            k.tabulate = False
+            line += (
+                f", tabulated {t_table:.3f} s (x{t_numpy / t_table:.1f}, "
+                f"max. error {np.max(np.abs(table_result - exact) * h**2):.1e})"
+            )
+        if _kernel_accel.use_compiled:
+            k._kernel_integral(dij[:, :1].copy(), h[:1])  # compile before timing
+            t_compiled, compiled_result = timed(k._kernel_integral, dij, h)
+            line += (
+                f", compiled {t_compiled:.3f} s (x{t_numpy / t_compiled:.1f}, "
+                f"max. error {np.max(np.abs(compiled_result - exact) * h**2):.1e})"
+            )
+        print(line + ".")
+
+
+if __name__ == "__main__":
+    main()
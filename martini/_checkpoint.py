@@ -0,0 +1,162 @@
+"""
+Provides :class:`~martini._checkpoint.Checkpoint`, used to save the progress of a long
+source insertion to disk so that it can be resumed if interrupted.
+"""
+
+import os
+import time
+import threading
+import numpy as np
+import astropy.units as U
+
+
+class Checkpoint(object):
+    """
+    Progress of a source insertion, periodically saved to a file.
+
+    The file has the format written by :meth:`~martini.datacube.DataCube.save_state`,
+    with an additional ``"progress"`` dataset: a boolean map over the (padded) pixels
+    of the datacube, ``True`` for pixels whose spectra have been inserted. Each save
+    replaces the previous file atomically, so that an interruption while saving leaves
+    the last complete checkpoint in place. Requires the :mod:`h5py` package.
+
+    The ``"progress"`` dataset also carries a fingerprint of the configuration that
+    wrote it (see :meth:`~martini.martini._BaseMartini._checkpoint_fingerprint`), and
+    a checkpoint file with a different fingerprint is refused when loading.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the checkpoint file.
+
+    interval : float, optional
+        Minimum time between saves, in seconds. (Default: ``600``)
+
+    fingerprint : str, optional
+        Summary of the configuration of the source insertion, stored in the checkpoint
+        file and compared to that of an existing file before resuming.
+        (Default: ``""``)
+    """
+
+    def __init__(self, filename, interval=600, fingerprint=""):
+        self.filename = filename
+        self.interval = interval
+        self.fingerprint = fingerprint
+        self.done = None
+        self._last_saved = None
+        # pixels may be completed by several threads at once
+        self._lock = threading.Lock()
+        return
+
+    def load(self, datacube):
+        """
+        Restore the progress and datacube array from the checkpoint file, if it exists.
+
+        Parameters
+        ----------
+        datacube : ~martini.datacube.DataCube
+            The datacube being filled, its array is overwritten with that saved in the
+            checkpoint file.
+
+        Returns
+        -------
+        out : int
+            Number of pixels already completed.
+        """
+        import h5py
+
+        self.done = np.zeros(datacube._array.shape[:2], dtype=bool)
+        self._last_saved = time.monotonic()
+        if not os.path.exists(self.filename):
+            return 0
+        with h5py.File(self.filename, "r") as f:
+            if (
+                "progress" not in f
+                or f["progress"].attrs.get("fingerprint", None) != self.fingerprint
+            ):
+                raise ValueError(
+                    f"Checkpoint file {self.filename} was written for a different"
+                    " source or configuration, refusing to resume from it."
+                )
+            if f["_array"].shape != datacube._array.shape:
+                raise ValueError(
+                    f"Checkpoint file {self.filename} has an array of shape"
+                    f" {f['_array'].shape}, expected {datacube._array.shape}."
+                )
+            # in rows along the x-axis, directly into the (possibly memory-mapped)
+            # datacube array, avoiding copies of the whole cube in memory
+            array = datacube._array.view(np.ndarray)
+            for i in range(array.shape[0]):
+                f["_array"].read_direct(array, np.s_[i], np.s_[i])
+            factor = U.Unit(f["_array"].attrs["datacube_unit"]).to(datacube._array.unit)
+            if factor != 1:
+                array *= factor
+            self.done[...] = f["progress"][()]
+        return int(np.count_nonzero(self.done))
+
+    def remaining(self, tiles):
+        """
+        Remove the completed pixels from tiles of pixels.
+
+        Parameters
+        ----------
+        tiles : list
+            List of tiles, each a list of 2-tuples specifying the indices (i, j) of
+            pixels.
+
+        Returns
+        -------
+        out : list
+            The tiles with completed pixels removed, omitting empty tiles.
+        """
+        tiles = [[ij_px for ij_px in tile if not self.done[ij_px]] for tile in tiles]
+        return [tile for tile in tiles if len(tile) > 0]
+
+    def update(self, ij_pxs, datacube):
+        """
+        Mark pixels as completed, and save a checkpoint if enough time has passed
+        since the last save.
+
+        Parameters
+        ----------
+        ij_pxs : list
+            List of 2-tuples specifying the indices (i, j) of the completed pixels,
+            whose spectra have already been inserted in the datacube array.
+
+        datacube : ~martini.datacube.DataCube
+            The datacube being filled.
+        """
+        with self._lock:
+            for ij_px in ij_pxs:
+                self.done[ij_px] = True
+            if time.monotonic() - self._last_saved >= self.interval:
+                self.save(datacube)
+        return
+
+    def save(self, datacube):
+        """
+        Write the progress and datacube array to the checkpoint file.
+
+        Parameters
+        ----------
+        datacube : ~martini.datacube.DataCube
+            The datacube being filled.
+        """
+        import h5py
+
+        tmp_filename = self.filename + ".tmp"
+        datacube.save_state(tmp_filename, overwrite=True)
+        with h5py.File(tmp_filename, "a") as f:
+            f["progress"] = self.done
+            f["progress"].attrs["fingerprint"] = self.fingerprint
+        os.replace(tmp_filename, self.filename)
+        self._last_saved = time.monotonic()
+        return
+
+    def remove(self):
+        """
+        Delete the checkpoint file, if it exists.
+        """
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        return
@@ -0,0 +1,25 @@
+import typing as T
+import threading
+from numpy import ndarray
+from martini.datacube import DataCube
+
+class Checkpoint:
+    filename: str
+    interval: float
+    fingerprint: str
+    done: T.Optional[ndarray]
+    _last_saved: T.Optional[float]
+    _lock: threading.Lock
+
+    def __init__(
+        self, filename: str, interval: float = ..., fingerprint: str = ...
+    ) -> None: ...
+    def load(self, datacube: DataCube) -> int: ...
+    def remaining(
+        self, tiles: T.List[T.List[T.Tuple[int, int]]]
+    ) -> T.List[T.List[T.Tuple[int, int]]]: ...
+    def update(
+        self, ij_pxs: T.Sequence[T.Tuple[T.Any, ...]], datacube: DataCube
+    ) -> None: ...
+    def save(self, datacube: DataCube) -> None: ...
+    def remove(self) -> None: ...
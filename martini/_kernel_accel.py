@@ -0,0 +1,416 @@
+"""
+Provides compiled versions of the kernel integrals of :mod:`martini.sph_kernels`.
+
+The kernel integrals are written here for a single particle-pixel pair, so that all
+of the terms of the (often long) expressions are evaluated in one pass over the
+particles, instead of allocating a temporary array for each term as the
+:mod:`numpy` implementations in :mod:`martini.sph_kernels` do. If :mod:`numba` can be
+imported, these functions are compiled into :class:`numpy.ufunc` objects with
+:func:`numba.vectorize` the first time that they are needed, and the kernel classes
+use them in place of their :mod:`numpy` implementations. If :mod:`numba` is not
+available the :mod:`numpy` implementations are used.
+
+The compiled functions can be switched off by setting ``use_compiled`` in this module
+to ``False``, or by setting the environment variable ``MARTINI_NO_NUMBA`` (to any value
+other than ``0``) before :mod:`martini` is imported, in which case :mod:`numba` is not
+imported at all.
+"""
+
+import math
+import os
+
+# opt out of numba entirely, e.g. where importing or compiling with it fails
+_no_numba = os.environ.get("MARTINI_NO_NUMBA", "") not in ("", "0")
+
+if _no_numba:
+    numba = None
+else:
+    try:
+        import numba
+    except ImportError:
+        numba = None
+
+# use compiled kernel integrals, if numba is available
+use_compiled = numba is not None
+
+# compiled kernel integrals, created on first use
+_compiled = dict()
+
+if numba is not None:
+    _jit = numba.njit(cache=True)
+else:
+
+    def _jit(f):
+        """
+        Return the function unchanged, in place of :func:`numba.njit`.
+
+        Parameters
+        ----------
+        f : callable
+            The function.
+
+        Returns
+        -------
+        out : callable
+            The same function.
+        """
+        return f
+
+
+def wendland_c2_integral(dx, dy, h):
+    """
+    Evaluate the integral of the Wendland C2 kernel over a pixel.
+
+    See :meth:`martini.sph_kernels._WendlandC2Kernel._kernel_integral`.
+
+    Parameters
+    ----------
+    dx : float
+        Distance from pixel centre to particle position along the first axis, in
+        pixels.
+
+    dy : float
+        Distance from pixel centre to particle position along the second axis, in
+        pixels.
+
+    h : float
+        Particle smoothing length (FWHM), in pixels.
+
+    Returns
+    -------
+    out : float
+        Approximate kernel integral over the pixel area.
+    """
+    R2 = (dx * dx + dy * dy) / (h * h)
+    if R2 == 0:
+        retval = 2.0 / 3.0
+    elif R2 < 1:
+        A = math.sqrt(1 - R2)
+        retval = 5 * R2 * R2 * (0.5 * R2 + 3) * math.log(
+            (1 + A) / math.sqrt(R2)
+        ) + A * (-27.0 / 2.0 * R2 * R2 - 14.0 / 3.0 * R2 + 2.0 / 3.0)
+    else:
+        retval = 0.0
+    return retval * (21 / 2 / math.pi) / (h * h)
+
+
+@_jit
+def _wendland_c6_indef(R, z):
+    """
+    Evaluate expression involved in the integral of the Wendland C6 kernel.
+
+    Parameters
+    ----------
+    R : float
+        Dimensionless cylindrical radius.
+
+    z : float
+        Dimensionless vertical coordinate.
+
+    Returns
+    -------
+    out : float
+        Result of the expression.
+    """
+    q = math.sqrt(R * R + z * z)
+    L = math.log(q + z)
+    return (
+        -231 * R**10 * z
+        - 385 * R**8 * z**3
+        - 1155 * R**8 * z
+        - 462 * R**6 * z**5
+        - 1540 * R**6 * z**3
+        - 462 * R**6 * z
+        - 330 * R**4 * z**7
+        - 1386 * R**4 * z**5
+        - 462 * R**4 * z**3
+        + 66 * R**4 * z
+        - (128 + 1 / 3) * R**2 * z**9
+        - 660 * R**2 * z**7
+        - 277.2 * R**2 * z**5
+        + 44 * R**2 * z**3
+        + 8 / 3 * z**11 * q
+        + (16 + 4 / 15) * R**2 * z**9 * q
+        + 70.4 * z**9 * q
+        + 360.8 * R**2 * z**7 * q
+        + 132 * z**7 * q
+        + 550 * R**2 * z**5 * q
+        - 11 * R**2 * z
+        + 7.21875 * R**12 * L
+        + 24.7813 * R**10 * z * q
+        + 173.25 * R**10 * L
+        + 530.75 * R**8 * z * q
+        + 288.75 * R**8 * L
+        + 47.4792 * R**8 * z**3 * q
+        + 767.25 * R**6 * z * q
+        + 58.0167 * R**6 * z**5 * q
+        + 819.5 * R**6 * z**3 * q
+        + 41.7 * R**4 * z**7 * q
+        + 752.4 * R**4 * z**5 * q
+        + 896.5 * R**4 * z**3 * q
+        - 21 * z**11
+        - (128 + 1 / 3) * z**9
+        - 66 * z**7
+        + 13.2 * z**5
+        - 11 / 3 * z**3
+        + z
+    )
+
+
+def wendland_c6_integral(dx, dy, h):
+    """
+    Evaluate the integral of the Wendland C6 kernel over a pixel.
+
+    See :meth:`martini.sph_kernels._WendlandC6Kernel._kernel_integral`.
+
+    Parameters
+    ----------
+    dx : float
+        Distance from pixel centre to particle position along the first axis, in
+        pixels.
+
+    dy : float
+        Distance from pixel centre to particle position along the second axis, in
+        pixels.
+
+    h : float
+        Particle smoothing length, in pixels.
+
+    Returns
+    -------
+    out : float
+        Approximate kernel integral over the pixel area.
+    """
+    R = math.sqrt(dx * dx + dy * dy) / h
+    norm = 1365 / 64 / math.pi
+    if R == 0:
+        retval = norm * 2 * (4 / 15)
+    elif R < 1:
+        zmax = math.sqrt(1 - R * R)
+        retval = norm * 2 * (_wendland_c6_indef(R, zmax) - _wendland_c6_indef(R, 0.0))
+    else:
+        retval = 0.0
+    return retval / (h * h)
+
+
+def cubic_spline_integral(dx, dy, h):
+    """
+    Evaluate the integral of the cubic spline kernel over a pixel.
+
+    See :meth:`martini.sph_kernels._CubicSplineKernel._kernel_integral`.
+
+    Parameters
+    ----------
+    dx : float
+        Distance from pixel centre to particle position along the first axis, in
+        pixels.
+
+    dy : float
+        Distance from pixel centre to particle position along the second axis, in
+        pixels.
+
+    h : float
+        Particle smoothing length, in pixels.
+
+    Returns
+    -------
+    out : float
+        Approximate kernel integral over the pixel area.
+    """
+    # distances doubled to change interval from [0, 2) to [0, 1)
+    R2 = 4 * (dx * dx + dy * dy) / (h * h)
+    if R2 == 0:
+        retval = 11.0 / 16.0 + 0.25 * 0.25
+    elif R2 <= 1:
+        A = math.sqrt(1 - R2)
+        B = math.sqrt(4 - R2)
+        I1 = (
+            A
+            - 0.5 * A**3
+            - 1.5 * R2 * A
+            + 3.0 / 32.0 * A * (3 * R2 + 2)
+            + 9.0 / 32.0 * R2 * R2 * (math.log(1 + A) - math.log(math.sqrt(R2)))
+        )
+        I3 = (
+            -B * (3 * R2 + 56) / 4.0
+            + A * (4 * R2 + 50) / 8.0
+            - 3.0 / 8.0 * R2 * (R2 + 16) * math.log((2 + B) / (1 + A))
+            + 2 * (3 * R2 + 4) * (B - A)
+            + 2 * (B**3 - A**3)
+        )
+        retval = I1 + 0.25 * I3
+    elif R2 <= 4:
+        B = math.sqrt(4 - R2)
+        I2 = (
+            -B * (3 * R2 + 56) / 4.0
+            - 3.0 / 8.0 * R2 * (R2 + 16) * math.log((2 + B) / math.sqrt(R2))
+            + 2 * (3 * R2 + 4) * B
+            + 2 * B**3
+        )
+        retval = 0.25 * I2
+    else:
+        retval = 0.0
+    # 1.597 is normalization s.t. kernel integral = 1 for particle mass = 1
+    # rescaling from interval [0, 2) to [0, 1) requires mult. by 4
+    return retval / 1.59689476201133 / (h * h) * 4
+
+
+@_jit
+def _quartic_spline_IA(R, z, A):
+    """
+    Evaluate expression involved in the integral of the quartic spline kernel.
+
+    Parameters
+    ----------
+    R : float
+        Dimensionless cylindrical radius.
+
+    z : float
+        Dimensionless vertical coordinate.
+
+    A : float
+        Dimensionless amplitude.
+
+    Returns
+    -------
+    out : float
+        Result of the expression.
+    """
+    q = math.sqrt(z * z + R * R)
+    R2 = R * R
+    return (
+        A**4 * z
+        - 2 * A**3 * z * q
+        + 2 * A**2 * z * (3 * R2 + z * z)
+        - A * R2 * (4 * A**2 + 3 * R2) * math.asinh(z / R) / 2
+        - A * z * q * (5 * R2 + 2 * z * z) / 2
+        + R2 * R2 * z
+        + 2 * R2 * z**3 / 3
+        + z**5 / 5
+    )
+
+
+def quartic_spline_integral(dx, dy, h):
+    """
+    Evaluate the integral of the quartic spline kernel over a pixel.
+
+    See :meth:`martini.sph_kernels._QuarticSplineKernel._kernel_integral`.
+
+    Parameters
+    ----------
+    dx : float
+        Distance from pixel centre to particle position along the first axis, in
+        pixels.
+
+    dy : float
+        Distance from pixel centre to particle position along the second axis, in
+        pixels.
+
+    h : float
+        Particle smoothing length, in pixels.
+
+    Returns
+    -------
+    out : float
+        Approximate kernel integral over the pixel area.
+    """
+    R = math.sqrt(dx * dx + dy * dy) / h
+    retval = 0.0
+    if R == 0:
+        retval = 384 / 3125
+    else:
+        if R < 0.2:
+            retval += 10 * _quartic_spline_IA(R, math.sqrt(0.2**2 - R * R), 0.2)
+        if R < 0.6:
+            retval -= 5 * _quartic_spline_IA(R, math.sqrt(0.6**2 - R * R), 0.6)
+        if R < 1.0:
+            retval += _quartic_spline_IA(R, math.sqrt(1 - R * R), 1.0)
+    # factor of 2 is because all integrals above are half-intervals
+    return retval * (2 * 15625 / 512 / math.pi) / (h * h)
+
+
+def gaussian_integral(dx, dy, h, truncate, norm):
+    """
+    Evaluate the integral of the truncated Gaussian kernel over a pixel.
+
+    See :meth:`martini.sph_kernels._GaussianKernel._kernel_integral`.
+
+    Parameters
+    ----------
+    dx : float
+        Distance from pixel centre to particle position along the first axis, in
+        pixels.
+
+    dy : float
+        Distance from pixel centre to particle position along the second axis, in
+        pixels.
+
+    h : float
+        Particle smoothing length (FWHM), in pixels.
+
+    truncate : float
+        Number of standard deviations at which the kernel is truncated.
+
+    norm : float
+        Normalization of the truncated kernel.
+
+    Returns
+    -------
+    out : float
+        Kernel integral over the pixel area.
+    """
+    sig = 1 / (2 * math.sqrt(2 * math.log(2)))  # s.t. FWHM = 1
+    dr = math.sqrt(dx * dx + dy * dy)
+    if (dr - math.sqrt(0.5)) / h / sig > truncate:
+        return 0.0
+    q = dr / h / sig
+    zmax = math.sqrt(truncate * truncate - q * q) if truncate > q else 0.0
+    x0 = (dx - 0.5) / h / math.sqrt(2) / sig
+    x1 = (dx + 0.5) / h / math.sqrt(2) / sig
+    y0 = (dy - 0.5) / h / math.sqrt(2) / sig
+    y1 = (dy + 0.5) / h / math.sqrt(2) / sig
+    return (
+        0.25
+        * math.erf(zmax / math.sqrt(2))
+        * (math.erf(x1) - math.erf(x0))
+        * (math.erf(y1) - math.erf(y0))
+        / norm
+    )
+
+
+_integrals = dict(
+    wendland_c2=(wendland_c2_integral, 3),
+    wendland_c6=(wendland_c6_integral, 3),
+    cubic_spline=(cubic_spline_integral, 3),
+    quartic_spline=(quartic_spline_integral, 3),
+    gaussian=(gaussian_integral, 5),
+)
+
+
+def compiled_integral(name):
+    """
+    Get a compiled kernel integral, compiling it on first use.
+
+    Parameters
+    ----------
+    name : str
+        Name of the kernel, one of ``"wendland_c2"``, ``"wendland_c6"``,
+        ``"cubic_spline"``, ``"quartic_spline"`` or ``"gaussian"``.
+
+    Returns
+    -------
+    out : ~numpy.ufunc or None
+        The compiled kernel integral, taking the same arguments as the corresponding
+        function in this module (in single or double precision), or ``None`` if
+        :mod:`numba` is not available or ``use_compiled`` is ``False``.
+    """
+    if not use_compiled or numba is None:
+        return None
+    if name not in _compiled:
+        integral, nargs = _integrals[name]
+        # single precision first, so that float32 inputs are not upcast
+        _compiled[name] = numba.vectorize(
+            [f"{t}(" + ", ".join([t] * nargs) + ")" for t in ("float32", "float64")],
+            cache=True,
+        )(integral)
+    return _compiled[name]
@@ -0,0 +1,24 @@
+import typing as T
+from types import ModuleType
+from numpy import ufunc
+
+_no_numba: bool
+numba: T.Optional[ModuleType]
+use_compiled: bool
+_compiled: T.Dict[str, ufunc]
+
+_jit: T.Callable[[T.Callable], T.Callable]
+
+def wendland_c2_integral(dx: float, dy: float, h: float) -> float: ...
+def _wendland_c6_indef(R: float, z: float) -> float: ...
+def wendland_c6_integral(dx: float, dy: float, h: float) -> float: ...
+def cubic_spline_integral(dx: float, dy: float, h: float) -> float: ...
+def _quartic_spline_IA(R: float, z: float, A: float) -> float: ...
+def quartic_spline_integral(dx: float, dy: float, h: float) -> float: ...
+def gaussian_integral(
+    dx: float, dy: float, h: float, truncate: float, norm: float
+) -> float: ...
+
+_integrals: T.Dict[str, T.Tuple[T.Callable[..., float], int]]
+
+def compiled_integral(name: str) -> T.Optional[ufunc]: ...
@@ -0,0 +1,287 @@
+"""
+Provides the work partitioning and worker functions used for parallel source insertion
+in :meth:`~martini.martini.Martini.insert_source_in_cube`.
+
+The pixels of the datacube are divided into square tiles. The cost of each tile is
+estimated from the number of particles whose footprints overlap it, and the tiles are
+handed out to worker processes from a queue in order of decreasing cost, so that the
+expensive tiles (near the centre of a galaxy) are started first and the cheap tiles
+(in the outskirts) fill in at the end.
+
+The worker processes receive the :class:`~martini.martini.Martini` instance once, when
+they are started, rather than with every tile.
+
+When threads are used for the loop over particles, the datacube is instead divided into
+strips of rows of similar cost, each thread adding the contributions of all particles
+to the pixels in its strip.
+"""
+
+import weakref
+from itertools import product
+import numpy as np
+
+# state of a worker process, set by init_worker
+_worker = dict()
+
+
+def pixel_tiles(n_px_x, n_px_y, tile_size=16):
+    """
+    Divide a grid of pixels into disjoint square tiles.
+
+    Parameters
+    ----------
+    n_px_x : int
+        Number of pixels along the first axis of the grid.
+
+    n_px_y : int
+        Number of pixels along the second axis of the grid.
+
+    tile_size : int, optional
+        Number of pixels along each side of a tile. Tiles at the edges of the grid may
+        be smaller. (Default: ``16``)
+
+    Returns
+    -------
+    out : list
+        A list of tiles, each a list of 2-tuples specifying the indices (i, j) of
+        pixels in the grid.
+    """
+    return [
+        list(
+            product(
+                range(i0, min(i0 + tile_size, n_px_x)),
+                range(j0, min(j0 + tile_size, n_px_y)),
+            )
+        )
+        for i0, j0 in product(range(0, n_px_x, tile_size), range(0, n_px_y, tile_size))
+    ]
+
+
+def particle_counts(xy, sm_ranges, n_px_x, n_px_y):
+    """
+    Count the particles overlapping each pixel in a grid.
+
+    A particle at ``(x, y)`` with kernel extent ``r`` overlaps the pixels ``(i, j)``
+    with ``|i - x| <= r`` and ``|j - y| <= r``, a rectangle of pixels. The counts are
+    accumulated by marking the corners of each rectangle and taking cumulative sums.
+
+    Parameters
+    ----------
+    xy : ~numpy.typing.ArrayLike
+        Particle pixel coordinates with shape ``(2, N)``.
+
+    sm_ranges : ~numpy.typing.ArrayLike
+        Maximum extent of each particle's kernel in pixels, with shape ``(N, )``.
+
+    n_px_x : int
+        Number of pixels along the first axis of the grid.
+
+    n_px_y : int
+        Number of pixels along the second axis of the grid.
+
+    Returns
+    -------
+    out : ~numpy.typing.ArrayLike
+        Array with shape ``(n_px_x, n_px_y)`` containing the number of particles
+        overlapping each pixel.
+    """
+    x, y = xy
+    lo_i = np.clip(np.ceil(x - sm_ranges), 0, n_px_x).astype(int)
+    hi_i = np.clip(np.floor(x + sm_ranges) + 1, 0, n_px_x).astype(int)
+    lo_j = np.clip(np.ceil(y - sm_ranges), 0, n_px_y).astype(int)
+    hi_j = np.clip(np.floor(y + sm_ranges) + 1, 0, n_px_y).astype(int)
+    overlaps = np.logical_and(hi_i > lo_i, hi_j > lo_j)
+    lo_i, hi_i, lo_j, hi_j = (
+        lo_i[overlaps],
+        hi_i[overlaps],
+        lo_j[overlaps],
+        hi_j[overlaps],
+    )
+    corners = np.zeros((n_px_x + 1, n_px_y + 1), dtype=int)
+    np.add.at(corners, (lo_i, lo_j), 1)
+    np.add.at(corners, (lo_i, hi_j), -1)
+    np.add.at(corners, (hi_i, lo_j), -1)
+    np.add.at(corners, (hi_i, hi_j), 1)
+    return corners.cumsum(axis=0).cumsum(axis=1)[:n_px_x, :n_px_y]
+
+
+def schedule_tiles(xy, sm_ranges, n_px_x, n_px_y, tile_size=16, pixel_cost=1000):
+    """
+    Divide a grid of pixels into tiles, ordered by decreasing estimated cost.
+
+    The cost of a tile is estimated as the number of particle-pixel overlaps in the
+    tile, plus a fixed cost per pixel for the overhead of the loop over pixels.
+
+    Parameters
+    ----------
+    xy : ~numpy.typing.ArrayLike
+        Particle pixel coordinates with shape ``(2, N)``.
+
+    sm_ranges : ~numpy.typing.ArrayLike
+        Maximum extent of each particle's kernel in pixels, with shape ``(N, )``.
+
+    n_px_x : int
+        Number of pixels along the first axis of the grid.
+
+    n_px_y : int
+        Number of pixels along the second axis of the grid.
+
+    tile_size : int, optional
+        Number of pixels along each side of a tile. (Default: ``16``)
+
+    pixel_cost : float, optional
+        Cost of the overhead per pixel, in units of the cost of one particle-pixel
+        overlap. (Default: ``1000``)
+
+    Returns
+    -------
+    out : list
+        A list of tiles (see :func:`~martini._parallel.pixel_tiles`), most expensive
+        first.
+    """
+    tiles = pixel_tiles(n_px_x, n_px_y, tile_size=tile_size)
+    counts = particle_counts(xy, sm_ranges, n_px_x, n_px_y)
+    costs = [
+        counts[tuple(np.array(tile).T)].sum() + pixel_cost * len(tile) for tile in tiles
+    ]
+    # stable sort keeps neighbouring tiles of equal cost together
+    return [tiles[itile] for itile in np.argsort(-np.array(costs), kind="stable")]
+
+
+def balanced_strips(xy, sm_ranges, n_px_x, n_px_y, n_strips):
+    """
+    Divide a grid of pixels into strips of rows with similar estimated cost.
+
+    The cost of a row of pixels is estimated as the number of particle-pixel overlaps
+    in the row. The strips are contiguous ranges of rows (along the first axis of the
+    grid) with approximately equal total cost.
+
+    Parameters
+    ----------
+    xy : ~numpy.typing.ArrayLike
+        Particle pixel coordinates with shape ``(2, N)``.
+
+    sm_ranges : ~numpy.typing.ArrayLike
+        Maximum extent of each particle's kernel in pixels, with shape ``(N, )``.
+
+    n_px_x : int
+        Number of pixels along the first axis of the grid.
+
+    n_px_y : int
+        Number of pixels along the second axis of the grid.
+
+    n_strips : int
+        Number of strips to aim for. Fewer are returned if some would be empty.
+
+    Returns
+    -------
+    out : list
+        A list of 2-tuples ``(first, last)`` giving the range of rows
+        ``first <= i < last`` in each strip, most expensive first.
+    """
+    # +1 so that empty rows are still shared out
+    row_costs = particle_counts(xy, sm_ranges, n_px_x, n_px_y).sum(axis=1) + 1
+    cumulative_costs = np.cumsum(row_costs)
+    edges = np.unique(
+        np.r_[
+            0,
+            np.searchsorted(
+                cumulative_costs,
+                np.linspace(0, cumulative_costs[-1], n_strips + 1)[1:-1],
+                side="right",
+            ),
+            n_px_x,
+        ]
+    )
+    strip_costs = np.add.reduceat(row_costs, edges[:-1])
+    return [
+        (int(edges[istrip]), int(edges[istrip + 1]))
+        for istrip in np.argsort(-strip_costs, kind="stable")
+    ]
+
+
+def shared_zeros(shape, dtype):
+    """
+    Allocate an array of zeros in a new shared memory block.
+
+    The array is a view of the :attr:`~multiprocess.shared_memory.SharedMemory.buf`
+    of the block, which is closed once the array (and every view of it) has been
+    released. The block should be unlinked by the caller once the worker processes
+    have finished with it: the memory then stays allocated for as long as the array
+    is in use, like any other array, and is not copied.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the array.
+
+    dtype : ~numpy.dtype
+        Data type of the array.
+
+    Returns
+    -------
+    out : tuple
+        A 2-tuple containing the :class:`multiprocess.shared_memory.SharedMemory`
+        block and the array.
+    """
+    from multiprocess import shared_memory
+
+    nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    # closing the block unmaps the memory, so it must stay open while the array lives;
+    # at exit the operating system releases it
+    weakref.finalize(array, shm.close).atexit = False
+    return shm, array
+
+
+def init_worker(martini, shared=None):
+    """
+    Set up a worker process for parallel source insertion.
+
+    Parameters
+    ----------
+    martini : ~martini.martini._BaseMartini
+        The instance whose source is being inserted.
+
+    shared : tuple, optional
+        If given, a 3-tuple containing the name of a
+        :class:`multiprocess.shared_memory.SharedMemory` block, and the shape and data
+        type of the datacube array that it holds. Pixel spectra are then written
+        directly into the shared memory. (Default: ``None``)
+    """
+    _worker.clear()
+    _worker["martini"] = martini
+    if shared is not None:
+        from multiprocess import shared_memory
+
+        shm_name, shape, dtype = shared
+        # keep a reference to the block so that it stays open with the worker
+        _worker["shm"] = shared_memory.SharedMemory(name=shm_name)
+        _worker["array"] = np.ndarray(shape, dtype=dtype, buffer=_worker["shm"].buf)
+    return
+
+
+def evaluate_tile(tile):
+    """
+    Evaluate the spectra of the pixels in a tile in a worker process.
+
+    Parameters
+    ----------
+    tile : list
+        List of 2-tuples specifying the indices (i, j) of pixels in the grid.
+
+    Returns
+    -------
+    out : tuple
+        A 2-tuple containing the number of pixels in the tile and a list of pixel
+        spectra as returned by
+        :meth:`~martini.martini._BaseMartini._evaluate_pixel_spectrum`. If the worker
+        writes into shared memory the list is empty.
+    """
+    result = _worker["martini"]._evaluate_pixel_spectrum((0, tile), progressbar=False)
+    if "array" in _worker:
+        for insertion_slice, insertion_data in result:
+            _worker["array"][insertion_slice] = insertion_data
+        result = list()
+    return len(tile), result
@@ -0,0 +1,29 @@
+import typing as T
+from numpy import ndarray
+
+_worker: T.Dict[str, T.Any]
+
+def pixel_tiles(
+    n_px_x: int, n_px_y: int, tile_size: int = ...
+) -> T.List[T.List[T.Tuple[int, int]]]: ...
+def particle_counts(
+    xy: ndarray, sm_ranges: ndarray, n_px_x: int, n_px_y: int
+) -> ndarray: ...
+def schedule_tiles(
+    xy: ndarray,
+    sm_ranges: ndarray,
+    n_px_x: int,
+    n_px_y: int,
+    tile_size: int = ...,
+    pixel_cost: float = ...,
+) -> T.List[T.List[T.Tuple[int, int]]]: ...
+def balanced_strips(
+    xy: ndarray, sm_ranges: ndarray, n_px_x: int, n_px_y: int, n_strips: int
+) -> T.List[T.Tuple[int, int]]: ...
+def shared_zeros(shape: T.Tuple[int, ...], dtype: T.Any) -> T.Tuple[T.Any, ndarray]: ...
+def init_worker(
+    martini: T.Any, shared: T.Optional[T.Tuple[str, T.Tuple[int, ...], T.Any]] = ...
+) -> None: ...
+def evaluate_tile(
+    tile: T.List[T.Tuple[int, int]],
+) -> T.Tuple[int, T.List[T.Tuple[T.Tuple[int | slice, ...], ndarray]]]: ...
@@ -0,0 +1,138 @@
+"""
+Provides :class:`~martini._spatial_index.SpatialIndex`, used to look up the particles
+that contribute to a given pixel without checking every particle.
+"""
+
+import numpy as np
+import astropy.units as U
+
+
+class SpatialIndex(object):
+    """
+    Index of particles by the pixels that their kernels may overlap.
+
+    A particle at pixel coordinates ``(x, y)`` with kernel extent ``r`` (in pixels)
+    contributes to pixel ``(i, j)`` if ``|x - i| <= r`` and ``|y - j| <= r``. To find
+    these particles without checking all of them, particles are grouped into levels
+    by the size of their footprint, in powers of two. Within a level with footprints
+    of at most ``s`` pixels, particles are binned into square cells ``s`` pixels on a
+    side. Any particle in this level overlapping a pixel must then be in the 3x3 block
+    of cells around the cell containing that pixel. Particles with an unbounded
+    footprint (such as in a :class:`~martini.martini.GlobalProfile`) are candidates
+    for every pixel.
+
+    The index keeps views of the input arrays rather than copies. It must be rebuilt
+    if the set of particles or their pixel coordinates change.
+
+    Parameters
+    ----------
+    pixcoords : ~astropy.units.Quantity
+        :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        Particle pixel coordinates with shape ``(2, N)`` or ``(3, N)``, only the first
+        two (spatial) rows are used.
+
+    sm_ranges : ~astropy.units.Quantity
+        :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        Maximum extent of each particle's kernel, with shape ``(N, )``.
+
+    See Also
+    --------
+    martini.sph_kernels._BaseSPHKernel
+    """
+
+    def __init__(self, pixcoords, sm_ranges):
+        self.xy = pixcoords[:2].to_value(U.pix)
+        self.npart = self.xy.shape[1]
+        self.sm_ranges = np.broadcast_to(sm_ranges.to_value(U.pix), (self.npart,))
+        unbounded = np.logical_not(np.isfinite(self.sm_ranges))
+        self.unbounded = np.flatnonzero(unbounded)
+        # level k holds particles with 2**(k-1) < sm_ranges <= 2**k
+        levels = np.zeros(self.npart, dtype=int)
+        levels[~unbounded] = np.ceil(
+            np.log2(np.maximum(self.sm_ranges[~unbounded], 1))
+        ).astype(int)
+        self.levels = list()
+        for level in np.unique(levels[~unbounded]):
+            members = np.flatnonzero(np.logical_and(levels == level, ~unbounded))
+            cell_size = 2**level
+            cells = np.floor(self.xy[:, members] / cell_size).astype(int)
+            cell_origin = cells.min(axis=1)
+            cell_shape = cells.max(axis=1) - cell_origin + 1
+            cell_ids = (cells[0] - cell_origin[0]) * cell_shape[1] + (
+                cells[1] - cell_origin[1]
+            )
+            # stable sort keeps particles in increasing order within a cell
+            order = np.argsort(cell_ids, kind="stable")
+            self.levels.append(
+                dict(
+                    cell_size=cell_size,
+                    cell_origin=cell_origin,
+                    cell_shape=cell_shape,
+                    cell_ids=cell_ids[order],
+                    particles=members[order],
+                )
+            )
+        return
+
+    def candidates(self, ij_px):
+        """
+        Find the particles that may contribute to a pixel.
+
+        Parameters
+        ----------
+        ij_px : tuple
+            A 2-tuple containing the indices (i, j) of a pixel in the grid.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Sorted array of particle indices including at least all particles that
+            overlap the pixel.
+        """
+        found = [self.unbounded]
+        for level in self.levels:
+            cell = (
+                np.floor_divide(np.array(ij_px), level["cell_size"])
+                - level["cell_origin"]
+            )
+            cx = np.arange(cell[0] - 1, cell[0] + 2)
+            cx = cx[np.logical_and(cx >= 0, cx < level["cell_shape"][0])]
+            cy_first = max(cell[1] - 1, 0)
+            cy_last = min(cell[1] + 1, level["cell_shape"][1] - 1)
+            if cx.size == 0 or cy_first > cy_last:
+                continue
+            # cells in a row of the 3x3 block have consecutive ids
+            starts = np.searchsorted(
+                level["cell_ids"], cx * level["cell_shape"][1] + cy_first, side="left"
+            )
+            ends = np.searchsorted(
+                level["cell_ids"], cx * level["cell_shape"][1] + cy_last, side="right"
+            )
+            found.extend(
+                level["particles"][start:end] for start, end in zip(starts, ends)
+            )
+        return np.sort(np.concatenate(found))
+
+    def query(self, ij_px):
+        """
+        Find the particles that contribute to a pixel.
+
+        The result is the same as checking all particles with
+        ``(np.abs(ij - pixcoords[:2]) <= sm_ranges).all(axis=0)``.
+
+        Parameters
+        ----------
+        ij_px : tuple
+            A 2-tuple containing the indices (i, j) of a pixel in the grid.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Sorted array of indices of particles that overlap the pixel.
+        """
+        candidates = self.candidates(ij_px)
+        ij = np.array(ij_px)[..., np.newaxis]
+        overlap = (
+            np.abs(ij - self.xy[:, candidates]) <= self.sm_ranges[candidates]
+        ).all(axis=0)
+        return candidates[overlap]
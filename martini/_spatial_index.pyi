@@ -0,0 +1,16 @@
+import typing as T
+import astropy.units as U
+from numpy import ndarray
+
+class SpatialIndex(object):
+    xy: ndarray
+    npart: int
+    sm_ranges: ndarray
+    unbounded: ndarray
+    levels: T.List[T.Dict[str, T.Any]]
+
+    def __init__(
+        self, pixcoords: U.Quantity[U.pix], sm_ranges: U.Quantity[U.pix]
+    ) -> None: ...
+    def candidates(self, ij_px: T.Tuple[int, int]) -> ndarray: ...
+    def query(self, ij_px: T.Tuple[int, int]) -> ndarray: ...
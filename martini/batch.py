@@ -0,0 +1,465 @@
+"""
+Provides functions to create batches of mock observations of one source, such as views
+of a source from many different orientations, or at several distances and resolutions.
+
+The source is loaded once, and each mock observation is made with a copy of the source
+that shares the arrays of particle properties that do not depend on the projection
+(masses, temperatures and smoothing lengths). The mock observations can be shared out
+between a pool of processes, each of which receives the source once when it is started.
+"""
+
+from copy import deepcopy
+import numpy as np
+from martini.martini import Martini
+
+# state of a worker process, set by _init_batch_worker
+_batch_worker = dict()
+
+
+def _init_batch_worker(make_observation, postprocess):
+    """
+    Initialize a worker process for a batch of mock observations.
+
+    Parameters
+    ----------
+    make_observation : callable
+        Function taking the index of a mock observation in the batch and returning the
+        :class:`~martini.martini.Martini` instance with the source inserted.
+
+    postprocess : callable or None
+        Function taking each :class:`~martini.martini.Martini` instance and its index
+        in the batch, whose result is returned instead of the instance if given.
+    """
+    _batch_worker["make_observation"] = make_observation
+    _batch_worker["postprocess"] = postprocess
+    return
+
+
+def _batch_task(index):
+    """
+    Make one mock observation of a batch in a worker process.
+
+    Parameters
+    ----------
+    index : int
+        Index of the mock observation in the batch.
+
+    Returns
+    -------
+    out : object
+        The :class:`~martini.martini.Martini` instance, or the result of the
+        ``postprocess`` function for it.
+    """
+    M = _batch_worker["make_observation"](index)
+    postprocess = _batch_worker["postprocess"]
+    return M if postprocess is None else postprocess(M, index)
+
+
+def _run_batch(make_observation, n_observations, ncpu=1, postprocess=None):
+    """
+    Make a batch of mock observations, in turn or in a pool of processes.
+
+    Parameters
+    ----------
+    make_observation : callable
+        Function taking the index of a mock observation in the batch and returning the
+        :class:`~martini.martini.Martini` instance with the source inserted.
+
+    n_observations : int
+        Number of mock observations in the batch.
+
+    ncpu : int, optional
+        Number of processes to share the mock observations between. Using more than one
+        process requires the :mod:`multiprocess` module. (Default: ``1``)
+
+    postprocess : callable, optional
+        Function taking each :class:`~martini.martini.Martini` instance and its index
+        in the batch, whose result is yielded instead of the instance if given.
+        (Default: ``None``)
+
+    Yields
+    ------
+    out : object
+        The :class:`~martini.martini.Martini` instance, or the result of the
+        ``postprocess`` function for it, for each mock observation in order.
+    """
+    if ncpu == 1:
+        for index in range(n_observations):
+            M = make_observation(index)
+            yield M if postprocess is None else postprocess(M, index)
+        return
+    # not multiprocessing, need serialization from dill not pickle
+    from multiprocess import Pool
+
+    with Pool(
+        processes=ncpu,
+        initializer=_init_batch_worker,
+        initargs=(make_observation, postprocess),
+    ) as pool:
+        yield from pool.imap(_batch_task, range(n_observations))
+    return
+
+
+def _noise_rngs(noise, n_observations):
+    """
+    Create independent random number generators for the noise of each observation.
+
+    The generators are seeded from the seed of the noise module, so that a batch with
+    a seeded noise module is reproducible, but the noise of each observation differs.
+
+    Parameters
+    ----------
+    noise : ~martini.noise._BaseNoise or None
+        The noise module.
+
+    n_observations : int
+        Number of mock observations in the batch.
+
+    Returns
+    -------
+    out : list
+        A :class:`~numpy.random.Generator` for each observation, or ``None`` for each
+        observation if there is no noise module.
+    """
+    if noise is None:
+        return [None] * n_observations
+    return [
+        np.random.default_rng(seed)
+        for seed in np.random.SeedSequence(noise.seed).spawn(n_observations)
+    ]
+
+
+def orientation_batch(
+    source,
+    rotations,
+    datacube,
+    sph_kernel,
+    spectral_model,
+    beam=None,
+    noise=None,
+    quiet=False,
+    ncpu=1,
+    insert_kwargs=None,
+    postprocess=None,
+):
+    """
+    Make mock observations of a source from several orientations.
+
+    For each orientation a copy of the source is rotated (see
+    :meth:`~martini.sources.sph_source.SPHSource.rotate`), a
+    :class:`~martini.martini.Martini` instance is created with copies of the
+    :class:`~martini.datacube.DataCube`, beam, noise, SPH kernel and spectral model,
+    and the source is inserted into the data cube. The particle masses, temperatures
+    and smoothing lengths are shared between the copies of the source rather than
+    copied. The rotations are applied to the source in its current orientation.
+
+    The mock observations are made one at a time as they are requested from the
+    generator returned by this function, so that only one data cube is held in memory
+    at a time (or one per process if ``ncpu > 1``). Further steps can be applied to
+    each mock observation with the ``postprocess`` argument, which is run in the
+    worker processes if ``ncpu > 1``, for example::
+
+        def postprocess(M, index):
+            M.add_noise()
+            M.convolve_beam()
+            M.write_fits(f"orientation{index}.fits")
+
+    Parameters
+    ----------
+    source : ~martini.sources.sph_source.SPHSource
+        An instance of a class derived from
+        :class:`~martini.sources.sph_source.SPHSource`, see
+        :class:`~martini.martini.Martini`. It is not modified.
+
+    rotations : list
+        List of rotations, each a :obj:`dict` with a single key as for the ``rotation``
+        argument of :class:`~martini.sources.sph_source.SPHSource`, for example
+        ``{"L_coords": (60 * U.deg, 0 * U.deg)}``.
+
+    datacube : ~martini.datacube.DataCube
+        A :class:`~martini.datacube.DataCube` instance, see
+        :class:`~martini.martini.Martini`. Each mock observation uses a copy.
+
+    sph_kernel : ~martini.sph_kernels._BaseSPHKernel
+        An instance of a class derived from
+        :class:`~martini.sph_kernels._BaseSPHKernel`, see
+        :class:`~martini.martini.Martini`. Each mock observation uses a copy.
+
+    spectral_model : ~martini.spectral_models._BaseSpectrum
+        An instance of a class derived from
+        :class:`~martini.spectral_models._BaseSpectrum`, see
+        :class:`~martini.martini.Martini`. Each mock observation uses a copy.
+
+    beam : ~martini.beams._BaseBeam, optional
+        An instance of a class derived from :class:`~martini.beams._BaseBeam`, see
+        :class:`~martini.martini.Martini`. Each mock observation uses a copy.
+        (Default: ``None``)
+
+    noise : ~martini.noise._BaseNoise, optional
+        An instance of a class derived from :class:`~martini.noise._BaseNoise`, see
+        :class:`~martini.martini.Martini`. Each mock observation uses a copy, with a
+        random number generator seeded independently from the seed of the noise
+        module, so that the noise realization of each mock observation differs.
+        (Default: ``None``)
+
+    quiet : bool, optional
+        If ``True``, suppress output to stdout. (Default: ``False``)
+
+    ncpu : int, optional
+        Number of processes to share the mock observations between. Using more than one
+        process requires the :mod:`multiprocess` module. The mock observations are
+        still yielded in order. (Default: ``1``)
+
+    insert_kwargs : dict, optional
+        Arguments to pass to :meth:`~martini.martini.Martini.insert_source_in_cube`.
+        (Default: ``None``)
+
+    postprocess : callable, optional
+        Function taking a :class:`~martini.martini.Martini` instance and the index of
+        its rotation in ``rotations``, applied to each mock observation after the
+        source is inserted. Its result is yielded instead of
+        the :class:`~martini.martini.Martini` instance. With ``ncpu > 1`` returning
+        ``None`` (for example after writing the data cube to a file) avoids sending the
+        data cube back from the worker process. (Default: ``None``)
+
+    Returns
+    -------
+    out : ~collections.abc.Generator
+        Generator yielding the :class:`~martini.martini.Martini` instance with the
+        source inserted for each orientation in turn, or the result of ``postprocess``
+        for it.
+
+    See Also
+    --------
+    martini.martini.Martini
+    martini.sources.sph_source.SPHSource.rotate
+    """
+    insert_kwargs = dict() if insert_kwargs is None else insert_kwargs
+    # rotation matrices are calculated for the source in its current orientation
+    rotmats = [source._rotation_matrix(**rotation) for rotation in rotations]
+    noise_rngs = _noise_rngs(noise, len(rotations))
+
+    def make_observation(index):
+        """
+        Make the mock observation for one orientation.
+
+        Parameters
+        ----------
+        index : int
+            Index of the orientation in the list of rotations.
+
+        Returns
+        -------
+        out : ~martini.martini.Martini
+            :class:`~martini.martini.Martini` instance with the source inserted.
+        """
+        observation_noise = deepcopy(noise)
+        if observation_noise is not None:
+            observation_noise.rng = noise_rngs[index]
+        M = Martini(
+            source=source._copy(rotmat=rotmats[index]),
+            datacube=datacube.copy(),
+            beam=deepcopy(beam),
+            noise=observation_noise,
+            sph_kernel=deepcopy(sph_kernel),
+            spectral_model=deepcopy(spectral_model),
+            quiet=quiet,
+        )
+        M.insert_source_in_cube(**insert_kwargs)
+        return M
+
+    return _run_batch(
+        make_observation, len(rotations), ncpu=ncpu, postprocess=postprocess
+    )
+
+
+def configuration_batch(
+    source,
+    configurations,
+    sph_kernel,
+    spectral_model,
+    noise=None,
+    quiet=False,
+    ncpu=1,
+    insert_kwargs=None,
+    postprocess=None,
+):
+    """
+    Make mock observations of a source at several distances and resolutions.
+
+    Each configuration is a distance at which to place the source, with a
+    :class:`~martini.datacube.DataCube` and beam. For each configuration a
+    :class:`~martini.martini.Martini` instance is created with a copy of the source
+    moved to the distance (the position on the sky and peculiar velocity are kept),
+    copies of the :class:`~martini.datacube.DataCube`, beam, noise, SPH kernel and
+    spectral model, and the source is inserted into the data cube.
+
+    Work that does not depend on the pixel grid is shared between configurations.
+    The particle masses, temperatures and smoothing lengths (and current rotation) are
+    shared between the copies of the source rather than copied. The sky coordinates of
+    the particles are calculated once per distance. When several configurations have
+    the same distance and the same velocity channels, the spectra of all particles are
+    evaluated once and the spectra of the particles remaining after each configuration
+    is pruned are taken from them. The spatial index of the particles and the kernel
+    sizes depend on the pixel grid, so they are calculated for each configuration.
+
+    The shared quantities are held for one distance and set of channels at a time (per
+    process if ``ncpu > 1``), so configurations that share them should be listed
+    consecutively. As for :func:`~martini.batch.orientation_batch`, the mock
+    observations are made one at a time as they are requested from the generator
+    returned by this function.
+
+    Parameters
+    ----------
+    source : ~martini.sources.sph_source.SPHSource
+        An instance of a class derived from
+        :class:`~martini.sources.sph_source.SPHSource`, see
+        :class:`~martini.martini.Martini`. It is not modified.
+
+    configurations : list
+        List of configurations, each a 3-tuple containing the distance (a
+        :class:`~astropy.units.Quantity` with dimensions of length, or ``None`` to
+        keep the distance of the source), a :class:`~martini.datacube.DataCube` and a
+        beam (an instance of a class derived from :class:`~martini.beams._BaseBeam`, or
+        ``None``). Each mock observation uses copies of the
+        :class:`~martini.datacube.DataCube` and beam.
+
+    sph_kernel : ~martini.sph_kernels._BaseSPHKernel
+        An instance of a class derived from
+        :class:`~martini.sph_kernels._BaseSPHKernel`, see
+        :class:`~martini.martini.Martini`. Each mock observation uses a copy.
+
+    spectral_model : ~martini.spectral_models._BaseSpectrum
+        An instance of a class derived from
+        :class:`~martini.spectral_models._BaseSpectrum`, see
+        :class:`~martini.martini.Martini`. Each mock observation uses a copy. When
+        spectra are shared with ``banded=True``, the width of the band is set by all
+        particles of the source, so it can be wider than for a single mock observation.
+
+    noise : ~martini.noise._BaseNoise, optional
+        An instance of a class derived from :class:`~martini.noise._BaseNoise`, see
+        :func:`~martini.batch.orientation_batch`. (Default: ``None``)
+
+    quiet : bool, optional
+        If ``True``, suppress output to stdout. (Default: ``False``)
+
+    ncpu : int, optional
+        Number of processes to share the mock observations between. Using more than one
+        process requires the :mod:`multiprocess` module. The mock observations are
+        still yielded in order. (Default: ``1``)
+
+    insert_kwargs : dict, optional
+        Arguments to pass to :meth:`~martini.martini.Martini.insert_source_in_cube`.
+        (Default: ``None``)
+
+    postprocess : callable, optional
+        Function taking a :class:`~martini.martini.Martini` instance and the index of
+        its configuration in ``configurations``, see
+        :func:`~martini.batch.orientation_batch`. (Default: ``None``)
+
+    Returns
+    -------
+    out : ~collections.abc.Generator
+        Generator yielding the :class:`~martini.martini.Martini` instance with the
+        source inserted for each configuration in turn, or the result of
+        ``postprocess`` for it.
+
+    See Also
+    --------
+    martini.batch.orientation_batch
+    martini.martini.Martini
+    """
+    insert_kwargs = dict() if insert_kwargs is None else insert_kwargs
+    noise_rngs = _noise_rngs(noise, len(configurations))
+    # configurations with the same distance and channels share sky coordinates & spectra
+    groups = []  # distance and datacube of the first configuration of each group
+    config_groups = []
+    for distance, datacube, _ in configurations:
+        distance = source.distance if distance is None else distance
+        edges = datacube.velocity_channel_edges
+        for igroup, (group_distance, group_datacube) in enumerate(groups):
+            group_edges = group_datacube.velocity_channel_edges
+            if (
+                group_distance == distance
+                and group_edges.shape == edges.shape
+                and np.all(group_edges == edges)
+            ):
+                config_groups.append(igroup)
+                break
+        else:
+            config_groups.append(len(groups))
+            groups.append((distance, datacube))
+    group_sizes = np.bincount(config_groups)
+    # quantities shared within the current group, per process
+    shared = dict()
+
+    def group_quantities(igroup):
+        """
+        Get the quantities shared between the configurations of a group.
+
+        Parameters
+        ----------
+        igroup : int
+            Index of the group.
+
+        Returns
+        -------
+        out : tuple
+            A 2-tuple containing the copy of the source at the distance of the group,
+            with sky coordinates initialized, and the spectral model with the spectra
+            of all of its particles (or ``None`` if the group has a single
+            configuration).
+        """
+        if igroup not in shared:
+            shared.clear()
+            distance, datacube = groups[igroup]
+            group_source = source._copy(distance=distance)
+            group_source._init_skycoords()
+            group_spectral_model = None
+            if group_sizes[igroup] > 1:
+                group_spectral_model = deepcopy(spectral_model)
+                # as in Martini, whose dtype follows the datacube here
+                if datacube.dtype == np.float32:
+                    group_spectral_model.spec_dtype = np.float32
+                group_spectral_model.init_spectra(group_source, datacube)
+            shared[igroup] = (group_source, group_spectral_model)
+        return shared[igroup]
+
+    def make_observation(index):
+        """
+        Make the mock observation for one configuration.
+
+        Parameters
+        ----------
+        index : int
+            Index of the configuration in the list of configurations.
+
+        Returns
+        -------
+        out : ~martini.martini.Martini
+            :class:`~martini.martini.Martini` instance with the source inserted.
+        """
+        _, datacube, beam = configurations[index]
+        group_source, group_spectral_model = group_quantities(config_groups[index])
+        precomputed = dict(skycoords=True)
+        if group_spectral_model is not None:
+            precomputed["spectral_model"] = group_spectral_model
+        observation_noise = deepcopy(noise)
+        if observation_noise is not None:
+            observation_noise.rng = noise_rngs[index]
+        M = Martini(
+            source=group_source._copy(),
+            datacube=datacube.copy(),
+            beam=deepcopy(beam),
+            noise=observation_noise,
+            sph_kernel=deepcopy(sph_kernel),
+            spectral_model=deepcopy(spectral_model),
+            quiet=quiet,
+            _precomputed=precomputed,
+        )
+        M.insert_source_in_cube(**insert_kwargs)
+        return M
+
+    return _run_batch(
+        make_observation, len(configurations), ncpu=ncpu, postprocess=postprocess
+    )
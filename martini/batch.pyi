@@ -0,0 +1,53 @@
+import typing as T
+import astropy.units as U
+from numpy.random import Generator
+from martini.martini import Martini
+from martini.datacube import DataCube
+from martini.sources.sph_source import SPHSource
+from martini.beams import _BaseBeam
+from martini.noise import _BaseNoise
+from martini.sph_kernels import _BaseSPHKernel
+from martini.spectral_models import _BaseSpectrum
+
+_batch_worker: T.Dict[str, T.Any]
+
+def _init_batch_worker(
+    make_observation: T.Callable[[int], Martini],
+    postprocess: T.Optional[T.Callable[[Martini, int], T.Any]],
+) -> None: ...
+def _batch_task(index: int) -> T.Any: ...
+def _run_batch(
+    make_observation: T.Callable[[int], Martini],
+    n_observations: int,
+    ncpu: int = ...,
+    postprocess: T.Optional[T.Callable[[Martini, int], T.Any]] = ...,
+) -> T.Generator[T.Any, None, None]: ...
+def _noise_rngs(
+    noise: T.Optional[_BaseNoise], n_observations: int
+) -> T.List[T.Optional[Generator]]: ...
+def orientation_batch(
+    source: SPHSource,
+    rotations: T.Sequence[T.Dict[str, T.Any]],
+    datacube: DataCube,
+    sph_kernel: _BaseSPHKernel,
+    spectral_model: _BaseSpectrum,
+    beam: T.Optional[_BaseBeam] = ...,
+    noise: T.Optional[_BaseNoise] = ...,
+    quiet: bool = ...,
+    ncpu: int = ...,
+    insert_kwargs: T.Optional[T.Dict[str, T.Any]] = ...,
+    postprocess: T.Optional[T.Callable[[Martini, int], T.Any]] = ...,
+) -> T.Generator[T.Any, None, None]: ...
+def configuration_batch(
+    source: SPHSource,
+    configurations: T.Sequence[
+        T.Tuple[T.Optional[U.Quantity[U.Mpc]], DataCube, T.Optional[_BaseBeam]]
+    ],
+    sph_kernel: _BaseSPHKernel,
+    spectral_model: _BaseSpectrum,
+    noise: T.Optional[_BaseNoise] = ...,
+    quiet: bool = ...,
+    ncpu: int = ...,
+    insert_kwargs: T.Optional[T.Dict[str, T.Any]] = ...,
+    postprocess: T.Optional[T.Callable[[Martini, int], T.Any]] = ...,
+) -> T.Generator[T.Any, None, None]: ...
@@ -3,6 +3,7 @@ Provides the :class:`~martini.datacube.DataCube` class for creating a data cube
 observation.
 """
 
+import tempfile
 import numpy as np
 import astropy.units as U
 from astropy import wcs
@@ -33,6 +34,26 @@ def _validate_specsys(specsys):
     return specsys
 
 
+def _validate_dtype(dtype):
+    """
+    Check that a data type is one supported for data cube arrays.
+
+    Parameters
+    ----------
+    dtype : type
+        The data type to check.
+
+    Returns
+    -------
+    out : ~numpy.dtype
+        The data type, ``numpy.float64`` or ``numpy.float32``.
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float64, np.float32):
+        raise ValueError("dtype must be numpy.float64 or numpy.float32.")
+    return dtype
+
+
 class DataCube(object):
     """
     Handles creation and management of the data cube itself.
@@ -97,6 +118,17 @@ class DataCube(object):
         use :meth:`astropy.coordinates.frame_transform_graph.get_names`.
         (Default: ``"icrs"``)
 
+    memmap_dir : str, optional
+        If given, the data cube array is held in a temporary file created in this
+        directory and accessed as a :class:`numpy.memmap`, instead of in memory. This
+        allows building data cubes larger than the available memory. The file is
+        deleted when the array is no longer in use. (Default: ``None``)
+
+    dtype : type, optional
+        Floating point data type of the data cube array, ``numpy.float64`` or
+        ``numpy.float32``. Single precision halves the memory used by the data cube.
+        (Default: ``numpy.float64``)
+
     velocity_centre : ~astropy.units.Quantity, deprecated
         Deprecated, use spectral centre instead.
 
@@ -129,6 +161,8 @@ class DataCube(object):
         stokes_axis=False,
         coordinate_frame=ICRS(),
         specsys="icrs",
+        memmap_dir=None,
+        dtype=np.float64,
         velocity_centre=None,  # deprecated
     ):
         if velocity_centre is not None:
@@ -141,10 +175,16 @@ class DataCube(object):
         self.stokes_axis = stokes_axis
         self.coordinate_frame = coordinate_frame
         self.specsys = _validate_specsys(specsys)
+        self.memmap_dir = memmap_dir
+        self._memmap = None
+        self.dtype = _validate_dtype(dtype)
         datacube_unit = U.Jy * U.pix**-2
-        self._array = np.zeros((n_px_x, n_px_y, n_channels)) * datacube_unit
-        if self.stokes_axis:
-            self._array = self._array[..., np.newaxis]
+        self._array = (
+            self._zeros(
+                (n_px_x, n_px_y, n_channels) + ((1,) if self.stokes_axis else ())
+            )
+            << datacube_unit
+        )
         self.n_px_x, self.n_px_y, self.n_channels = n_px_x, n_px_y, n_channels
         self.px_size = px_size
         self.arcsec2_to_pix = (
@@ -175,6 +215,73 @@ class DataCube(object):
 
         return
 
+    def _zeros(self, shape):
+        """
+        Allocate an array of zeros for the data cube, in memory or in a temporary
+        memory-mapped file (see ``memmap_dir``).
+
+        The array is intended to become the data cube array; the temporary file and
+        its memory map are kept in ``_memmap``.
+
+        Parameters
+        ----------
+        shape : tuple
+            Shape of the array.
+
+        Returns
+        -------
+        out : ~numpy.ndarray
+            Array of zeros, a :class:`numpy.memmap` if ``memmap_dir`` is set.
+        """
+        if self.memmap_dir is None:
+            return np.zeros(shape, dtype=self.dtype)
+        # the file is deleted when closed, it is kept open with the array so that
+        # add_pad can extend it
+        f = tempfile.TemporaryFile(dir=self.memmap_dir)
+        array = np.memmap(f, dtype=self.dtype, mode="w+", shape=shape)
+        self._memmap = (f, array)
+        return array
+
+    def _set_dtype(self, dtype):
+        """
+        Change the data type of the data cube array, keeping its contents.
+
+        Parameters
+        ----------
+        dtype : type
+            Floating point data type, ``numpy.float64`` or ``numpy.float32``.
+        """
+        dtype = _validate_dtype(dtype)
+        if dtype == self.dtype:
+            return
+        self.dtype = dtype
+        array = self._zeros(self._array.shape) << self._array.unit
+        array[...] = self._array
+        self._array = array
+        return
+
+    def _to_unit(self, unit, equivalencies=[]):
+        """
+        Convert the data cube array to other units, in place.
+
+        Unlike :meth:`astropy.units.Quantity.to` no new array is allocated, so the
+        data cube array stays in its memory-mapped file if it has one.
+
+        Parameters
+        ----------
+        unit : ~astropy.units.UnitBase
+            The units to convert to.
+
+        equivalencies : list, optional
+            Unit equivalencies needed for the conversion, which must be a rescaling.
+            (Default: ``[]``)
+        """
+        factor = self._array.unit.to(unit, equivalencies=equivalencies)
+        array = self._array.view(np.ndarray)
+        array *= factor
+        self._array = array << unit
+        return
+
     def velocity_channels(self):
         """
         Deprecated - issues a warning then does nothing.
@@ -204,7 +311,7 @@ class DataCube(object):
         pass
 
     @classmethod
-    def from_wcs(cls, input_wcs, specsys=None):
+    def from_wcs(cls, input_wcs, specsys=None, memmap_dir=None, dtype=np.float64):
         """
         Create a DataCube from a World Coordinate System (WCS), for instance one created
         from a FITS header.
@@ -230,6 +337,14 @@ class DataCube(object):
             ``"icrs"``, ``"hcrs"``, ``"lsrk"``, ``"lsrd"``, ``"lsr"``.
             (Default: ``"icrs"``)
 
+        memmap_dir : str, optional
+            If given, hold the data cube array in a memory-mapped temporary file in this
+            directory, see :class:`~martini.datacube.DataCube`. (Default: ``None``)
+
+        dtype : type, optional
+            Floating point data type of the data cube array, ``numpy.float64`` or
+            ``numpy.float32``. (Default: ``numpy.float64``)
+
         See Also
         --------
         martini.datacube.DataCube
@@ -274,6 +389,8 @@ class DataCube(object):
             stokes_axis=None,
             coordinate_frame=None,
             specsys=None,
+            memmap_dir=memmap_dir,
+            dtype=dtype,
         )
         for axis_type in input_wcs.get_axis_types():
             if axis_type["coordinate_type"] == "stokes":
@@ -603,18 +720,11 @@ class DataCube(object):
         out : iter
             The iterator over the spectra making up the cube.
         """
-        if self.stokes_axis:
-            return iter(
-                self._array.squeeze(self._stokes_index)
-                .transpose((self.wcs.wcs.lng, self.wcs.wcs.lat, self.wcs.wcs.spec))
-                .reshape(self.n_px_x * self.n_px_y, self.n_channels)
-            )
-        else:
-            return iter(
-                self._array.transpose(
-                    (self.wcs.wcs.lng, self.wcs.wcs.lat, self.wcs.wcs.spec)
-                ).reshape(self.n_px_x * self.n_px_y, self.n_channels)
-            )
+        array = (
+            self._array.squeeze(self._stokes_index) if self.stokes_axis else self._array
+        ).transpose((self.wcs.wcs.lng, self.wcs.wcs.lat, self.wcs.wcs.spec))
+        # views of the array, reshaping could copy the whole cube
+        return (spectrum for row in array for spectrum in row)
 
     def add_pad(self, pad):
         """
@@ -642,11 +752,24 @@ class DataCube(object):
         shape = (self.n_px_x + pad[0] * 2, self.n_px_y + pad[1] * 2, self.n_channels)
         if self.stokes_axis:
             shape = shape + (1,)
-        self._array = np.zeros(shape)
-        self._array = self._array * tmp.unit
-        xregion = np.s_[pad[0] : -pad[0]] if pad[0] > 0 else np.s_[:]
-        yregion = np.s_[pad[1] : -pad[1]] if pad[1] > 0 else np.s_[:]
-        self._array[xregion, yregion, ...] = tmp
+        # the array may have been replaced by, or become a view of, another array
+        in_memmap = (
+            self._memmap is not None
+            and tmp.shape == self._memmap[1].shape
+            and tmp.dtype == self._memmap[1].dtype
+            and tmp.flags.c_contiguous
+            and tmp.ctypes.data == self._memmap[1].ctypes.data
+        )
+        if in_memmap:
+            self._pad_memmap(pad, shape)
+        else:
+            self._array = self._zeros(shape) << tmp.unit
+            xregion = np.s_[pad[0] : -pad[0]] if pad[0] > 0 else np.s_[:]
+            yregion = np.s_[pad[1] : -pad[1]] if pad[1] > 0 else np.s_[:]
+            # a new data cube is padded before anything is inserted, no need to copy
+            # zeros
+            if np.any(tmp.value):
+                self._array[xregion, yregion, ...] = tmp
         extend_crpix = [pad[0], pad[1], 0]
         if self.stokes_axis:
             extend_crpix.append(0)
@@ -654,6 +777,44 @@ class DataCube(object):
         self.padx, self.pady = pad
         return
 
+    def _pad_memmap(self, pad, shape):
+        """
+        Pad the data cube array in its memory-mapped file, without a second array.
+
+        The file is extended (with zeros) to the padded size, and the rows of pixels
+        along the x-axis are moved to their padded positions starting from the last,
+        so that none are overwritten before they are moved. Only one row is held in
+        memory at a time. Rows are only written once a row containing non-zero values
+        has been moved, so padding a new (empty) data cube does not write to the file.
+
+        Parameters
+        ----------
+        pad : tuple
+            2-tuple (or other sequence) containing the number of pixels to add in the
+            x (RA) and y (Dec) directions.
+
+        shape : tuple
+            Shape of the padded array.
+        """
+        f, old = self._memmap
+        unit = self._array.unit
+        # maps the same file, so moves are seen through both arrays
+        new = np.memmap(f, dtype=self.dtype, mode="r+", shape=shape)
+        moved_nonzero = False
+        for i in range(self.n_px_x - 1, -1, -1):
+            row = np.array(old[i])
+            # the target row only overlaps rows that have been moved already
+            moved_nonzero = moved_nonzero or np.any(row)
+            if moved_nonzero:
+                new[i + pad[0]] = 0
+                new[i + pad[0], pad[1] : pad[1] + self.n_px_y] = row
+        if moved_nonzero:
+            # the leading padding rows overlap the original first rows
+            new[: pad[0]] = 0
+        self._memmap = (f, new)
+        self._array = new << unit
+        return
+
     def drop_pad(self):
         """
         Remove the padding added using :meth:`~martini.datacube.DataCube.add_pad`.
@@ -697,13 +858,19 @@ class DataCube(object):
             self.spectral_centre,
             self.ra,
             self.dec,
+            stokes_axis=self.stokes_axis,
+            coordinate_frame=self.coordinate_frame,
+            specsys=self.specsys,
+            memmap_dir=self.memmap_dir,
+            dtype=self.dtype,
         )
         copy.padx, copy.pady = self.padx, self.pady
-        copy._wcs = self.wcs.copy()
+        copy._wcs = self.wcs.deepcopy()
         copy._freq_channel_mode = self._freq_channel_mode
         copy._channel_edges = self._channel_edges
         copy._channel_mids = self._channel_mids
-        copy._array = self._array.copy()
+        copy._array = copy._zeros(self._array.shape) << self._array.unit
+        copy._array[...] = self._array
         return copy
 
     def save_state(self, filename, overwrite=False):
@@ -763,7 +930,7 @@ class DataCube(object):
         return
 
     @classmethod
-    def load_state(cls, filename):
+    def load_state(cls, filename, memmap_dir=None):
         """
         Initialize a :class:`~martini.datacube.DataCube` from a state saved using
         :meth:`~martini.datacube.DataCube.save_state`. Note that :mod:`h5py` must be
@@ -775,6 +942,11 @@ class DataCube(object):
         filename : str
             File to open.
 
+        memmap_dir : str, optional
+            If given, the data cube array is read into a temporary memory-mapped file
+            in this directory (see :class:`~martini.datacube.DataCube`), one row of
+            pixels at a time, instead of into memory. (Default: ``None``)
+
         Returns
         -------
         out : ~martini.datacube.DataCube
@@ -812,13 +984,35 @@ class DataCube(object):
                 ra=ra,
                 dec=dec,
                 stokes_axis=stokes_axis,
+                memmap_dir=memmap_dir,
+                dtype=f["_array"].dtype,
             )
             D.add_pad((f["_array"].attrs["padx"], f["_array"].attrs["pady"]))
-            D._array = f["_array"] * U.Unit(f["_array"].attrs["datacube_unit"])
+            # read into the (possibly memory-mapped) array, in rows along the x-axis
+            array = D._array.view(np.ndarray)
+            for i in range(array.shape[0]):
+                f["_array"].read_direct(array, np.s_[i], np.s_[i])
+            D._array = array << U.Unit(f["_array"].attrs["datacube_unit"])
             # must be after add_pad:
             D._wcs = wcs.WCS(f["_array"].attrs["wcs_hdr"])
         return D
 
+    def __getstate__(self):
+        """
+        Get the state of the :class:`~martini.datacube.DataCube` for pickling.
+
+        The temporary file of a memory-mapped data cube array cannot be pickled; the
+        array itself is pickled, and is unpickled in memory.
+
+        Returns
+        -------
+        out : dict
+            The attributes of the :class:`~martini.datacube.DataCube`.
+        """
+        state = self.__dict__.copy()
+        state["_memmap"] = None
+        return state
+
     def __repr__(self):
         """
         Print the contents of the data cube array itself.
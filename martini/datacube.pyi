@@ -1,4 +1,5 @@
 import typing as T
+from numpy import ndarray, dtype
 import astropy.units as U
 from astropy.wcs.wcs import WCS
 from astropy.coordinates.builtin_frames.baseradec import BaseRADecFrame
@@ -31,6 +32,9 @@ class DataCube:
     stokes_axis: bool
     coordinate_frame: BaseRADecFrame
     specsys: str
+    memmap_dir: T.Optional[str]
+    _memmap: T.Optional[T.Tuple[T.IO[bytes], ndarray]]
+    dtype: dtype
     _freq_channel_mode: bool
     _channel_edges: T.Optional[T.Union[U.Quantity[U.Hz], U.Quantity[U.m / U.s]]]
     _channel_mids: T.Optional[T.Union[U.Quantity[U.Hz], U.Quantity[U.m / U.s]]]
@@ -48,10 +52,23 @@ class DataCube:
         stokes_axis: bool = ...,
         coordinate_frame: BaseRADecFrame = ...,
         specsys: str = ...,
+        memmap_dir: T.Optional[str] = ...,
+        dtype: type = ...,
         velocity_centre: None = ...,  # deprecated
     ) -> None: ...
+    def _zeros(self, shape: T.Tuple[int, ...]) -> ndarray: ...
+    def _set_dtype(self, dtype: type) -> None: ...
+    def _to_unit(
+        self, unit: U.UnitBase, equivalencies: T.List[T.Any] = ...
+    ) -> None: ...
     @classmethod
-    def from_wcs(cls, input_wcs: WCS, specsys=T.Optional[str]) -> T.Self: ...
+    def from_wcs(
+        cls,
+        input_wcs: WCS,
+        specsys=T.Optional[str],
+        memmap_dir: T.Optional[str] = ...,
+        dtype: type = ...,
+    ) -> T.Self: ...
     @property
     def units(
         self,
@@ -93,11 +110,13 @@ class DataCube:
     @property
     def spectra(self) -> T.Iterator[U.Quantity]: ...
     def add_pad(self, pad: T.Tuple[int, int]) -> None: ...
+    def _pad_memmap(self, pad: T.Tuple[int, int], shape: T.Tuple[int, ...]) -> None: ...
     def drop_pad(self) -> None: ...
     def copy(self) -> T.Self: ...
     def save_state(self, filename: str, overwrite: bool = ...) -> None: ...
     @classmethod
-    def load_state(cls, filename: str) -> T.Self: ...
+    def load_state(cls, filename: str, memmap_dir: T.Optional[str] = ...) -> T.Self: ...
+    def __getstate__(self) -> T.Dict[str, T.Any]: ...
     def __repr__(self) -> str: ...
 
 class _GlobalProfileDataCube(DataCube):
@@ -5,9 +5,12 @@ spatial information) is desired.
 """
 
 import warnings
+import hashlib
 import subprocess
 import os
 import tqdm
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import scipy.fft
 from scipy.signal import fftconvolve
 import numpy as np
 import astropy.units as U
@@ -17,8 +20,18 @@ from astropy import __version__ as astropy_version
 from itertools import product
 from .__version__ import __version__ as martini_version
 from warnings import warn
-from martini.datacube import DataCube, _GlobalProfileDataCube
+from martini.datacube import DataCube, _GlobalProfileDataCube, _validate_dtype
 from martini.sph_kernels import DiracDeltaKernel
+from martini._spatial_index import SpatialIndex
+from martini._parallel import (
+    pixel_tiles,
+    schedule_tiles,
+    balanced_strips,
+    shared_zeros,
+    init_worker,
+    evaluate_tile,
+)
+from martini._checkpoint import Checkpoint
 
 try:
     gc = subprocess.check_output(
@@ -80,10 +93,45 @@ class _BaseMartini:
     quiet : bool, optional
         If ``True``, suppress output to stdout. (Default: ``False``)
 
+    merge_tolerance : ~astropy.units.Quantity, optional
+        :class:`~astropy.units.Quantity`, with dimensions of velocity.
+        If given, particles that the SPH kernel treats as point-like (see
+        :class:`~martini.sph_kernels.DiracDeltaKernel`) are merged if their centres
+        are in the same pixel and their line-of-sight velocities are in the same
+        interval of this width. See
+        :meth:`~martini.martini._BaseMartini._merge_point_like_particles`.
+        (Default: ``None``)
+
+    fast_projection : bool, optional
+        If ``True``, calculate the sky and pixel coordinates of the particles with
+        :mod:`numpy` instead of :mod:`astropy.coordinates` and :mod:`astropy.wcs`,
+        which is much faster for large numbers of particles. This is only possible if
+        the source and data cube share an RA/Dec coordinate frame, the ``specsys`` of
+        the data cube matches this frame, and its WCS has a ``TAN`` or ``SIN``
+        projection and a ``VRAD`` or ``FREQ`` spectral axis (as with the default
+        :class:`~martini.datacube.DataCube`), otherwise :mod:`astropy` is used. See
+        :meth:`~martini.sources.sph_source.SPHSource._init_pixcoords`.
+        (Default: ``False``)
+
+    dtype : type, optional
+        Floating point precision of the calculation, ``numpy.float64`` or
+        ``numpy.float32``. If ``None``, the precision of the data cube is used. See
+        :class:`~martini.martini.Martini`. (Default: ``None``)
+
     _prune_kwargs : dict
         Arguments to pass through to the :meth:`martini.martini.Martini._prune_particles`
         function, intended for internal use only. (Default: ``dict()``)
 
+    _precomputed : dict, optional
+        Quantities calculated in advance, intended for internal use only, see
+        :mod:`martini.batch`. If the key ``"skycoords"`` is ``True`` the sky coordinates
+        of the source are already initialized. The key ``"spectral_model"`` may give a
+        spectral model for which
+        :meth:`~martini.spectral_models._BaseSpectrum.init_spectra` was called with
+        the source before pruning and the same channels; the spectra of the remaining
+        particles are then taken from it instead of being evaluated.
+        (Default: ``None``)
+
     See Also
     --------
     martini.sources.sph_source.SPHSource
@@ -104,9 +152,16 @@ class _BaseMartini:
         sph_kernel=None,
         spectral_model=None,
         quiet=False,
+        merge_tolerance=None,
+        fast_projection=False,
+        dtype=None,
         _prune_kwargs=dict(),
+        _precomputed=None,
     ):
+        precomputed = dict() if _precomputed is None else _precomputed
         self.quiet = quiet
+        self._unitless_cache = dict()
+        self._block_spectra = None
         if source is not None:
             self.source = source
         else:
@@ -125,21 +180,47 @@ class _BaseMartini:
             self.spectral_model = spectral_model
         else:
             raise ValueError("A spectral model instance is required.")
+        self.dtype = _validate_dtype(self._datacube.dtype if dtype is None else dtype)
+        # before padding, so that the padded array is allocated in this precision
+        self._datacube._set_dtype(self.dtype)
+        if self.dtype == np.float32:
+            self.spectral_model.spec_dtype = np.float32
 
         if self.beam is not None:
             self.beam.init_kernel(self._datacube)
             self._datacube.add_pad(self.beam.needs_pad())
 
-        self.source._init_skycoords()
-        self.source._init_pixcoords(self._datacube)  # after datacube is padded
+        self._fast_projection = (
+            fast_projection and self.source._fast_projection_supported(self._datacube)
+        )
+        if not precomputed.get("skycoords", False):
+            self.source._init_skycoords(fast=self._fast_projection)
+        # after datacube is padded
+        self.source._init_pixcoords(self._datacube, fast=self._fast_projection)
 
         self.sph_kernel._init_sm_lengths(source=self.source, datacube=self._datacube)
         self.sph_kernel._init_sm_ranges()
-        self._prune_particles(
-            **_prune_kwargs
+        # indices of the remaining particles in the source before pruning
+        particle_index = np.flatnonzero(
+            self._prune_particles(**_prune_kwargs)
         )  # prunes both source, and kernel if applicable
-
-        self.spectral_model.init_spectra(self.source, self._datacube)
+        if merge_tolerance is not None:
+            self._merge_point_like_particles(merge_tolerance)
+            particle_index = None
+        particle_order = self.sph_kernel._particle_order()
+        if particle_order is not None:
+            self.source._index_particles(particle_order)
+            self.sph_kernel._apply_mask(particle_order)
+            if particle_index is not None:
+                particle_index = particle_index[particle_order]
+        self._init_spatial_index()
+
+        if "spectral_model" in precomputed and particle_index is not None:
+            self.spectral_model._index_spectra(
+                precomputed["spectral_model"], particle_index
+            )
+        else:
+            self.spectral_model.init_spectra(self.source, self._datacube)
 
         return
 
@@ -161,6 +242,11 @@ class _BaseMartini:
         obj_type_str : str
             String describing the object to be pruned for messages.
             (Default: ``"data cube"``)
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Boolean mask of the particles that were kept.
         """
 
         if not self.quiet:
@@ -206,8 +292,253 @@ class _BaseMartini:
                 f"{self.source.npart} particles remaining with total HI mass of "
                 f"{self.source.mHI_g.sum():.2e}."
             )
+        return np.logical_not(reject_mask)
+
+    def _merge_point_like_particles(self, merge_tolerance):
+        """
+        Merge point-like particles in the same pixel with similar velocities.
+
+        Particles that the SPH kernel treats as point-like contribute all of their
+        flux to the pixel containing their centre. Those in the same pixel whose
+        line-of-sight velocities fall in the same interval of width
+        ``merge_tolerance`` are replaced by a single particle (see
+        :meth:`~martini.sources.sph_source.SPHSource._merge_particles`), reducing the
+        number of particles to insert. The spectra of the merged particles differ
+        from the sum of the spectra that they replace by an amount that decreases
+        with ``merge_tolerance``.
+
+        Parameters
+        ----------
+        merge_tolerance : ~astropy.units.Quantity
+            :class:`~astropy.units.Quantity`, with dimensions of velocity.
+            Width of the velocity intervals.
+        """
+        if merge_tolerance <= 0 * U.km * U.s**-1:
+            raise ValueError("merge_tolerance must be positive.")
+        point_like = np.broadcast_to(
+            self.sph_kernel._point_like(), (self.source.npart,)
+        )
+        if not point_like.any():
+            return
+        # pixel containing the particle centre, as in DiracDeltaKernel
+        ij = np.floor(self.source.pixcoords[:2].to_value(U.pix) + 0.5).astype(int)
+        velocity_bins = np.floor(
+            (self.source.skycoords.radial_velocity / merge_tolerance).to_value(
+                U.dimensionless_unscaled
+            )
+        ).astype(int)
+        groups = np.unique(
+            np.vstack((ij, velocity_bins))[:, point_like], axis=1, return_inverse=True
+        )[1].reshape(-1)
+        # particles that are not point-like keep their own label, and their order
+        labels = np.arange(self.source.npart)
+        labels[point_like] = self.source.npart + groups
+        self.source._merge_particles(labels)
+        self.source._init_skycoords(fast=self._fast_projection)
+        self.source._init_pixcoords(self._datacube, fast=self._fast_projection)
+        self.sph_kernel._init_sm_lengths(source=self.source, datacube=self._datacube)
+        self.sph_kernel._init_sm_ranges()
+        if not self.quiet:
+            print(
+                f"Merged {np.count_nonzero(point_like)} point-like particles into "
+                f"{groups.max() + 1}, {self.source.npart} particles remaining."
+            )
         return
 
+    def _init_spatial_index(self):
+        """
+        Build the index used to look up the particles contributing to each pixel.
+
+        Must be called again if the particles or their pixel coordinates change.
+        """
+        self.spatial_index = SpatialIndex(
+            self.source.pixcoords, self.sph_kernel.sm_ranges
+        )
+        return
+
+    def _unitless_array(self, name, quantity, unit, npart=None):
+        """
+        Get a particle property used in source insertion as a plain array.
+
+        The array is created on first use and cached, and created again if the
+        :class:`~astropy.units.Quantity` that it is derived from is replaced (for
+        instance if the particles are masked or the spectra are re-initialized), or if
+        ``dtype`` or the number of particles changes. Where possible it is a view of
+        the original, so that changes made in place are also seen.
+
+        Parameters
+        ----------
+        name : str
+            Name of the property in the cache.
+
+        quantity : ~astropy.units.Quantity
+            :class:`~astropy.units.Quantity` that the array is derived from.
+
+        unit : ~astropy.units.Unit
+            Unit of the plain array.
+
+        npart : int, optional
+            If given, broadcast the array to this length. (Default: ``None``)
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            The property in ``unit``, with the precision set by ``dtype``.
+        """
+        cached = self._unitless_cache.get(name)
+        if (
+            cached is None
+            or cached[0] is not quantity
+            or cached[1:3] != (self.dtype, npart)
+        ):
+            value = quantity.to_value(unit).astype(self.dtype, copy=False)
+            if npart is not None:
+                value = np.broadcast_to(value, npart)
+            cached = self._unitless_cache[name] = (quantity, self.dtype, npart, value)
+        return cached[3]
+
+    @property
+    def _pixcoords(self):
+        """
+        Particle pixel coordinates as a plain array, in pixels.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Pixel coordinates with the precision set by ``dtype``.
+        """
+        return self._unitless_array("pixcoords", self.source.pixcoords, U.pix)
+
+    @property
+    def _sm_lengths(self):
+        """
+        Particle smoothing lengths as a plain array, in pixels.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Smoothing lengths, one per particle, with the precision set by ``dtype``.
+        """
+        return self._unitless_array(
+            "sm_lengths", self.sph_kernel.sm_lengths, U.pix, npart=self.source.npart
+        )
+
+    @property
+    def _sm_ranges(self):
+        """
+        Particle kernel extents as a plain array, in pixels.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Kernel extents, one per particle, with the precision set by ``dtype``.
+        """
+        return self._unitless_array(
+            "sm_ranges", self.sph_kernel.sm_ranges, U.pix, npart=self.source.npart
+        )
+
+    @property
+    def _spectra(self):
+        """
+        Particle spectra as a plain array, in Jy.
+
+        While a data cube is streamed by blocks of channels, these are the spectra of
+        the current block.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Spectra with the precision set by ``dtype``.
+        """
+        if self._block_spectra is not None:
+            return self._block_spectra
+        return self._unitless_array("spectra", self.spectral_model.spectra, U.Jy)
+
+    @property
+    def _spectra_offsets(self):
+        """
+        First channel of the band of each particle, for banded spectra.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike or None
+            Channel offsets, or ``None`` if the spectra span all channels.
+        """
+        if self._block_spectra is not None:
+            return None
+        return self.spectral_model.spectra_offsets
+
+    def _checkpoint_fingerprint(self):
+        """
+        Summarize the configuration of the source insertion, to recognize checkpoints.
+
+        A checkpoint is only valid for resuming an insertion with the same data cube
+        (WCS header, channel edges and array shape), the same number of particles and
+        the same particle properties, kernel and spectral model.
+
+        Returns
+        -------
+        out : str
+            Hexadecimal SHA-256 digest of the configuration.
+        """
+        digest = hashlib.sha256()
+        channel_edges = self._datacube.channel_edges
+        for item in (
+            self._datacube.wcs.to_header_string(),
+            str(channel_edges.unit),
+            str(self._datacube._array.shape),
+            str(self.source.npart),
+            type(self.sph_kernel).__name__,
+            type(self.spectral_model).__name__,
+        ):
+            digest.update(item.encode())
+        for array in (
+            channel_edges.value,
+            self._pixcoords,
+            self._sm_lengths,
+            self._spectra,
+        ):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        if self._spectra_offsets is not None:
+            digest.update(np.ascontiguousarray(self._spectra_offsets).tobytes())
+        return digest.hexdigest()
+
+    def _channel_block_spectra(self, first, last):
+        """
+        Extract the part of the cached spectra falling in a block of channels.
+
+        Banded spectra are expanded to full spectra over the block.
+
+        Parameters
+        ----------
+        first : int
+            Index of the first channel in the block.
+
+        last : int
+            Index one past the last channel in the block.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Array with shape ``(N, last - first)`` containing the spectra of the
+            particles in the block of channels, in Jy.
+        """
+        if self._spectra_offsets is None:
+            return self._spectra[:, first:last]
+        channels = (
+            self._spectra_offsets[:, np.newaxis]
+            + np.arange(self._spectra.shape[-1])
+            - first
+        )
+        in_block = np.logical_and(channels >= 0, channels < last - first)
+        block_spectra = np.zeros(
+            (self._spectra.shape[0], last - first), dtype=self._spectra.dtype
+        )
+        block_spectra[np.nonzero(in_block)[0], channels[in_block]] = self._spectra[
+            in_block
+        ]
+        return block_spectra
+
     def _evaluate_pixel_spectrum(self, ranks_and_ij_pxs, progressbar=True):
         """
         Add up contributions of particles to the spectrum in a pixel.
@@ -221,6 +552,11 @@ class _BaseMartini:
         limited applications should be limited by the memory consumed by particle data,
         which is not duplicated in parallel execution.
 
+        The particles contributing to each pixel are looked up in the
+        :class:`~martini._spatial_index.SpatialIndex` held by this instance. The
+        calculation uses the plain arrays cached by
+        :meth:`~martini.martini._BaseMartini._unitless_array`.
+
         The arguments that differ between parallel ranks must be bundled into one for
         compatibility with `multiprocess`.
 
@@ -239,34 +575,37 @@ class _BaseMartini:
             A list containing 2-tuples. Each 2-tuple contains and "insertion slice" that
             is an index into the datacube._array instance held by this martini instance
             where the pixel spectrum is to be placed, and a 1D array containing the
-            spectrum, whose length must match the length of the spectral axis of the
-            datacube.
+            spectrum in Jy/pix^2, whose length must match the length of the spectral axis
+            of the datacube.
         """
         result = list()
         rank, ij_pxs = ranks_and_ij_pxs
         if progressbar:
             ij_pxs = tqdm.tqdm(ij_pxs, position=rank)
         for ij_px in ij_pxs:
-            ij = np.array(ij_px)[..., np.newaxis] * U.pix
-            mask = (
-                np.abs(ij - self.source.pixcoords[:2]) <= self.sph_kernel.sm_ranges
-            ).all(axis=0)
-            weights = self.sph_kernel._px_weight(
-                self.source.pixcoords[:2, mask] - ij, mask=mask
+            ij = np.array(ij_px, dtype=self.dtype)[..., np.newaxis]
+            mask = self.spatial_index.query(ij_px)
+            weights = self.sph_kernel._px_weight_value(
+                self._pixcoords[:2, mask] - ij, self._sm_lengths, mask=mask
             )
             insertion_slice = (
                 np.s_[ij_px[0], ij_px[1], :, 0]
                 if self._datacube.stokes_axis
                 else np.s_[ij_px[0], ij_px[1], :]
             )
-            result.append(
-                (
-                    insertion_slice,
-                    (self.spectral_model.spectra[mask] * weights[..., np.newaxis]).sum(
-                        axis=-2
-                    ),
+            weighted_spectra = self._spectra[mask] * weights[..., np.newaxis]
+            if self._spectra_offsets is None:
+                spectrum = weighted_spectra.sum(axis=-2)
+            else:
+                # banded spectra: add each particle's band into its channels
+                spectrum = np.zeros(self._datacube.n_channels, dtype=self.dtype)
+                np.add.at(
+                    spectrum,
+                    self._spectra_offsets[mask][:, np.newaxis]
+                    + np.arange(self._spectra.shape[-1]),
+                    weighted_spectra,
                 )
-            )
+            result.append((insertion_slice, spectrum))
         return result
 
     def _insert_pixel(self, insertion_slice, insertion_data):
@@ -279,13 +618,460 @@ class _BaseMartini:
             Index into the datacube's _array specifying the insertion location.
 
         insertion_data : ~numpy.typing.ArrayLike
-            1D array containing the spectrum at the location specified by insertion_slice.
+            1D array containing the spectrum at the location specified by insertion_slice,
+            in Jy/pix^2.
+        """
+        self._datacube._array[insertion_slice] = insertion_data * U.Jy * U.pix**-2
+        return
+
+    def _insert_pixels_parallel(
+        self, ncpu, backend="process", progressbar=True, checkpoint=None
+    ):
+        """
+        Insert the source with the loop over pixels split between parallel processes.
+
+        The pixels are divided into tiles that are handed out to the processes in order
+        of decreasing estimated cost (see :func:`~martini._parallel.schedule_tiles`),
+        each process taking a new tile as soon as it finishes the last. The processes
+        receive this instance once when they are started.
+
+        With ``backend="shared_memory"`` the datacube array is replaced by one backed
+        by a shared memory block (see :func:`~martini._parallel.shared_zeros`), and
+        the processes write the spectra of their tiles directly into it. This avoids
+        sending the pixel spectra back to this process, and since every pixel is
+        overwritten the previous array is released rather than copied, so that only
+        one datacube array is held in memory at a time. A datacube held in a
+        memory-mapped file (see :class:`~martini.datacube.DataCube`) is instead
+        copied back into its file once the insertion is complete.
+
+        With ``backend="thread"`` the tiles are handed out to a pool of threads instead,
+        which write directly into the datacube array. The loop over pixels holds the
+        global interpreter lock for most of its time, so this gives no speedup over a
+        serial insertion.
+
+        Parameters
+        ----------
+        ncpu : int
+            Number of processes (or threads) to use.
+
+        backend : str, optional
+            One of ``"process"``, ``"shared_memory"`` or ``"thread"``.
+            (Default: ``"process"``)
+
+        progressbar : bool, optional
+            Whether to display a :mod:`tqdm` progressbar. (Default: ``True``)
+
+        checkpoint : ~martini._checkpoint.Checkpoint, optional
+            If given, only the pixels not yet completed are evaluated, and each tile
+            is reported to the checkpoint once inserted. Not supported with
+            ``backend="shared_memory"``. (Default: ``None``)
+        """
+        tiles = schedule_tiles(
+            self._pixcoords[:2],
+            self._sm_ranges,
+            *self._datacube._array.shape[:2],
+        )
+        if checkpoint is not None:
+            tiles = checkpoint.remaining(tiles)
+        if backend == "thread":
+
+            def insert_tile(tile):
+                """
+                Evaluate the spectra of the pixels in a tile and insert them.
+
+                Parameters
+                ----------
+                tile : list
+                    List of 2-tuples specifying the indices (i, j) of pixels.
+
+                Returns
+                -------
+                out : int
+                    Number of pixels in the tile.
+                """
+                # each tile writes to its own pixels, no locking needed
+                for insertion_slice, insertion_data in self._evaluate_pixel_spectrum(
+                    (0, tile), progressbar=False
+                ):
+                    self._insert_pixel(insertion_slice, insertion_data)
+                if checkpoint is not None:
+                    checkpoint.update(tile, self._datacube)
+                return len(tile)
+
+            self._run_threads(
+                insert_tile,
+                tiles,
+                ncpu,
+                total=sum(len(tile) for tile in tiles),
+                progressbar=progressbar,
+            )
+            return
+
+        # not multiprocessing, need serialization from dill not pickle
+        from multiprocess import Pool
+
+        array = self._datacube._array
+        shm = None
+        shared = None
+        if backend == "shared_memory":
+            shm, shared_array = shared_zeros(array.shape, array.dtype)
+            shared = (shm.name, array.shape, array.dtype)
+            unit = array.unit
+            if self._datacube.memmap_dir is None:
+                # every pixel is overwritten, the old array need not be kept
+                array = shared_array << U.Jy * U.pix**-2
+            # don't send a copy of the datacube array to each process:
+            self._datacube._array = None
+        if progressbar:
+            pbar = tqdm.tqdm(total=sum(len(tile) for tile in tiles))
+        try:
+            with Pool(
+                processes=ncpu, initializer=init_worker, initargs=(self, shared)
+            ) as pool:
+                # the processes have started, restore the datacube array:
+                self._datacube._array = array
+                for n_pixels, result in pool.imap_unordered(evaluate_tile, tiles):
+                    for insertion_slice, insertion_data in result:
+                        self._insert_pixel(insertion_slice, insertion_data)
+                    if checkpoint is not None:
+                        checkpoint.update(
+                            [insertion_slice[:2] for insertion_slice, _ in result],
+                            self._datacube,
+                        )
+                    if progressbar:
+                        pbar.update(n_pixels)
+        finally:
+            self._datacube._array = array
+            if progressbar:
+                pbar.close()
+            if shm is not None:
+                # the workers are done with the block, its name is no longer needed;
+                # the memory is released along with the array
+                shm.unlink()
+        if shm is not None:
+            if self._datacube.memmap_dir is None:
+                self._datacube._to_unit(unit)
+            else:
+                # into the file in place, without a temporary Quantity
+                np.multiply(
+                    shared_array,
+                    (U.Jy * U.pix**-2).to(unit),
+                    out=self._datacube._array.value,
+                )
+        return
+
+    def _scatter_particle_spectra_threaded(
+        self, ncpu, progressbar=True, max_block_elements=2**24
+    ):
+        """
+        Insert the source with the loop over particles split between parallel threads.
+
+        The datacube is divided into strips of rows with similar estimated cost (see
+        :func:`~martini._parallel.balanced_strips`), and each thread runs
+        :meth:`~martini.martini._BaseMartini._scatter_particle_spectra` restricted to
+        one strip at a time. The strips are disjoint so no locking is needed. The work
+        is done in large :mod:`numpy` operations that release the global interpreter
+        lock, so the threads run concurrently.
+
+        Parameters
+        ----------
+        ncpu : int
+            Number of threads to use.
+
+        progressbar : bool, optional
+            Whether to display a :mod:`tqdm` progressbar. (Default: ``True``)
+
+        max_block_elements : int, optional
+            Approximate maximum number of elements in the arrays of weighted spectra
+            evaluated at once, shared between the threads. (Default: ``2**24``)
+        """
+        n_px_x, n_px_y = self._datacube._array.shape[:2]
+        strips = balanced_strips(
+            self._pixcoords[:2], self._sm_ranges, n_px_x, n_px_y, n_strips=4 * ncpu
+        )
+
+        def insert_strip(rows):
+            """
+            Add the contributions of all particles to the pixels in a strip.
+
+            Parameters
+            ----------
+            rows : tuple
+                A 2-tuple ``(first, last)`` giving the range of rows in the strip.
+
+            Returns
+            -------
+            out : int
+                Number of rows in the strip.
+            """
+            self._scatter_particle_spectra(
+                progressbar=False,
+                max_block_elements=max(max_block_elements // ncpu, 1),
+                rows=rows,
+            )
+            return rows[1] - rows[0]
+
+        self._run_threads(
+            insert_strip, strips, ncpu, total=n_px_x, progressbar=progressbar
+        )
+        return
+
+    def _run_threads(self, func, tasks, ncpu, total, progressbar=True):
+        """
+        Run tasks in a pool of threads, in order, as threads become free.
+
+        Parameters
+        ----------
+        func : callable
+            Function to call for each task. It should return the amount of progress
+            made, in the same units as ``total``.
+
+        tasks : list
+            List of arguments for ``func``.
+
+        ncpu : int
+            Number of threads to use.
+
+        total : int
+            Total amount of progress made when all tasks are complete.
+
+        progressbar : bool, optional
+            Whether to display a :mod:`tqdm` progressbar. (Default: ``True``)
+        """
+        if progressbar:
+            pbar = tqdm.tqdm(total=total)
+        try:
+            with ThreadPoolExecutor(max_workers=ncpu) as executor:
+                for future in as_completed([executor.submit(func, t) for t in tasks]):
+                    progress = future.result()  # re-raises any exception
+                    if progressbar:
+                        pbar.update(progress)
+        finally:
+            if progressbar:
+                pbar.close()
+        return
+
+    def _scatter_particle_spectra(
+        self, progressbar=True, max_block_elements=2**24, rows=None
+    ):
+        """
+        Add the contributions of particles to the spectra of the pixels they overlap.
+
+        This is an alternative to the loop over pixels in
+        :meth:`~martini.martini._BaseMartini._evaluate_pixel_spectrum`. Instead of
+        checking every particle for every pixel, the footprint of each particle (the
+        pixels within ``sph_kernel.sm_ranges`` of its position) is enumerated and its
+        weighted spectrum is added only to those pixels. The pixels contributed to and
+        the weights are the same as in the loop over pixels, so the result is the same
+        up to floating point round-off in the order of summation.
+
+        Particles are processed in blocks so that the array of spectra for all
+        particle-pixel pairs in a block holds approximately ``max_block_elements``
+        elements, bounding the memory used.
+
+        Parameters
+        ----------
+        progressbar : bool, optional
+            Whether to display a :mod:`tqdm` progressbar. (Default: ``True``)
+
+        max_block_elements : int, optional
+            Approximate maximum number of elements in the array of weighted spectra
+            evaluated at once. (Default: ``2**24``)
+
+        rows : tuple, optional
+            A 2-tuple ``(first, last)``. If given, only pixels ``(i, j)`` with
+            ``first <= i < last`` are added to, so that parallel threads can work on
+            disjoint strips of the datacube. (Default: ``None``)
+        """
+        n_px_x, n_px_y = self._datacube._array.shape[:2]
+        first_row, last_row = (0, n_px_x) if rows is None else rows
+        n_channels = self._spectra.shape[-1]
+        x, y = self._pixcoords[:2]
+        sm_ranges = self._sm_ranges
+        # footprints padded by a pixel, the exact test below (the same as in
+        # _evaluate_pixel_spectrum) then makes the final selection
+        lo_i = np.clip(np.ceil(x - sm_ranges) - 1, first_row, last_row).astype(int)
+        hi_i = np.clip(np.floor(x + sm_ranges) + 1, first_row - 1, last_row - 1).astype(
+            int
+        )
+        lo_j = np.clip(np.ceil(y - sm_ranges) - 1, 0, n_px_y).astype(int)
+        hi_j = np.clip(np.floor(y + sm_ranges) + 1, -1, n_px_y - 1).astype(int)
+        n_i = np.maximum(hi_i - lo_i + 1, 0)
+        n_j = np.maximum(hi_j - lo_j + 1, 0)
+        n_pairs = n_i * n_j
+        max_block_pairs = max(max_block_elements // max(n_channels, 1), 1)
+        block_ids = (np.cumsum(n_pairs) - n_pairs) // max_block_pairs
+        block_edges = np.r_[0, np.flatnonzero(np.diff(block_ids)) + 1, x.size]
+
+        spectra = self._spectra
+        target = self._datacube._array.value
+        if self._datacube.stokes_axis:
+            target = target[..., 0]
+        unit_factor = (U.Jy * U.pix**-2).to(self._datacube._array.unit)
+        if progressbar:
+            pbar = tqdm.tqdm(total=x.size)
+        for first, last in zip(block_edges[:-1], block_edges[1:]):
+            block_pairs = n_pairs[first:last]
+            particles = np.repeat(np.arange(first, last), block_pairs)
+            offsets = np.arange(particles.size) - np.repeat(
+                np.cumsum(block_pairs) - block_pairs, block_pairs
+            )
+            i = lo_i[particles] + offsets // n_j[particles]
+            j = lo_j[particles] + offsets % n_j[particles]
+            keep = np.logical_and(
+                np.abs(i - x[particles]) <= sm_ranges[particles],
+                np.abs(j - y[particles]) <= sm_ranges[particles],
+            )
+            # sort by pixel, stable so particles stay in order within each pixel
+            order = np.argsort((i * n_px_y + j)[keep], kind="stable")
+            particles, i, j = particles[keep][order], i[keep][order], j[keep][order]
+            if particles.size > 0:
+                weights = self.sph_kernel._px_weight_value(
+                    np.vstack((x[particles] - i, y[particles] - j)),
+                    self._sm_lengths,
+                    mask=particles,
+                )
+                if self._spectra_offsets is None:
+                    pixel_starts = np.r_[0, np.flatnonzero(np.diff(i * n_px_y + j)) + 1]
+                    target[
+                        i[pixel_starts], j[pixel_starts]
+                    ] += unit_factor * np.add.reduceat(
+                        spectra[particles] * weights[:, np.newaxis],
+                        pixel_starts,
+                        axis=0,
+                    )
+                else:
+                    # banded spectra: add each particle's band into its channels
+                    np.add.at(
+                        target,
+                        (
+                            i[:, np.newaxis],
+                            j[:, np.newaxis],
+                            self._spectra_offsets[particles][:, np.newaxis]
+                            + np.arange(n_channels),
+                        ),
+                        unit_factor * spectra[particles] * weights[:, np.newaxis],
+                    )
+            if progressbar:
+                pbar.update(last - first)
+        if progressbar:
+            pbar.close()
+        return
+
+    def _validate_engine(self, ncpu=1, engine="pixel", backend="process"):
+        """
+        Check that the options for the source insertion engine are compatible.
+
+        Parameters
+        ----------
+        ncpu : int
+            Number of processes (or threads) to use in main source insertion loop.
+            (Default: ``1``)
+
+        engine : str, optional
+            Algorithm used to insert the source, ``"pixel"`` or ``"particle"``.
+            (Default: ``"pixel"``)
+
+        backend : str, optional
+            How the work is shared out when ``ncpu > 1``, ``"process"``,
+            ``"shared_memory"`` or ``"thread"``. (Default: ``"process"``)
+        """
+        if engine not in ("pixel", "particle"):
+            raise ValueError("engine must be one of 'pixel' or 'particle'.")
+        if backend not in ("process", "shared_memory", "thread"):
+            raise ValueError(
+                "backend must be one of 'process', 'shared_memory' or 'thread'."
+            )
+        if engine == "particle" and ncpu != 1 and backend != "thread":
+            raise ValueError("engine='particle' supports ncpu > 1 only with 'thread'.")
+        return
+
+    def _fill_datacube_array(
+        self,
+        progressbar=True,
+        ncpu=1,
+        engine="pixel",
+        backend="process",
+        checkpoint=None,
+    ):
         """
-        self._datacube._array[insertion_slice] = insertion_data
+        Write the spectra of all pixels into the datacube array, in Jy/pix^2.
+
+        Every pixel of the datacube array is overwritten. The spectra are taken from
+        the cached plain arrays (see
+        :meth:`~martini.martini._BaseMartini._unitless_array`), and their
+        length must match the length of the spectral axis of the datacube array.
+
+        Parameters
+        ----------
+        progressbar : bool, optional
+            Whether to display a :mod:`tqdm` progressbar. (Default: ``True``)
+
+        ncpu : int
+            Number of processes (or threads) to use in main source insertion loop.
+            (Default: ``1``)
+
+        engine : str, optional
+            Algorithm used to insert the source, ``"pixel"`` or ``"particle"``.
+            (Default: ``"pixel"``)
+
+        backend : str, optional
+            How the work is shared out when ``ncpu > 1``, ``"process"``,
+            ``"shared_memory"`` or ``"thread"``. (Default: ``"process"``)
+
+        checkpoint : ~martini._checkpoint.Checkpoint, optional
+            If given, the pixels completed in an earlier, interrupted, run are restored
+            from the checkpoint file instead of evaluated, and progress is saved to
+            the file periodically. Only supported with ``engine="pixel"``.
+            (Default: ``None``)
+        """
+        if checkpoint is not None:
+            n_done = checkpoint.load(self._datacube)
+            if n_done > 0 and not self.quiet:
+                print(f"Resuming source insertion, {n_done} pixels already complete.")
+        if engine == "particle":
+            # every pixel is overwritten by the pixel engine, match this:
+            self._datacube._array[...] = 0
+            if ncpu == 1:
+                self._scatter_particle_spectra(progressbar=progressbar)
+            else:
+                self._scatter_particle_spectra_threaded(ncpu, progressbar=progressbar)
+        elif ncpu > 1:
+            self._insert_pixels_parallel(
+                ncpu, backend=backend, progressbar=progressbar, checkpoint=checkpoint
+            )
+        elif checkpoint is not None:
+            # tiles of pixels, to save progress between them
+            tiles = checkpoint.remaining(pixel_tiles(*self._datacube._array.shape[:2]))
+            for tile in tqdm.tqdm(tiles, disable=not progressbar):
+                for insertion_slice, insertion_data in self._evaluate_pixel_spectrum(
+                    (0, tile), progressbar=False
+                ):
+                    self._insert_pixel(insertion_slice, insertion_data)
+                checkpoint.update(tile, self._datacube)
+        else:
+            ij_pxs = list(
+                product(
+                    np.arange(self._datacube._array.shape[0]),
+                    np.arange(self._datacube._array.shape[1]),
+                )
+            )
+            for insertion_slice, insertion_data in self._evaluate_pixel_spectrum(
+                (0, ij_pxs), progressbar=progressbar
+            ):
+                self._insert_pixel(insertion_slice, insertion_data)
         return
 
     def _insert_source_in_cube(
-        self, skip_validation=False, progressbar=None, ncpu=1, quiet=None
+        self,
+        skip_validation=False,
+        progressbar=None,
+        ncpu=1,
+        quiet=None,
+        engine="pixel",
+        backend="process",
+        checkpoint=None,
+        checkpoint_interval=600,
     ):
         """
         Populates the :class:`~martini.datacube.DataCube` with flux from the
@@ -308,47 +1094,83 @@ class _BaseMartini:
             turned on. (Default: ``None``)
 
         ncpu : int
-            Number of processes to use in main source insertion loop. Using more than
-            one cpu requires the `multiprocess` module (n.b. not the same as
-            `multiprocessing`). (Default: ``1``)
+            Number of processes (or threads, see ``backend``) to use in main source
+            insertion loop. Using more than one process requires the `multiprocess`
+            module (n.b. not the same as `multiprocessing`). (Default: ``1``)
 
         quiet : bool, optional
             If ``True``, suppress output to stdout. If specified, takes precedence over
             quiet parameter of class. (Default: ``None``)
+
+        engine : str, optional
+            Algorithm used to insert the source. With ``"pixel"`` the pixels are
+            looped over, and the particles contributing to each pixel are found. With
+            ``"particle"`` the particles are looped over and their spectra added to the
+            pixels within their footprints, which is much faster when there are many
+            pixels and particles. The two give the same result. The ``"particle"``
+            engine supports ``ncpu > 1`` only with ``backend="thread"``.
+            (Default: ``"pixel"``)
+
+        backend : str, optional
+            How the work is shared out when ``ncpu > 1``. With ``"process"`` each
+            process returns the spectra of its pixels to be inserted into the datacube.
+            With ``"shared_memory"`` the processes write directly into a shared memory
+            copy of the datacube array, which avoids serializing the spectra and holding
+            them in memory until they are inserted. With ``"thread"`` a pool of threads
+            is used instead of processes, avoiding the cost of starting processes and
+            copying data to them. Threads are only useful with ``engine="particle"``,
+            where the calculation is done in large :mod:`numpy` operations that let
+            threads run concurrently. With ``engine="pixel"`` the loop over pixels holds
+            the global interpreter lock for most of its time, so threads give no
+            speedup over ``ncpu=1``. The :mod:`multiprocess` module is not needed for
+            ``"thread"``. (Default: ``"process"``)
+
+        checkpoint : str, optional
+            Name of a checkpoint file. If given, the progress of the source insertion
+            is saved to this file every ``checkpoint_interval`` seconds, and if the file
+            already exists (left by an interrupted run with the same source and
+            configuration) the pixels completed in that run are restored from it
+            instead of evaluated again. The file is deleted once the insertion is
+            complete. Requires the :mod:`h5py` package. Only supported with
+            ``engine="pixel"`` and, if ``ncpu > 1``, ``backend="process"`` or
+            ``"thread"``. (Default: ``None``)
+
+        checkpoint_interval : float, optional
+            Minimum time between saves of the checkpoint file, in seconds.
+            (Default: ``600``)
         """
 
         assert self.spectral_model.spectra is not None
 
+        self._validate_engine(ncpu=ncpu, engine=engine, backend=backend)
+        if checkpoint is not None:
+            if engine != "pixel" or (ncpu > 1 and backend == "shared_memory"):
+                raise ValueError(
+                    "checkpoint is only supported with engine='pixel' and backend"
+                    " 'process' or 'thread'."
+                )
+            checkpoint = Checkpoint(
+                checkpoint,
+                interval=checkpoint_interval,
+                fingerprint=self._checkpoint_fingerprint(),
+            )
+
         if progressbar is None:
             progressbar = not self.quiet
 
         self.sph_kernel._confirm_validation(noraise=skip_validation, quiet=self.quiet)
 
-        ij_pxs = list(
-            product(
-                np.arange(self._datacube._array.shape[0]),
-                np.arange(self._datacube._array.shape[1]),
-            )
+        self._fill_datacube_array(
+            progressbar=progressbar,
+            ncpu=ncpu,
+            engine=engine,
+            backend=backend,
+            checkpoint=checkpoint,
         )
+        if checkpoint is not None:
+            checkpoint.remove()
 
-        if ncpu == 1:
-            for insertion_slice, insertion_data in self._evaluate_pixel_spectrum(
-                (0, ij_pxs), progressbar=progressbar
-            ):
-                self._insert_pixel(insertion_slice, insertion_data)
-        else:
-            # not multiprocessing, need serialization from dill not pickle
-            from multiprocess import Pool
-
-            with Pool(processes=ncpu) as pool:
-                for result in pool.imap_unordered(
-                    lambda x: self._evaluate_pixel_spectrum(x, progressbar=progressbar),
-                    [(icpu, ij_pxs[icpu::ncpu]) for icpu in range(ncpu)],
-                ):
-                    for insertion_slice, insertion_data in result:
-                        self._insert_pixel(insertion_slice, insertion_data)
-
-        self._datacube._array = self._datacube._array.to(
+        self._datacube._to_unit(
             U.Jy / U.arcsec**2, equivalencies=[self._datacube.arcsec2_to_pix]
         )
         pad_mask = (
@@ -360,18 +1182,19 @@ class _BaseMartini:
             if self._datacube.padx > 0 and self._datacube.pady > 0
             else np.s_[...]
         )
-        inserted_flux_density = np.sum(
-            self._datacube._array[pad_mask] * self._datacube.px_size**2
+        # sums first, so that no temporary copies of the datacube array are made
+        inserted_flux_density = (
+            np.sum(self._datacube._array[pad_mask]) * self._datacube.px_size**2
         ).to(U.Jy)
         inserted_mass = (
             2.36e5
             * U.Msun
             * self.source.distance.to_value(U.Mpc) ** 2
             * np.sum(
-                (self._datacube._array[pad_mask] * self._datacube.px_size**2)
-                .sum((0, 1))
-                .squeeze()
-                .to_value(U.Jy)
+                (
+                    self._datacube._array[pad_mask].sum((0, 1)).squeeze()
+                    * self._datacube.px_size**2
+                ).to_value(U.Jy)
                 * np.abs(np.diff(self._datacube.velocity_channel_edges)).to_value(
                     U.km / U.s
                 )
@@ -407,6 +1230,8 @@ class _BaseMartini:
             ra=self._datacube.ra,
             dec=self._datacube.dec,
             stokes_axis=self._datacube.stokes_axis,
+            memmap_dir=self._datacube.memmap_dir,
+            dtype=self._datacube.dtype,
         )
         self._datacube = DataCube(**init_kwargs)
         if self.beam is not None:
@@ -706,6 +1531,44 @@ class Martini(_BaseMartini):
     quiet : bool, optional
         If ``True``, suppress output to stdout. (Default: ``False``)
 
+    merge_tolerance : ~astropy.units.Quantity, optional
+        :class:`~astropy.units.Quantity`, with dimensions of velocity.
+        If given, particles that the SPH kernel treats as point-like (see
+        :class:`~martini.sph_kernels.DiracDeltaKernel`) are merged if their centres
+        are in the same pixel and their line-of-sight velocities are in the same
+        interval of this width, reducing the number of particles to insert. This is
+        most useful for distant sources, where most particles are much smaller than
+        a pixel. An interval much narrower than the channels and the line width of
+        the spectral model (e.g. ``1 * U.km / U.s``) changes the datacube very
+        little. (Default: ``None``)
+
+    fast_projection : bool, optional
+        If ``True``, calculate the sky and pixel coordinates of the particles with
+        :mod:`numpy` instead of :mod:`astropy.coordinates` and :mod:`astropy.wcs`,
+        which is much faster for large numbers of particles. This is only possible if
+        the source and data cube share an RA/Dec coordinate frame, the ``specsys`` of
+        the data cube matches this frame, and its WCS has a ``TAN`` or ``SIN``
+        projection and a ``VRAD`` or ``FREQ`` spectral axis (as with the default
+        :class:`~martini.datacube.DataCube`), otherwise :mod:`astropy` is used. See
+        :meth:`~martini.sources.sph_source.SPHSource._init_pixcoords`.
+        (Default: ``False``)
+
+    dtype : type, optional
+        Floating point precision of the calculation, ``numpy.float64`` or
+        ``numpy.float32``. In single precision the data cube array, the spectra of the
+        particles (the ``spec_dtype`` of the spectral model is overridden), their pixel
+        coordinates and smoothing lengths, the SPH kernel weights, the noise and the
+        Fourier transforms of the beam convolution are all ``numpy.float32``, halving
+        the memory used and the data moved around. If ``None``, the precision of the
+        data cube (see :class:`~martini.datacube.DataCube`) is used, otherwise the data
+        cube is converted if needed. Pixel values agree with a double precision
+        calculation to about one part in :math:`10^5` of the brightest pixel, and FITS
+        output defaults to single precision values. (Default: ``None``)
+
+    _precomputed : dict, optional
+        Quantities calculated in advance, intended for internal use only, see
+        :class:`~martini.martini._BaseMartini`. (Default: ``None``)
+
     See Also
     --------
     martini.sources.sph_source.SPHSource
@@ -821,6 +1684,10 @@ class Martini(_BaseMartini):
         sph_kernel=None,
         spectral_model=None,
         quiet=False,
+        merge_tolerance=None,
+        fast_projection=False,
+        dtype=None,
+        _precomputed=None,
     ):
         super().__init__(
             source=source,
@@ -830,6 +1697,10 @@ class Martini(_BaseMartini):
             sph_kernel=sph_kernel,
             spectral_model=spectral_model,
             quiet=quiet,
+            merge_tolerance=merge_tolerance,
+            fast_projection=fast_projection,
+            dtype=dtype,
+            _precomputed=_precomputed,
         )
 
         return
@@ -847,7 +1718,16 @@ class Martini(_BaseMartini):
         """
         return self._datacube
 
-    def insert_source_in_cube(self, skip_validation=False, progressbar=None, ncpu=1):
+    def insert_source_in_cube(
+        self,
+        skip_validation=False,
+        progressbar=None,
+        ncpu=1,
+        engine="pixel",
+        backend="process",
+        checkpoint=None,
+        checkpoint_interval=600,
+    ):
         """
         Populates the DataCube with flux from the particles in the source.
 
@@ -868,44 +1748,104 @@ class Martini(_BaseMartini):
             unless explicitly turned on. (Default: ``None``)
 
         ncpu : int
-            Number of processes to use in main source insertion loop. Using more than
-            one cpu requires the :mod:`multiprocess` module (n.b. not the same as
-            ``multiprocessing``). (Default: ``1``)
+            Number of processes (or threads, see ``backend``) to use in main source
+            insertion loop. Using more than one process requires the
+            :mod:`multiprocess` module (n.b. not the same as ``multiprocessing``).
+            (Default: ``1``)
+
+        engine : str, optional
+            Algorithm used to insert the source. With ``"pixel"`` the pixels are
+            looped over, and the particles contributing to each pixel are found. With
+            ``"particle"`` the particles are looped over and their spectra added to the
+            pixels within their footprints, which is much faster when there are many
+            pixels and particles. The two give the same result. The ``"particle"``
+            engine supports ``ncpu > 1`` only with ``backend="thread"``.
+            (Default: ``"pixel"``)
+
+        backend : str, optional
+            How the work is shared out when ``ncpu > 1``. With ``"process"`` each
+            process returns the spectra of its pixels to be inserted into the datacube.
+            With ``"shared_memory"`` the processes write directly into a shared memory
+            copy of the datacube array, which avoids serializing the spectra and holding
+            them in memory until they are inserted. With ``"thread"`` a pool of threads
+            is used instead of processes, avoiding the cost of starting processes and
+            copying data to them. Threads are only useful with ``engine="particle"``,
+            where the calculation is done in large :mod:`numpy` operations that let
+            threads run concurrently. With ``engine="pixel"`` the loop over pixels holds
+            the global interpreter lock for most of its time, so threads give no
+            speedup over ``ncpu=1``. The :mod:`multiprocess` module is not needed for
+            ``"thread"``. (Default: ``"process"``)
+
+        checkpoint : str, optional
+            Name of a checkpoint file. If given, the progress of the source insertion
+            is saved to this file every ``checkpoint_interval`` seconds, and if the file
+            already exists (left by an interrupted run with the same source and
+            configuration) the pixels completed in that run are restored from it
+            instead of evaluated again. The file is deleted once the insertion is
+            complete. Requires the :mod:`h5py` package. Only supported with
+            ``engine="pixel"`` and, if ``ncpu > 1``, ``backend="process"`` or
+            ``"thread"``. (Default: ``None``)
+
+        checkpoint_interval : float, optional
+            Minimum time between saves of the checkpoint file, in seconds.
+            (Default: ``600``)
         """
 
         super()._insert_source_in_cube(
-            skip_validation=skip_validation, progressbar=progressbar, ncpu=ncpu
+            skip_validation=skip_validation,
+            progressbar=progressbar,
+            ncpu=ncpu,
+            engine=engine,
+            backend=backend,
+            checkpoint=checkpoint,
+            checkpoint_interval=checkpoint_interval,
         )
 
         return
 
-    def convolve_beam(self):
+    def convolve_beam(self, batched=False, max_batch_bytes=2**28, workers=None):
         """
         Convolve the beam and data cube.
-        """
 
-        if self.beam is None:
+        Parameters
+        ----------
+        batched : bool, optional
+            If ``True``, the Fourier transform of the beam is computed once and the data
+            cube is convolved in batches of channels (see
+            :meth:`~martini.martini.Martini._convolve_beam_batched`). If ``False``, each
+            channel is convolved separately with :func:`scipy.signal.fftconvolve`. The
+            two differ at most by floating point round-off, of order ``1e-15`` of the
+            peak pixel value (``1e-6`` in single precision). (Default: ``False``)
+
+        max_batch_bytes : int, optional
+            Approximate maximum memory in bytes used for the Fourier transforms of a
+            batch of channels, this sets the number of channels convolved at once. Only
+            used if ``batched=True``. (Default: ``2**28``)
+
+        workers : int, optional
+            Number of threads used by :mod:`scipy.fft` for the Fourier transforms. Only
+            used if ``batched=True``. (Default: ``None``)
+        """
+
+        if self.beam is None:
             warn("Skipping beam convolution, no beam object provided to Martini.")
             return
 
-        minimum_padding = self.beam.needs_pad()
-        if (self._datacube.padx < minimum_padding[0]) or (
-            self._datacube.pady < minimum_padding[1]
-        ):
-            raise ValueError(
-                "datacube padding insufficient for beam convolution (perhaps you loaded a"
-                " datacube state with datacube.load_state that was previously initialized"
-                " by martini with a smaller beam?)"
-            )
+        self._confirm_beam_padding()
 
-        unit = self._datacube._array.unit
-        for spatial_slice in self._datacube.spatial_slices:
-            # use a view [...] to force in-place modification
-            spatial_slice[...] = (
-                fftconvolve(spatial_slice, self.beam.kernel, mode="same") * unit
+        if batched:
+            self._convolve_beam_batched(
+                max_batch_bytes=max_batch_bytes, workers=workers
             )
+        else:
+            unit = self._datacube._array.unit
+            for spatial_slice in self._datacube.spatial_slices:
+                # use a view [...] to force in-place modification
+                spatial_slice[...] = (
+                    fftconvolve(spatial_slice, self.beam.kernel, mode="same") * unit
+                )
         self._datacube.drop_pad()
-        self._datacube._array = self._datacube._array.to(
+        self._datacube._to_unit(
             U.Jy * U.beam**-1,
             equivalencies=U.beam_angular_area(self.beam.area),
         )
@@ -921,6 +1861,74 @@ class Martini(_BaseMartini):
             )
         return
 
+    def _confirm_beam_padding(self):
+        """
+        Check that the datacube is padded enough for convolution with the beam.
+        """
+        minimum_padding = self.beam.needs_pad()
+        if (self._datacube.padx < minimum_padding[0]) or (
+            self._datacube.pady < minimum_padding[1]
+        ):
+            raise ValueError(
+                "datacube padding insufficient for beam convolution (perhaps you loaded a"
+                " datacube state with datacube.load_state that was previously initialized"
+                " by martini with a smaller beam?)"
+            )
+        return
+
+    def _convolve_beam_batched(self, max_batch_bytes=2**28, workers=None):
+        """
+        Convolve the beam and data cube, in batches of channels.
+
+        The beam kernel is Fourier transformed once. The data cube is then transformed
+        along its spatial axes for a batch of channels at a time, multiplied by the
+        transformed beam, transformed back and written into the data cube in place.
+        This gives the same result as :func:`scipy.signal.fftconvolve` with
+        ``mode="same"`` applied to each channel.
+
+        Parameters
+        ----------
+        max_batch_bytes : int, optional
+            Approximate maximum memory in bytes used for the Fourier transforms of a
+            batch of channels. (Default: ``2**28``)
+
+        workers : int, optional
+            Number of threads used by :mod:`scipy.fft`. (Default: ``None``)
+        """
+        array = self._datacube._array.value
+        if self._datacube.stokes_axis:
+            array = array[..., 0]
+        # in the precision of the data cube, so that the transforms are too
+        kernel = self.beam.kernel.to_value(U.dimensionless_unscaled).astype(
+            array.dtype, copy=False
+        )
+        # padded size avoids wrap-around, as for a full linear convolution
+        fft_shape = tuple(
+            scipy.fft.next_fast_len(n + k - 1, real=True)
+            for n, k in zip(array.shape[:2], kernel.shape)
+        )
+        # the "same" region of the full convolution
+        same = tuple(
+            np.s_[(k - 1) // 2 : (k - 1) // 2 + n]
+            for n, k in zip(array.shape[:2], kernel.shape)
+        )
+        kernel_fft = scipy.fft.rfft2(kernel, s=fft_shape, workers=workers)[
+            ..., np.newaxis
+        ]
+        # complex transform and real result of one channel:
+        channel_bytes = kernel_fft.nbytes + np.prod(fft_shape) * array.itemsize
+        batch_size = int(max(max_batch_bytes // channel_bytes, 1))
+        for first in range(0, array.shape[2], batch_size):
+            batch = np.s_[:, :, first : first + batch_size]
+            array[batch] = scipy.fft.irfft2(
+                scipy.fft.rfft2(array[batch], s=fft_shape, axes=(0, 1), workers=workers)
+                * kernel_fft,
+                s=fft_shape,
+                axes=(0, 1),
+                workers=workers,
+            )[same]
+        return
+
     def add_noise(self):
         """
         Insert noise into the data cube.
@@ -930,8 +1938,30 @@ class Martini(_BaseMartini):
             warn("Skipping noise, no noise object provided to Martini.")
             return
 
+        noise_cube = self._noise_cube()
+        self._datacube._array += noise_cube
+        if not self.quiet:
+            print(
+                "Noise added.",
+                f"  Noise cube RMS: {np.std(noise_cube):.2e} (before beam convolution).",
+                "  Data cube RMS after noise addition (before beam convolution): "
+                f"{np.std(self._datacube._array):.2e}",
+                sep="\n",
+            )
+        return
+
+    def _noise_cube(self):
+        """
+        Generate a noise realization matching the datacube array.
+
+        Returns
+        -------
+        out : ~astropy.units.Quantity
+            :class:`~astropy.units.Quantity` with the shape and units of the datacube
+            array.
+        """
         # this unit conversion means noise can be added before or after source insertion:
-        noise_cube = (
+        return (
             self.noise.generate(self._datacube, self.beam)
             .to(
                 U.Jy * U.arcsec**-2,
@@ -942,56 +1972,33 @@ class Martini(_BaseMartini):
                 equivalencies=[self._datacube.arcsec2_to_pix],
             )
         )
-        self._datacube._array = self._datacube._array + noise_cube
-        if not self.quiet:
-            print(
-                "Noise added.",
-                f"  Noise cube RMS: {np.std(noise_cube):.2e} (before beam convolution).",
-                "  Data cube RMS after noise addition (before beam convolution): "
-                f"{np.std(self._datacube._array):.2e}",
-                sep="\n",
-            )
-        return
 
-    def write_fits(
-        self,
-        filename,
-        overwrite=True,
-        obj_name="MOCK",
-        channels=None,  # deprecated
-    ):
+    def _fits_header(self, obj_name, unit, datamax, datamin):
         """
-        Output the data cube to a FITS-format file.
+        Assemble the header for FITS-format output of the data cube.
+
+        The header describes the data cube without its padding region, whether or not
+        the padding has been removed from the datacube array.
 
         Parameters
         ----------
-        filename : str
-            Name of the file to write. ``'.fits'`` will be appended if not already
-            present.
-
-        overwrite : bool, optional
-            Whether to allow overwriting existing files. (Default: ``True``)
-
         obj_name : str
             Name to write in the ``OBJECT`` FITS header field (max 16 characters).
-            (Default: ``"MOCK"``)
 
-        channels : str, deprecated
-            Deprecated, channels and their units now fixed at
-            :class:`~martini.datacube.DataCube` initialization.
-        """
+        unit : ~astropy.units.UnitBase
+            Units of the data, written in the ``BUNIT`` FITS header field.
 
-        if channels is not None:
-            warnings.warn(
-                DeprecationWarning(
-                    "`channels` argument to `write_fits` ignored, channels and their"
-                    " units now fixed at DataCube initialization."
-                )
-            )
-        self._datacube.drop_pad()
+        datamax : float
+            Maximum data value, written in the ``DATAMAX`` FITS header field.
 
-        filename = filename if filename[-5:] == ".fits" else filename + ".fits"
+        datamin : float
+            Minimum data value, written in the ``DATAMIN`` FITS header field.
 
+        Returns
+        -------
+        out : ~astropy.io.fits.Header
+            The FITS header.
+        """
         wcs_header = self._datacube.wcs.to_header()
         wcs_header.rename_keyword("WCSAXES", "NAXIS")
 
@@ -1006,12 +2013,12 @@ class Martini(_BaseMartini):
             header.append(("NAXIS4", 1))
         header.append(("EXTEND", "T"))
         header.append(("CDELT1", wcs_header["CDELT1"]))
-        header.append(("CRPIX1", wcs_header["CRPIX1"]))
+        header.append(("CRPIX1", wcs_header["CRPIX1"] - self._datacube.padx))
         header.append(("CRVAL1", wcs_header["CRVAL1"]))
         header.append(("CTYPE1", wcs_header["CTYPE1"]))
         header.append(("CUNIT1", wcs_header["CUNIT1"]))
         header.append(("CDELT2", wcs_header["CDELT2"]))
-        header.append(("CRPIX2", wcs_header["CRPIX2"]))
+        header.append(("CRPIX2", wcs_header["CRPIX2"] - self._datacube.pady))
         header.append(("CRVAL2", wcs_header["CRVAL2"]))
         header.append(("CTYPE2", wcs_header["CTYPE2"]))
         header.append(("CUNIT2", wcs_header["CUNIT2"]))
@@ -1030,13 +2037,8 @@ class Martini(_BaseMartini):
         header.append(("INSTRUME", "MARTINI", martini_version))
         header.append(("BSCALE", 1.0))
         header.append(("BZERO", 0.0))
-        datacube_array_units = self._datacube._array.unit
-        header.append(
-            ("DATAMAX", np.max(self._datacube._array.to_value(datacube_array_units)))
-        )
-        header.append(
-            ("DATAMIN", np.min(self._datacube._array.to_value(datacube_array_units)))
-        )
+        header.append(("DATAMAX", datamax))
+        header.append(("DATAMIN", datamin))
         header.append(("ORIGIN", "astropy v" + astropy_version))
         # long names break fits format, don't let the user set this
         if len(obj_name) > 16:
@@ -1048,7 +2050,7 @@ class Martini(_BaseMartini):
         if self.beam is not None:
             header.append(("BPA", self.beam.bpa.to_value(U.deg)))
         header.append(("OBSERVER", "K. Oman"))
-        header.append(("BUNIT", datacube_array_units.to_string("fits")))
+        header.append(("BUNIT", unit.to_string("fits")))
         header.append(("DATE-OBS", Time.now().to_value("fits")))
         header.append(("MJD-OBS", Time.now().to_value("mjd")))
         if self.beam is not None:
@@ -1058,12 +2060,467 @@ class Martini(_BaseMartini):
         header.append(("SPECSYS", wcs_header["SPECSYS"]))
         header.append(("RESTFRQ", wcs_header["RESTFRQ"]))
 
-        # flip axes to write
-        hdu = fits.PrimaryHDU(
-            header=header, data=self._datacube._array.to_value(datacube_array_units).T
+        return header
+
+    def _write_fits_blocks(self, filename, blocks, unit, overwrite, obj_name, bitpix):
+        """
+        Write the data cube to a FITS-format file a block of channels at a time.
+
+        The header is written first, then each block of channels is appended to the
+        file as it is received. The ``DATAMAX`` and ``DATAMIN`` header fields are
+        filled in once all of the blocks have been written.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to write.
+
+        blocks : iterable
+            Iterable over 3-tuples containing the first channel and one past the last
+            channel of a block, and the block of the data cube without its padding
+            region, in order of channels.
+
+        unit : ~astropy.units.UnitBase
+            Units of the data, written in the ``BUNIT`` FITS header field.
+
+        overwrite : bool
+            Whether to allow overwriting existing files.
+
+        obj_name : str
+            Name to write in the ``OBJECT`` FITS header field (max 16 characters).
+
+        bitpix : int
+            Data type of the file, ``-64`` for double or ``-32`` for single precision
+            floating point values. If ``None``, the precision of the data cube array is
+            used.
+
+        Returns
+        -------
+        out : float
+            The maximum value in the data cube.
+        """
+        if bitpix is None:
+            bitpix = -32 if self._datacube.dtype == np.float32 else -64
+        if bitpix not in (-64, -32):
+            raise ValueError(
+                "bitpix must be -64 (double precision) or -32 (single precision)."
+            )
+        if os.path.exists(filename):
+            if not overwrite:
+                raise OSError(f"File {filename} already exists.")
+            os.remove(filename)
+
+        # DATAMAX and DATAMIN are filled in once the data have been written
+        header = self._fits_header(obj_name, unit, 0.0, 0.0)
+        # written as it is, without the checks done by fits.PrimaryHDU
+        header["SIMPLE"] = True
+        header["BITPIX"] = bitpix
+        del header["EXTEND"]
+        # big-endian, as in the file, so the stream doesn't need to swap bytes
+        dtype = {-64: ">f8", -32: ">f4"}[bitpix]
+        datamax, datamin = -np.inf, np.inf
+        stream = fits.StreamingHDU(filename, header)
+        try:
+            for _, _, block in blocks:
+                # flip axes to write
+                data = np.ascontiguousarray(block.T, dtype=dtype)
+                datamax, datamin = max(datamax, data.max()), min(datamin, data.min())
+                stream.write(data)
+        finally:
+            stream.close()
+
+        # the header keeps its size, so it can be overwritten in place
+        with open(filename, "r+b") as f:
+            header = fits.Header.fromfile(f)
+            header["DATAMAX"] = float(datamax)
+            header["DATAMIN"] = float(datamin)
+            f.seek(0)
+            f.write(header.tostring().encode("ascii"))
+        return datamax
+
+    def write_fits(
+        self,
+        filename,
+        overwrite=True,
+        obj_name="MOCK",
+        channels=None,  # deprecated
+        bitpix=None,
+        channel_block=64,
+    ):
+        """
+        Output the data cube to a FITS-format file.
+
+        The header is written first and the data cube is then appended to the file a
+        block of channels at a time, so that no transposed copy of the whole data cube
+        is made.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to write. ``'.fits'`` will be appended if not already
+            present.
+
+        overwrite : bool, optional
+            Whether to allow overwriting existing files. (Default: ``True``)
+
+        obj_name : str
+            Name to write in the ``OBJECT`` FITS header field (max 16 characters).
+            (Default: ``"MOCK"``)
+
+        channels : str, deprecated
+            Deprecated, channels and their units now fixed at
+            :class:`~martini.datacube.DataCube` initialization.
+
+        bitpix : int, optional
+            Data type of the file, ``-64`` for double precision or ``-32`` for single
+            precision floating point values. Single precision halves the size of the
+            file. If ``None``, the precision of the data cube array is used (see the
+            ``dtype`` argument of :class:`~martini.martini.Martini`). (Default: ``None``)
+
+        channel_block : int, optional
+            Number of channels written at a time. (Default: ``64``)
+        """
+
+        if channels is not None:
+            warnings.warn(
+                DeprecationWarning(
+                    "`channels` argument to `write_fits` ignored, channels and their"
+                    " units now fixed at DataCube initialization."
+                )
+            )
+        if channel_block < 1:
+            raise ValueError("channel_block must be at least 1.")
+        self._datacube.drop_pad()
+
+        filename = filename if filename[-5:] == ".fits" else filename + ".fits"
+
+        datacube_array_units = self._datacube._array.unit
+        array = self._datacube._array.to_value(datacube_array_units)
+        n_channels = self._datacube.n_channels
+        # views of the array, no copies
+        blocks = [
+            (
+                first,
+                min(first + channel_block, n_channels),
+                array[:, :, first : first + channel_block],
+            )
+            for first in range(0, n_channels, channel_block)
+        ]
+        self._write_fits_blocks(
+            filename,
+            blocks,
+            datacube_array_units,
+            overwrite,
+            obj_name,
+            bitpix,
+        )
+
+        return
+
+    def _prepare_stream(
+        self,
+        channel_block,
+        add_noise,
+        convolve_beam,
+        skip_validation,
+        ncpu,
+        engine,
+        backend,
+    ):
+        """
+        Check the arguments for creating the mock observation a block of channels at a
+        time.
+
+        Parameters
+        ----------
+        channel_block : int
+            Number of channels processed at a time.
+
+        add_noise : bool
+            Whether to add noise.
+
+        convolve_beam : bool
+            Whether to convolve with the beam.
+
+        skip_validation : bool
+            Skip validation of the SPH kernel.
+
+        ncpu : int
+            Number of processes (or threads) to use in the source insertion.
+
+        engine : str
+            Algorithm used to insert the source.
+
+        backend : str
+            How the source insertion is shared out when ``ncpu > 1``.
+
+        Returns
+        -------
+        out : tuple
+            A 3-tuple containing whether noise will be added, whether the beam
+            convolution will be carried out, and the units of the output.
+        """
+        self._validate_engine(ncpu=ncpu, engine=engine, backend=backend)
+        if channel_block < 1:
+            raise ValueError("channel_block must be at least 1.")
+        if add_noise and self.noise is None:
+            warn("Skipping noise, no noise object provided to Martini.")
+            add_noise = False
+        if convolve_beam and self.beam is None:
+            warn("Skipping beam convolution, no beam object provided to Martini.")
+            convolve_beam = False
+        if convolve_beam:
+            self._confirm_beam_padding()
+        self.sph_kernel._confirm_validation(noraise=skip_validation, quiet=self.quiet)
+        output_unit = U.Jy * U.beam**-1 if convolve_beam else U.Jy * U.arcsec**-2
+        return add_noise, convolve_beam, output_unit
+
+    def _stream_channel_blocks(
+        self,
+        channel_block,
+        add_noise,
+        convolve_beam,
+        output_unit,
+        progressbar,
+        ncpu,
+        engine,
+        backend,
+        max_batch_bytes,
+        workers,
+    ):
+        """
+        Create the mock observation a block of channels at a time.
+
+        The datacube array and spectra of this instance are swapped out for those of
+        each block in turn and restored when the generator is exhausted or closed.
+
+        Parameters
+        ----------
+        channel_block : int
+            Number of channels processed at a time.
+
+        add_noise : bool
+            Whether to add noise.
+
+        convolve_beam : bool
+            Whether to convolve with the beam.
+
+        output_unit : ~astropy.units.UnitBase
+            Units of the yielded blocks.
+
+        progressbar : bool
+            Whether to show a progress bar counting blocks of channels.
+
+        ncpu : int
+            Number of processes (or threads) to use in the source insertion.
+
+        engine : str
+            Algorithm used to insert the source.
+
+        backend : str
+            How the source insertion is shared out when ``ncpu > 1``.
+
+        max_batch_bytes : int
+            Approximate maximum memory in bytes used for the Fourier transforms in the
+            beam convolution.
+
+        workers : int
+            Number of threads used by :mod:`scipy.fft` for the beam convolution.
+
+        Yields
+        ------
+        out : tuple
+            A 3-tuple containing the first channel and one past the last channel of the
+            block, and the block of the data cube without its padding region, in units
+            of ``output_unit``.
+        """
+        padded_shape = self._datacube._array.shape
+        n_channels = self._datacube.n_channels
+        unpadded = np.s_[
+            self._datacube.padx : self._datacube.padx + self._datacube.n_px_x,
+            self._datacube.pady : self._datacube.pady + self._datacube.n_px_y,
+            ...,
+        ]
+        cached_array = self._datacube._array
+        try:
+            for first in tqdm.tqdm(
+                range(0, n_channels, channel_block), disable=not progressbar
+            ):
+                last = min(first + channel_block, n_channels)
+                # point the insertion engines at a datacube array and spectra for
+                # this block of channels only
+                self._block_spectra = None
+                self._block_spectra = self._channel_block_spectra(first, last)
+                self._datacube._array = (
+                    np.zeros(
+                        padded_shape[:2] + (last - first,) + padded_shape[3:],
+                        dtype=self._datacube.dtype,
+                    )
+                    * U.Jy
+                    * U.pix**-2
+                )
+                self._fill_datacube_array(
+                    progressbar=False, ncpu=ncpu, engine=engine, backend=backend
+                )
+                self._datacube._to_unit(
+                    U.Jy / U.arcsec**2, equivalencies=[self._datacube.arcsec2_to_pix]
+                )
+                if add_noise:
+                    self._datacube._array += self._noise_cube()
+                if convolve_beam:
+                    self._convolve_beam_batched(
+                        max_batch_bytes=max_batch_bytes, workers=workers
+                    )
+                yield first, last, self._datacube._array[unpadded].to_value(
+                    output_unit,
+                    equivalencies=(
+                        U.beam_angular_area(self.beam.area) if convolve_beam else []
+                    ),
+                )
+        finally:
+            self._datacube._array = cached_array
+            self._block_spectra = None
+        return
+
+    def stream_to_fits(
+        self,
+        filename,
+        channel_block=64,
+        add_noise=True,
+        convolve_beam=True,
+        skip_validation=False,
+        progressbar=None,
+        ncpu=1,
+        engine="pixel",
+        backend="process",
+        overwrite=True,
+        obj_name="MOCK",
+        max_batch_bytes=2**28,
+        workers=None,
+        bitpix=None,
+    ):
+        """
+        Create the mock observation and write it to a FITS-format file, a block of
+        channels at a time.
+
+        This is equivalent to calling
+        :meth:`~martini.martini.Martini.insert_source_in_cube`,
+        :meth:`~martini.martini.Martini.add_noise`,
+        :meth:`~martini.martini.Martini.convolve_beam` and
+        :meth:`~martini.martini.Martini.write_fits` in turn, except that each step is
+        carried out for a block of ``channel_block`` channels before moving on to the
+        next block, and each block is appended to the output file as soon as it is
+        complete. The memory needed for the data cube and the intermediate arrays
+        (noise, convolution) is then proportional to the size of a block rather than
+        the size of the full cube. The datacube held by this
+        :class:`~martini.martini.Martini` instance is left unchanged.
+
+        The result is the same as without streaming, except that the noise is drawn
+        one block at a time so the realization differs from that drawn by
+        :meth:`~martini.martini.Martini.add_noise` with the same seed.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to write. ``'.fits'`` will be appended if not already
+            present.
+
+        channel_block : int, optional
+            Number of channels processed at a time. Smaller blocks use less memory but
+            add overhead to the source insertion, which is repeated for each block.
+            (Default: ``64``)
+
+        add_noise : bool, optional
+            Whether to add noise (if a noise model was provided). (Default: ``True``)
+
+        convolve_beam : bool, optional
+            Whether to convolve with the beam (if a beam was provided).
+            (Default: ``True``)
+
+        skip_validation : bool, optional
+            Skip validation of the SPH kernel, see
+            :meth:`~martini.martini.Martini.insert_source_in_cube`.
+            (Default: ``False``)
+
+        progressbar : bool, optional
+            Whether to show a progress bar counting blocks of channels. If
+            :class:`~martini.martini.Martini` was initialised with ``quiet`` set to
+            ``True``, progress bars are switched off unless explicitly turned on.
+            (Default: ``None``)
+
+        ncpu : int, optional
+            Number of processes (or threads) to use in the source insertion, see
+            :meth:`~martini.martini.Martini.insert_source_in_cube`. (Default: ``1``)
+
+        engine : str, optional
+            Algorithm used to insert the source, see
+            :meth:`~martini.martini.Martini.insert_source_in_cube`.
+            (Default: ``"pixel"``)
+
+        backend : str, optional
+            How the source insertion is shared out when ``ncpu > 1``, see
+            :meth:`~martini.martini.Martini.insert_source_in_cube`.
+            (Default: ``"process"``)
+
+        overwrite : bool, optional
+            Whether to allow overwriting existing files. (Default: ``True``)
+
+        obj_name : str, optional
+            Name to write in the ``OBJECT`` FITS header field (max 16 characters).
+            (Default: ``"MOCK"``)
+
+        max_batch_bytes : int, optional
+            Approximate maximum memory in bytes used for the Fourier transforms in the
+            beam convolution, see :meth:`~martini.martini.Martini.convolve_beam`.
+            (Default: ``2**28``)
+
+        workers : int, optional
+            Number of threads used by :mod:`scipy.fft` for the beam convolution.
+            (Default: ``None``)
+
+        bitpix : int, optional
+            Data type of the file, ``-64`` for double precision or ``-32`` for single
+            precision floating point values, see
+            :meth:`~martini.martini.Martini.write_fits`. (Default: ``None``)
+        """
+        if progressbar is None:
+            progressbar = not self.quiet
+        add_noise, convolve_beam, output_unit = self._prepare_stream(
+            channel_block,
+            add_noise,
+            convolve_beam,
+            skip_validation,
+            ncpu,
+            engine,
+            backend,
         )
-        hdu.writeto(filename, overwrite=overwrite)
 
+        filename = filename if filename[-5:] == ".fits" else filename + ".fits"
+        blocks = self._stream_channel_blocks(
+            channel_block,
+            add_noise,
+            convolve_beam,
+            output_unit,
+            progressbar,
+            ncpu,
+            engine,
+            backend,
+            max_batch_bytes,
+            workers,
+        )
+        try:
+            datamax = self._write_fits_blocks(
+                filename, blocks, output_unit, overwrite, obj_name, bitpix
+            )
+        finally:
+            blocks.close()
+        if not self.quiet:
+            print(
+                f"Data cube written to {filename} in blocks of {channel_block}"
+                " channels.",
+                f"  Maximum pixel: {datamax:.2e} {output_unit}",
+                sep="\n",
+            )
         return
 
     def write_beam_fits(
@@ -1166,166 +2623,138 @@ class Martini(_BaseMartini):
 
         return
 
-    def write_hdf5(
-        self,
-        filename,
-        overwrite=True,
-        memmap=False,
-        compact=False,
-        channels=None,  # deprecated
+    def _write_hdf5_coordinates(
+        self, f, separable_coordinates, channel_block, **kwargs
     ):
         """
-        Output the data cube and beam to a HDF5-format file. Requires the :mod:`h5py`
-        package.
+        Write the coordinates of the voxel centres and vertices to a HDF5 file.
+
+        The celestial and spectral axes of the data cube's WCS are independent, so the
+        RA and Dec are evaluated once for each spatial pixel and the channel coordinates
+        once for each channel. If the coordinates are written on grids covering every
+        voxel, the grids are filled a block of channels at a time, so no array the
+        size of a grid is held in memory.
 
         Parameters
         ----------
-        filename : str
-            Name of the file to write. ``'.hdf5'`` will be appended if not already
-            present.
+        f : h5py.File
+            The open output file.
 
-        overwrite : bool, optional
-            Whether to allow overwriting existing files. (Default: ``True``)
-
-        memmap : bool, optional
-            If ``True``, create a file-like object in memory and return it instead
-            of writing file to disk. (Default: ``False``)
+        separable_coordinates : bool
+            If ``True``, write the RA and Dec as 2D arrays over the spatial pixels and
+            the channel coordinates as 1D arrays. If ``False``, write each as a 3D
+            array over all voxels.
 
-        compact : bool, optional
-            If ``True``, omit pixel coordinate arrays to save disk space. In this
-            case pixel coordinates can still be reconstructed from FITS-style
-            keywords stored in the FluxCube attributes. (Default: ``False``)
+        channel_block : int
+            Number of channels of the 3D coordinate grids written at a time.
 
-        channels : str, deprecated
-            Deprecated, channels and their units now fixed at
-            :class:`~martini.datacube.DataCube` initialization.
+        **kwargs
+            Further arguments passed to :meth:`h5py.Group.create_dataset` for the 3D
+            coordinate grids, such as ``chunks`` and ``compression``.
         """
+        wcs_header = self._datacube.wcs.to_header()
+        origin = 0  # index from 0 like numpy, not from 1
 
-        if channels is not None:
-            warnings.warn(
-                DeprecationWarning(
-                    "`channels` argument to `write_fits` ignored, channels and their"
-                    " units now fixed at DataCube initialization."
-                )
+        def pix2world(*pixel):
+            """
+            Convert pixel coordinates to world coordinates, broadcasting the pixel
+            coordinates against each other.
+
+            Parameters
+            ----------
+            *pixel : tuple
+                Pixel coordinates along the RA, Dec and spectral axes.
+
+            Returns
+            -------
+            out : list
+                World coordinates along each axis.
+            """
+            if self._datacube.stokes_axis:
+                pixel = pixel + (0,)
+            return self._datacube.wcs.all_pix2world(
+                *np.broadcast_arrays(*pixel), origin
             )
 
-        import h5py
+        for names, offset, extra in (
+            # voxel centre coordinates:
+            (("RA", "Dec", "channel_mids"), 0, 0),
+            # voxel vertex coordinates (for e.g. pyplot.pcolormesh):
+            (("RA_vertices", "Dec_vertices", "channel_vertices"), -0.5, 1),
+        ):
+            # pixels of the data cube without its padding region
+            xpx = (
+                np.arange(self._datacube.n_px_x + extra) + offset + self._datacube.padx
+            )
+            ypx = (
+                np.arange(self._datacube.n_px_y + extra) + offset + self._datacube.pady
+            )
+            vpx = np.arange(self._datacube.n_channels + extra) + offset
+            ragrid, decgrid = pix2world(xpx[:, np.newaxis], ypx[np.newaxis, :], 0)[:2]
+            chgrid = pix2world(xpx[0], ypx[0], vpx)[2]
+            grid_shape = (xpx.size, ypx.size, vpx.size)
+            for name, values, unit, axes in (
+                (names[0], ragrid[..., np.newaxis], wcs_header["CUNIT1"], (2,)),
+                (names[1], decgrid[..., np.newaxis], wcs_header["CUNIT2"], (2,)),
+                (
+                    names[2],
+                    chgrid[np.newaxis, np.newaxis],
+                    wcs_header["CUNIT3"],
+                    (0, 1),
+                ),
+            ):
+                if separable_coordinates:
+                    # axes of length 1 added above for broadcasting
+                    f[name] = np.squeeze(values, axis=axes)
+                else:
+                    dataset = f.create_dataset(
+                        name, shape=grid_shape, dtype=values.dtype, **kwargs
+                    )
+                    for first in range(0, grid_shape[2], channel_block):
+                        last = min(first + channel_block, grid_shape[2])
+                        dataset[..., first:last] = np.broadcast_to(values, grid_shape)[
+                            ..., first:last
+                        ]
+                f[name].attrs["Unit"] = unit
+        # channels:
+        for dataset_name in (
+            "velocity_channel_mids",
+            "velocity_channel_edges",
+            "frequency_channel_mids",
+            "frequency_channel_edges",
+        ):
+            f[dataset_name] = getattr(self._datacube, dataset_name)
+            f[dataset_name].attrs["Unit"] = str(
+                getattr(self._datacube, dataset_name).unit
+            )
+        return
 
-        self._datacube.drop_pad()
+    def _write_hdf5_attributes(self, f, unit):
+        """
+        Write the attributes of the data cube and the beam image to a HDF5 file.
 
-        filename = filename if filename[-5:] == ".hdf5" else filename + ".hdf5"
+        The attributes describe the data cube without its padding region, whether or
+        not the padding has been removed from the datacube array.
 
-        wcs_header = self._datacube.wcs.to_header()
+        Parameters
+        ----------
+        f : h5py.File
+            The open output file, containing the ``"FluxCube"`` dataset.
 
-        mode = "w" if overwrite else "x"
-        driver = "core" if memmap else None
-        h5_kwargs = {"backing_store": False} if memmap else dict()
-        f = h5py.File(filename, mode, driver=driver, **h5_kwargs)
-        datacube_array_units = self._datacube._array.unit
-        f["FluxCube"] = self._datacube._array.to_value(datacube_array_units).squeeze()
+        unit : ~astropy.units.UnitBase
+            Units of the data cube.
+        """
+        wcs_header = self._datacube.wcs.to_header()
         c = f["FluxCube"]
-        origin = 0  # index from 0 like numpy, not from 1
-        if not compact:
-            # voxel centre coordinates:
-            xgrid, ygrid, vgrid = np.meshgrid(
-                np.arange(self._datacube._array.shape[0]),
-                np.arange(self._datacube._array.shape[1]),
-                np.arange(self._datacube._array.shape[2]),
-                indexing="ij",
-            )
-            cgrid = (
-                np.vstack(
-                    (
-                        xgrid.flatten(),
-                        ygrid.flatten(),
-                        vgrid.flatten(),
-                        np.zeros(vgrid.shape).flatten(),
-                    )
-                ).T
-                if self._datacube.stokes_axis
-                else np.vstack(
-                    (
-                        xgrid.flatten(),
-                        ygrid.flatten(),
-                        vgrid.flatten(),
-                    )
-                ).T
-            )
-            wgrid = self._datacube.wcs.all_pix2world(cgrid, origin)
-            grid_shape = (
-                self.datacube.n_px_x,
-                self.datacube.n_px_y,
-                self.datacube.n_channels,
-            )
-            ragrid = wgrid[:, 0].reshape(grid_shape)
-            decgrid = wgrid[:, 1].reshape(grid_shape)
-            chgrid = wgrid[:, 2].reshape(grid_shape)
-            f["RA"] = ragrid
-            f["RA"].attrs["Unit"] = wcs_header["CUNIT1"]
-            f["Dec"] = decgrid
-            f["Dec"].attrs["Unit"] = wcs_header["CUNIT2"]
-            f["channel_mids"] = chgrid
-            f["channel_mids"].attrs["Unit"] = wcs_header["CUNIT3"]
-            # voxel vertex coordinates (for e.g. pyplot.pcolormesh):
-            xgrid_vertices, ygrid_vertices, vgrid_vertices = np.meshgrid(
-                np.arange(self._datacube._array.shape[0] + 1) - 0.5,
-                np.arange(self._datacube._array.shape[1] + 1) - 0.5,
-                np.arange(self._datacube._array.shape[2] + 1) - 0.5,
-                indexing="ij",
-            )
-            cgrid_vertices = (
-                np.vstack(
-                    (
-                        xgrid_vertices.flatten(),
-                        ygrid_vertices.flatten(),
-                        vgrid_vertices.flatten(),
-                        np.zeros(vgrid_vertices.shape).flatten(),
-                    )
-                ).T
-                if self._datacube.stokes_axis
-                else np.vstack(
-                    (
-                        xgrid_vertices.flatten(),
-                        ygrid_vertices.flatten(),
-                        vgrid_vertices.flatten(),
-                    )
-                ).T
-            )
-            wgrid_vertices = self._datacube.wcs.all_pix2world(cgrid_vertices, origin)
-            vertices_grid_shape = (
-                self.datacube.n_px_x + 1,
-                self.datacube.n_px_y + 1,
-                self.datacube.n_channels + 1,
-            )
-            ragrid_vertices = wgrid_vertices[:, 0].reshape(vertices_grid_shape)
-            decgrid_vertices = wgrid_vertices[:, 1].reshape(vertices_grid_shape)
-            chgrid_vertices = wgrid_vertices[:, 2].reshape(vertices_grid_shape)
-            f["RA_vertices"] = ragrid_vertices
-            f["RA_vertices"].attrs["Unit"] = wcs_header["CUNIT1"]
-            f["Dec_vertices"] = decgrid_vertices
-            f["Dec_vertices"].attrs["Unit"] = wcs_header["CUNIT2"]
-            f["channel_vertices"] = chgrid_vertices
-            f["channel_vertices"].attrs["Unit"] = wcs_header["CUNIT3"]
-            # channels:
-            for dataset_name in (
-                "velocity_channel_mids",
-                "velocity_channel_edges",
-                "frequency_channel_mids",
-                "frequency_channel_edges",
-            ):
-                f[dataset_name] = getattr(self._datacube, dataset_name)
-                f[dataset_name].attrs["Unit"] = str(
-                    getattr(self._datacube, dataset_name).unit
-                )
         c.attrs["AxisOrder"] = "(RA,Dec,Channels)"
-        c.attrs["FluxCubeUnit"] = str(self._datacube._array.unit)
+        c.attrs["FluxCubeUnit"] = str(unit)
         c.attrs["deltaRA_in_RAUnit"] = wcs_header["CDELT1"]
-        c.attrs["RA0_in_px"] = wcs_header["CRPIX1"] - 1
+        c.attrs["RA0_in_px"] = wcs_header["CRPIX1"] - 1 - self._datacube.padx
         c.attrs["RA0_in_RAUnit"] = wcs_header["CRVAL1"]
         c.attrs["RAUnit"] = wcs_header["CUNIT1"]
         c.attrs["RAProjType"] = wcs_header["CTYPE1"]
         c.attrs["deltaDec_in_DecUnit"] = wcs_header["CDELT2"]
-        c.attrs["Dec0_in_px"] = wcs_header["CRPIX2"] - 1
+        c.attrs["Dec0_in_px"] = wcs_header["CRPIX2"] - 1 - self._datacube.pady
         c.attrs["Dec0_in_DecUnit"] = wcs_header["CRVAL2"]
         c.attrs["DecUnit"] = wcs_header["CUNIT2"]
         c.attrs["DecProjType"] = wcs_header["CTYPE2"]
@@ -1374,12 +2803,282 @@ class Martini(_BaseMartini):
             b.attrs["MartiniVersion"] = martini_version
             b.attrs["AstropyVersion"] = astropy_version
 
+        return
+
+    def write_hdf5(
+        self,
+        filename,
+        overwrite=True,
+        memmap=False,
+        compact=False,
+        channels=None,  # deprecated
+        separable_coordinates=False,
+        chunks=None,
+        compression=None,
+        compression_opts=None,
+        channel_block=64,
+    ):
+        """
+        Output the data cube and beam to a HDF5-format file. Requires the :mod:`h5py`
+        package.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to write. ``'.hdf5'`` will be appended if not already
+            present.
+
+        overwrite : bool, optional
+            Whether to allow overwriting existing files. (Default: ``True``)
+
+        memmap : bool, optional
+            If ``True``, create a file-like object in memory and return it instead
+            of writing file to disk. (Default: ``False``)
+
+        compact : bool, optional
+            If ``True``, omit pixel coordinate arrays to save disk space. In this
+            case pixel coordinates can still be reconstructed from FITS-style
+            keywords stored in the FluxCube attributes. (Default: ``False``)
+
+        channels : str, deprecated
+            Deprecated, channels and their units now fixed at
+            :class:`~martini.datacube.DataCube` initialization.
+
+        separable_coordinates : bool, optional
+            If ``True``, write the RA and Dec pixel coordinates as 2D arrays over the
+            spatial pixels and the channel coordinates as 1D arrays, instead of 3D
+            arrays over all voxels. (Default: ``False``)
+
+        chunks : tuple or bool, optional
+            Chunk shape of the FluxCube dataset and 3D coordinate grids, or ``True``
+            to let :mod:`h5py` choose one. (Default: ``None``)
+
+        compression : str or int, optional
+            Compression filter for the FluxCube dataset and 3D coordinate grids, for
+            example ``"gzip"`` or ``"lzf"``. Implies chunked datasets. (Default:
+            ``None``)
+
+        compression_opts : int or tuple, optional
+            Options for the compression filter, for example the level (0 to 9) for
+            ``"gzip"``. (Default: ``None``)
+
+        channel_block : int, optional
+            Number of channels of the 3D coordinate grids written at a time.
+            (Default: ``64``)
+
+        Returns
+        -------
+        out : h5py.File or None
+            The open in-memory file if ``memmap`` is ``True``, otherwise ``None``.
+        """
+
+        if channels is not None:
+            warnings.warn(
+                DeprecationWarning(
+                    "`channels` argument to `write_fits` ignored, channels and their"
+                    " units now fixed at DataCube initialization."
+                )
+            )
+        if channel_block < 1:
+            raise ValueError("channel_block must be at least 1.")
+
+        import h5py
+
+        self._datacube.drop_pad()
+
+        filename = filename if filename[-5:] == ".hdf5" else filename + ".hdf5"
+
+        dataset_kwargs = dict(
+            chunks=chunks, compression=compression, compression_opts=compression_opts
+        )
+        mode = "w" if overwrite else "x"
+        driver = "core" if memmap else None
+        h5_kwargs = {"backing_store": False} if memmap else dict()
+        f = h5py.File(filename, mode, driver=driver, **h5_kwargs)
+        datacube_array_units = self._datacube._array.unit
+        f.create_dataset(
+            "FluxCube",
+            data=self._datacube._array.to_value(datacube_array_units).squeeze(),
+            **dataset_kwargs,
+        )
+        if not compact:
+            self._write_hdf5_coordinates(
+                f, separable_coordinates, channel_block, **dataset_kwargs
+            )
+        self._write_hdf5_attributes(f, datacube_array_units)
+
         if memmap:
             return f
         else:
             f.close()
             return
 
+    def stream_to_hdf5(
+        self,
+        filename,
+        channel_block=64,
+        add_noise=True,
+        convolve_beam=True,
+        skip_validation=False,
+        progressbar=None,
+        ncpu=1,
+        engine="pixel",
+        backend="process",
+        overwrite=True,
+        compact=False,
+        separable_coordinates=False,
+        chunks=None,
+        compression=None,
+        compression_opts=None,
+        max_batch_bytes=2**28,
+        workers=None,
+    ):
+        """
+        Create the mock observation and write it to a HDF5-format file, a block of
+        channels at a time. Requires the :mod:`h5py` package.
+
+        This is the HDF5-format counterpart of
+        :meth:`~martini.martini.Martini.stream_to_fits`: the source insertion, noise
+        and beam convolution are carried out for a block of ``channel_block`` channels
+        at a time, and each block is written to the output file as soon as it is
+        complete. The file has the same layout as that written by
+        :meth:`~martini.martini.Martini.write_hdf5`. The datacube held by this
+        :class:`~martini.martini.Martini` instance is left unchanged.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to write. ``'.hdf5'`` will be appended if not already
+            present.
+
+        channel_block : int, optional
+            Number of channels processed at a time. Smaller blocks use less memory but
+            add overhead to the source insertion, which is repeated for each block.
+            (Default: ``64``)
+
+        add_noise : bool, optional
+            Whether to add noise (if a noise model was provided). (Default: ``True``)
+
+        convolve_beam : bool, optional
+            Whether to convolve with the beam (if a beam was provided).
+            (Default: ``True``)
+
+        skip_validation : bool, optional
+            Skip validation of the SPH kernel, see
+            :meth:`~martini.martini.Martini.insert_source_in_cube`.
+            (Default: ``False``)
+
+        progressbar : bool, optional
+            Whether to show a progress bar counting blocks of channels. If
+            :class:`~martini.martini.Martini` was initialised with ``quiet`` set to
+            ``True``, progress bars are switched off unless explicitly turned on.
+            (Default: ``None``)
+
+        ncpu : int, optional
+            Number of processes (or threads) to use in the source insertion, see
+            :meth:`~martini.martini.Martini.insert_source_in_cube`. (Default: ``1``)
+
+        engine : str, optional
+            Algorithm used to insert the source, see
+            :meth:`~martini.martini.Martini.insert_source_in_cube`.
+            (Default: ``"pixel"``)
+
+        backend : str, optional
+            How the source insertion is shared out when ``ncpu > 1``, see
+            :meth:`~martini.martini.Martini.insert_source_in_cube`.
+            (Default: ``"process"``)
+
+        overwrite : bool, optional
+            Whether to allow overwriting existing files. (Default: ``True``)
+
+        compact : bool, optional
+            If ``True``, omit pixel coordinate arrays, see
+            :meth:`~martini.martini.Martini.write_hdf5`. (Default: ``False``)
+
+        separable_coordinates : bool, optional
+            If ``True``, write 2D RA and Dec and 1D channel coordinate arrays, see
+            :meth:`~martini.martini.Martini.write_hdf5`. (Default: ``False``)
+
+        chunks : tuple or bool, optional
+            Chunk shape of the FluxCube dataset and 3D coordinate grids, see
+            :meth:`~martini.martini.Martini.write_hdf5`. (Default: ``None``)
+
+        compression : str or int, optional
+            Compression filter for the FluxCube dataset and 3D coordinate grids, see
+            :meth:`~martini.martini.Martini.write_hdf5`. (Default: ``None``)
+
+        compression_opts : int or tuple, optional
+            Options for the compression filter. (Default: ``None``)
+
+        max_batch_bytes : int, optional
+            Approximate maximum memory in bytes used for the Fourier transforms in the
+            beam convolution, see :meth:`~martini.martini.Martini.convolve_beam`.
+            (Default: ``2**28``)
+
+        workers : int, optional
+            Number of threads used by :mod:`scipy.fft` for the beam convolution.
+            (Default: ``None``)
+        """
+        import h5py
+
+        if progressbar is None:
+            progressbar = not self.quiet
+        add_noise, convolve_beam, output_unit = self._prepare_stream(
+            channel_block,
+            add_noise,
+            convolve_beam,
+            skip_validation,
+            ncpu,
+            engine,
+            backend,
+        )
+
+        filename = filename if filename[-5:] == ".hdf5" else filename + ".hdf5"
+
+        dataset_kwargs = dict(
+            chunks=chunks, compression=compression, compression_opts=compression_opts
+        )
+        blocks = self._stream_channel_blocks(
+            channel_block,
+            add_noise,
+            convolve_beam,
+            output_unit,
+            progressbar,
+            ncpu,
+            engine,
+            backend,
+            max_batch_bytes,
+            workers,
+        )
+        with h5py.File(filename, "w" if overwrite else "x") as f:
+            c = f.create_dataset(
+                "FluxCube",
+                shape=(
+                    self._datacube.n_px_x,
+                    self._datacube.n_px_y,
+                    self._datacube.n_channels,
+                ),
+                dtype=self._datacube.dtype,
+                **dataset_kwargs,
+            )
+            try:
+                for first, last, block in blocks:
+                    # drop the stokes axis, if any
+                    c[..., first:last] = block.reshape(block.shape[:3])
+            finally:
+                blocks.close()
+            if not compact:
+                self._write_hdf5_coordinates(
+                    f, separable_coordinates, channel_block, **dataset_kwargs
+                )
+            self._write_hdf5_attributes(f, output_unit)
+        if not self.quiet:
+            print(
+                f"Data cube written to {filename} in blocks of {channel_block}"
+                " channels."
+            )
+        return
+
 
 class GlobalProfile(_BaseMartini):
     """
@@ -1440,6 +3139,20 @@ class GlobalProfile(_BaseMartini):
     quiet : bool, optional
         If ``True``, suppress output to stdout. (Default: ``False``)
 
+    direct : bool, optional
+        If ``True``, calculate the spectrum directly from the line-of-sight velocities
+        of the particles with
+        :meth:`~martini.spectral_models._BaseSpectrum.global_spectrum`, instead of
+        inserting the source into a :class:`~martini.datacube.DataCube` with a single
+        pixel. This is much faster and uses much less memory, but the spectra of
+        individual particles and their pixel coordinates are then not available.
+        (Default: ``False``)
+
+    fast_projection : bool, optional
+        If ``True``, calculate the sky coordinates (and pixel coordinates, if needed)
+        of the particles with :mod:`numpy` instead of :mod:`astropy.coordinates`, see
+        :class:`~martini.martini.Martini`. (Default: ``False``)
+
     channels : str, deprecated
         Deprecated, channels and their units now fixed at
         :class:`~martini.datacube.DataCube` initialization.
@@ -1526,6 +3239,8 @@ class GlobalProfile(_BaseMartini):
         channel_width=4 * U.km * U.s**-1,
         spectral_centre=0 * U.km * U.s**-1,
         quiet=False,
+        direct=False,
+        fast_projection=False,
         channels=None,  # deprecated
     ):
         if channels is not None:
@@ -1537,13 +3252,32 @@ class GlobalProfile(_BaseMartini):
                     " units they are evenly spaced in frequency."
                 )
             )
+        datacube = _GlobalProfileDataCube(
+            n_channels=n_channels,
+            channel_width=channel_width,
+            spectral_centre=spectral_centre,
+        )
+        self.direct = direct
+        if self.direct:
+            # no kernel, pixel coordinates or spectra of particles are needed
+            self.quiet = quiet
+            if source is None:
+                raise ValueError("A source instance is required.")
+            if spectral_model is None:
+                raise ValueError("A spectral model instance is required.")
+            self.source = source
+            self._datacube = datacube
+            self.beam = None
+            self.noise = None
+            self.sph_kernel = None
+            self.spectral_model = spectral_model
+            # the sky coordinates are not transformed to the frame of the data cube
+            self._fast_projection = fast_projection
+            self.source._init_skycoords(fast=self._fast_projection)
+            return
         super().__init__(
             source=source,
-            datacube=_GlobalProfileDataCube(
-                n_channels=n_channels,
-                channel_width=channel_width,
-                spectral_centre=spectral_centre,
-            ),
+            datacube=datacube,
             beam=None,
             noise=None,
             sph_kernel=DiracDeltaKernel(size_in_fwhm=np.inf),
@@ -1554,8 +3288,10 @@ class GlobalProfile(_BaseMartini):
                 obj_type_str="spectrum",
             ),
             quiet=quiet,
+            fast_projection=fast_projection,
         )
         self.source.pixcoords[:2] = 0
+        self._init_spatial_index()
 
         return
 
@@ -1569,24 +3305,33 @@ class GlobalProfile(_BaseMartini):
         regardless of  position on the sky. The line-of-sight vector still depends on
         the particle positions, so the direction to the individual particles is still
         taken into account.
+
+        If the :class:`~martini.martini.GlobalProfile` was initialized with
+        ``direct=True`` the spectrum is calculated directly from the particle
+        velocities and the :class:`~martini.datacube.DataCube` is left empty.
         """
-        # skip_validation=True: all particles can contribute their kernel to the pixel;
-        # ncpu=1 since we have 1 pixel and source insertion is parallel over pixels;
-        # no progressbar since there's only 1 pixel of progress;
-        # quiet=True because messages assume a resolved source, replace with new ones
-        super()._insert_source_in_cube(
-            skip_validation=True, progressbar=False, ncpu=1, quiet=True
-        )
-        # The datacube in Jy/arcsec^2 is a bit misleading because the source is
-        # (presumably) completely unresolved so extrapolating its surface brightness
-        # across the entire pixel is incorrect. Correctly integrate out spatial
-        # information and convert to Jy:
-        self._spectrum = (
-            (self._datacube._array.squeeze()).to(
-                U.Jy / U.pix**2, equivalencies=[self._datacube.arcsec2_to_pix]
-            )
-            * U.pix**2
-        ).to(U.Jy)
+        if self.direct:
+            self._spectrum = self.spectral_model.global_spectrum(
+                self.source, self._datacube
+            )
+        else:
+            # skip_validation=True: all particles can contribute their kernel to the
+            # pixel; ncpu=1 since we have 1 pixel and source insertion is parallel
+            # over pixels; no progressbar since there's only 1 pixel of progress;
+            # quiet=True because messages assume a resolved source, replace them
+            super()._insert_source_in_cube(
+                skip_validation=True, progressbar=False, ncpu=1, quiet=True
+            )
+            # The datacube in Jy/arcsec^2 is a bit misleading because the source is
+            # (presumably) completely unresolved so extrapolating its surface
+            # brightness across the entire pixel is incorrect. Correctly integrate out
+            # spatial information and convert to Jy:
+            self._spectrum = (
+                (self._datacube._array.squeeze()).to(
+                    U.Jy / U.pix**2, equivalencies=[self._datacube.arcsec2_to_pix]
+                )
+                * U.pix**2
+            ).to(U.Jy)
         if not self.quiet:
             # Need a slightly different calculation for a completely unresolved source.
             inserted_flux_density = self.spectrum.sum()
@@ -1,4 +1,4 @@
-from numpy import ndarray
+from numpy import ndarray, dtype
 import typing as T
 from martini.beams import _BaseBeam
 from martini.datacube import DataCube as DataCube
@@ -6,8 +6,12 @@ from martini.noise import _BaseNoise
 from martini.sources.sph_source import SPHSource as SPHSource
 from martini.spectral_models import _BaseSpectrum
 from martini.sph_kernels import _BaseSPHKernel
+from martini._spatial_index import SpatialIndex
+from martini._checkpoint import Checkpoint
 from matplotlib.figure import Figure
 import astropy.units as U
+from astropy.io import fits
+import h5py
 
 gc: bytes
 martini_version: str
@@ -19,7 +23,12 @@ class _BaseMartini:
     noise: _BaseNoise
     sph_kernel: _BaseSPHKernel
     spectral_model: _BaseSpectrum
+    spatial_index: SpatialIndex
+    _unitless_cache: T.Dict[str, T.Tuple[U.Quantity, type, T.Optional[int], ndarray]]
+    _block_spectra: T.Optional[ndarray]
     quiet: bool
+    _fast_projection: bool
+    dtype: dtype
 
     def __init__(
         self,
@@ -30,25 +39,91 @@ class _BaseMartini:
         sph_kernel: T.Optional[_BaseSPHKernel] = ...,
         spectral_model: T.Optional[_BaseSpectrum] = ...,
         quiet: T.Optional[bool] = ...,
+        merge_tolerance: T.Optional[U.Quantity[U.km / U.s]] = ...,
+        fast_projection: bool = ...,
+        dtype: T.Optional[type] = ...,
         _prune_kwargs: T.Dict[str, T.Union[bool, str]] = ...,
+        _precomputed: T.Optional[T.Dict[str, T.Any]] = ...,
     ) -> None: ...
     def _prune_particles(
         self, spatial: bool = ..., spectral: bool = ..., obj_type_str: str = ...
+    ) -> ndarray: ...
+    def _merge_point_like_particles(
+        self, merge_tolerance: U.Quantity[U.km / U.s]
     ) -> None: ...
+    def _init_spatial_index(self) -> None: ...
+    def _unitless_array(
+        self,
+        name: str,
+        quantity: U.Quantity,
+        unit: U.UnitBase,
+        npart: T.Optional[int] = ...,
+    ) -> ndarray: ...
+    @property
+    def _pixcoords(self) -> ndarray: ...
+    @property
+    def _sm_lengths(self) -> ndarray: ...
+    @property
+    def _sm_ranges(self) -> ndarray: ...
+    @property
+    def _spectra(self) -> ndarray: ...
+    @property
+    def _spectra_offsets(self) -> T.Optional[ndarray]: ...
+    def _checkpoint_fingerprint(self) -> str: ...
+    def _channel_block_spectra(self, first: int, last: int) -> ndarray: ...
     def _evaluate_pixel_spectrum(
         self,
         ranks_and_ij_pxs: T.Tuple[int, T.List[T.Tuple[int, int]]],
         progressbar: bool = ...,
-    ) -> T.Tuple[slice, U.Quantity[U.Jy / U.arcsec**2]]: ...
+    ) -> T.List[T.Tuple[T.Tuple[int | slice, ...], ndarray]]: ...
     def _insert_pixel(
         self, insertion_slice: T.Union[int, T.Tuple, slice], insertion_data: ndarray
     ) -> None: ...
+    def _insert_pixels_parallel(
+        self,
+        ncpu: int,
+        backend: str = ...,
+        progressbar: bool = ...,
+        checkpoint: T.Optional[Checkpoint] = ...,
+    ) -> None: ...
+    def _scatter_particle_spectra_threaded(
+        self, ncpu: int, progressbar: bool = ..., max_block_elements: int = ...
+    ) -> None: ...
+    def _run_threads(
+        self,
+        func: T.Callable[[T.Any], int],
+        tasks: T.List[T.Any],
+        ncpu: int,
+        total: int,
+        progressbar: bool = ...,
+    ) -> None: ...
+    def _scatter_particle_spectra(
+        self,
+        progressbar: bool = ...,
+        max_block_elements: int = ...,
+        rows: T.Optional[T.Tuple[int, int]] = ...,
+    ) -> None: ...
+    def _validate_engine(
+        self, ncpu: int = ..., engine: str = ..., backend: str = ...
+    ) -> None: ...
+    def _fill_datacube_array(
+        self,
+        progressbar: bool = ...,
+        ncpu: int = ...,
+        engine: str = ...,
+        backend: str = ...,
+        checkpoint: T.Optional[Checkpoint] = ...,
+    ) -> None: ...
     def _insert_source_in_cube(
         self,
         skip_validation: bool = ...,
         progressbar: T.Optional[bool] = ...,
         ncpu: int = ...,
         quiet: T.Optional[bool] = ...,
+        engine: str = ...,
+        backend: str = ...,
+        checkpoint: T.Optional[str] = ...,
+        checkpoint_interval: float = ...,
     ) -> None: ...
     def reset(self) -> None: ...
     def preview(
@@ -72,6 +147,10 @@ class Martini:
         sph_kernel: T.Optional[_BaseSPHKernel] = ...,
         spectral_model: T.Optional[_BaseSpectrum] = ...,
         quiet: T.Optional[bool] = ...,
+        merge_tolerance: T.Optional[U.Quantity[U.km / U.s]] = ...,
+        fast_projection: bool = ...,
+        dtype: T.Optional[type] = ...,
+        _precomputed: T.Optional[T.Dict[str, T.Any]] = ...,
     ) -> None: ...
     @property
     def datacube(self) -> DataCube: ...
@@ -80,19 +159,95 @@ class Martini:
         skip_validation: bool = ...,
         progressbar: T.Optional[bool] = ...,
         ncpu: int = ...,
+        engine: str = ...,
+        backend: str = ...,
+        checkpoint: T.Optional[str] = ...,
+        checkpoint_interval: float = ...,
+    ) -> None: ...
+    def convolve_beam(
+        self,
+        batched: bool = ...,
+        max_batch_bytes: int = ...,
+        workers: T.Optional[int] = ...,
+    ) -> None: ...
+    def _confirm_beam_padding(self) -> None: ...
+    def _convolve_beam_batched(
+        self, max_batch_bytes: int = ..., workers: T.Optional[int] = ...
     ) -> None: ...
-    def convolve_beam(self) -> None: ...
     def add_noise(self) -> None: ...
+    def _noise_cube(self) -> U.Quantity: ...
+    def _fits_header(
+        self, obj_name: str, unit: U.UnitBase, datamax: float, datamin: float
+    ) -> fits.Header: ...
     def write_fits(
         self,
         filename: str,
         overwrite: bool = ...,
         obj_name: str = ...,
         channels: None = ...,
+        bitpix: T.Optional[int] = ...,
+        channel_block: int = ...,
+    ) -> None: ...
+    def _write_fits_blocks(
+        self,
+        filename: str,
+        blocks: T.Iterable[T.Tuple[int, int, ndarray]],
+        unit: U.UnitBase,
+        overwrite: bool,
+        obj_name: str,
+        bitpix: T.Optional[int],
+    ) -> float: ...
+    def _prepare_stream(
+        self,
+        channel_block: int,
+        add_noise: bool,
+        convolve_beam: bool,
+        skip_validation: bool,
+        ncpu: int,
+        engine: str,
+        backend: str,
+    ) -> T.Tuple[bool, bool, U.UnitBase]: ...
+    def _stream_channel_blocks(
+        self,
+        channel_block: int,
+        add_noise: bool,
+        convolve_beam: bool,
+        output_unit: U.UnitBase,
+        progressbar: bool,
+        ncpu: int,
+        engine: str,
+        backend: str,
+        max_batch_bytes: int,
+        workers: T.Optional[int],
+    ) -> T.Generator[T.Tuple[int, int, ndarray], None, None]: ...
+    def stream_to_fits(
+        self,
+        filename: str,
+        channel_block: int = ...,
+        add_noise: bool = ...,
+        convolve_beam: bool = ...,
+        skip_validation: bool = ...,
+        progressbar: T.Optional[bool] = ...,
+        ncpu: int = ...,
+        engine: str = ...,
+        backend: str = ...,
+        overwrite: bool = ...,
+        obj_name: str = ...,
+        max_batch_bytes: int = ...,
+        workers: T.Optional[int] = ...,
+        bitpix: T.Optional[int] = ...,
     ) -> None: ...
     def write_beam_fits(
         self, filename: str, overwrite: bool = ..., channels: None = ...
     ) -> None: ...
+    def _write_hdf5_coordinates(
+        self,
+        f: h5py.File,
+        separable_coordinates: bool,
+        channel_block: int,
+        **kwargs: T.Any,
+    ) -> None: ...
+    def _write_hdf5_attributes(self, f: h5py.File, unit: U.UnitBase) -> None: ...
     def write_hdf5(
         self,
         filename: str,
@@ -100,9 +255,36 @@ class Martini:
         memmap: bool = ...,
         compact: bool = ...,
         channels: None = ...,
+        separable_coordinates: bool = ...,
+        chunks: T.Optional[T.Union[T.Tuple[int, ...], bool]] = ...,
+        compression: T.Optional[T.Union[str, int]] = ...,
+        compression_opts: T.Optional[T.Union[int, T.Tuple[T.Any, ...]]] = ...,
+        channel_block: int = ...,
+    ) -> T.Optional[h5py.File]: ...
+    def stream_to_hdf5(
+        self,
+        filename: str,
+        channel_block: int = ...,
+        add_noise: bool = ...,
+        convolve_beam: bool = ...,
+        skip_validation: bool = ...,
+        progressbar: T.Optional[bool] = ...,
+        ncpu: int = ...,
+        engine: str = ...,
+        backend: str = ...,
+        overwrite: bool = ...,
+        compact: bool = ...,
+        separable_coordinates: bool = ...,
+        chunks: T.Optional[T.Union[T.Tuple[int, ...], bool]] = ...,
+        compression: T.Optional[T.Union[str, int]] = ...,
+        compression_opts: T.Optional[T.Union[int, T.Tuple[T.Any, ...]]] = ...,
+        max_batch_bytes: int = ...,
+        workers: T.Optional[int] = ...,
     ) -> None: ...
 
 class GlobalProfile(_BaseMartini):
+    direct: bool
+
     def __init__(
         self,
         source: T.Optional[SPHSource] = ...,
@@ -111,6 +293,8 @@ class GlobalProfile(_BaseMartini):
         channel_width: U.Quantity[U.km / U.s] = ...,
         spectral_centre: U.Quantity[U.km / U.s] = ...,
         quiet: bool = ...,
+        direct: bool = ...,
+        fast_projection: bool = ...,
         channels: None = ...,
     ) -> None: ...
     def insert_source_in_spectrum(self) -> None: ...
@@ -110,7 +110,8 @@ class GaussianNoise(_BaseNoise):
         Create a cube containing Gaussian noise.
 
         Some numpy functions such as :func:`numpy.random.normal` strip units, so need to
-        handle them explicitly.
+        handle them explicitly. The noise has the floating point precision of the data
+        cube array.
 
         Parameters
         ----------
@@ -146,7 +147,9 @@ class GaussianNoise(_BaseNoise):
         # Approximation turns out to be low by ~ 10%, correct for this:
         rms = self.target_rms * 2.19568 * np.sqrt(np.pi * sig_maj * sig_min)
         rms_unit = rms.unit
-        return (
-            self.rng.normal(scale=rms.to_value(rms_unit), size=datacube._array.shape)
-            * rms_unit
+        # in the precision of the data cube, scaled in place
+        noise = self.rng.standard_normal(
+            size=datacube._array.shape, dtype=datacube._array.dtype
         )
+        noise *= rms.to_value(rms_unit)
+        return noise << rms_unit
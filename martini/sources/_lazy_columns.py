@@ -0,0 +1,186 @@
+"""
+Provides the :class:`~martini.sources._lazy_columns.LazyColumns` class for reading the
+properties of selected particles from HDF5 datasets.
+
+Source classes that read particle properties from large files (for example a whole
+snapshot of a cosmological simulation) can use it to select the particles of interest
+with a condition on one property (typically their positions) first, then read only the
+selected rows of the remaining properties. Datasets are read in blocks of rows, so
+that a full column for all particles in the file is never held in memory.
+"""
+
+import numpy as np
+
+
+class LazyColumns(object):
+    """
+    Particle properties backed by HDF5 datasets, read for selected particles on demand.
+
+    Parameters
+    ----------
+    group : h5py.Group
+        HDF5 group containing a dataset for each particle property, each with one row
+        per particle.
+
+    block_size : int, optional
+        Number of rows of a dataset to read at a time. (Default: ``2**20``)
+
+    Examples
+    --------
+    ::
+
+        with h5py.File(snapshot_file, "r") as f:
+            gas = LazyColumns(f["PartType0"])
+            gas.select("Coordinates", lambda xyz: np.sum(xyz**2, axis=1) < 50**2)
+            masses = gas.read("Masses")
+    """
+
+    def __init__(self, group, block_size=2**20):
+        self.group = group
+        self.block_size = block_size
+        # boolean mask of selected rows, None if all rows are selected
+        self.mask = None
+        return
+
+    @property
+    def n_rows(self):
+        """
+        The number of rows (particles) in the datasets.
+
+        Returns
+        -------
+        out : int
+            The number of rows.
+        """
+        # the first dataset (not subgroup) in the group
+        return next(
+            item for item in self.group.values() if hasattr(item, "shape")
+        ).shape[0]
+
+    @property
+    def n_selected(self):
+        """
+        The number of selected rows (particles).
+
+        Returns
+        -------
+        out : int
+            The number of selected rows.
+        """
+        return self.n_rows if self.mask is None else int(np.count_nonzero(self.mask))
+
+    def _blocks(self):
+        """
+        Find the blocks of rows to read that contain selected rows.
+
+        Returns
+        -------
+        out : list
+            List of 2-tuples with the first row and one past the last row of each
+            block.
+        """
+        if self.mask is None:
+            start, stop = 0, self.n_rows
+        else:
+            selected = np.flatnonzero(self.mask)
+            if selected.size == 0:
+                return []
+            start, stop = selected[0], selected[-1] + 1
+        blocks = [
+            (block_start, min(block_start + self.block_size, stop))
+            for block_start in range(start, stop, self.block_size)
+        ]
+        if self.mask is None:
+            return blocks
+        return [
+            (block_start, block_stop)
+            for block_start, block_stop in blocks
+            if self.mask[block_start:block_stop].any()
+        ]
+
+    def _read_blocks(self, field, column=None):
+        """
+        Read the selected rows of a dataset, one block at a time.
+
+        Parameters
+        ----------
+        field : str
+            Name of the dataset in the group.
+
+        column : int, optional
+            If given, read only this column (index along the second axis) of the
+            dataset. (Default: ``None``)
+
+        Yields
+        ------
+        out : tuple
+            A 3-tuple containing the first row and one past the last row of the block,
+            and the values of the selected rows in the block.
+        """
+        dataset = self.group[field]
+        for start, stop in self._blocks():
+            values = (
+                dataset[start:stop] if column is None else dataset[start:stop, column]
+            )
+            if self.mask is not None:
+                values = values[self.mask[start:stop]]
+            yield start, stop, values
+        return
+
+    def select(self, field, condition, column=None):
+        """
+        Select the particles that satisfy a condition on one of their properties.
+
+        Only particles that are already selected are considered, so successive calls
+        narrow down the selection.
+
+        Parameters
+        ----------
+        field : str
+            Name of the dataset in the group.
+
+        condition : callable
+            Function taking an array with the values of the property for a block of
+            particles and returning a boolean array, ``True`` for particles to keep.
+
+        column : int, optional
+            If given, pass only this column (index along the second axis) of the
+            dataset to ``condition``. (Default: ``None``)
+        """
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for start, stop, values in self._read_blocks(field, column=column):
+            if self.mask is None:
+                mask[start:stop] = condition(values)
+            else:
+                mask[start:stop][self.mask[start:stop]] = condition(values)
+        self.mask = mask
+        return
+
+    def read(self, field, column=None):
+        """
+        Read a property of the selected particles.
+
+        Parameters
+        ----------
+        field : str
+            Name of the dataset in the group.
+
+        column : int, optional
+            If given, read only this column (index along the second axis) of the
+            dataset. (Default: ``None``)
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Array with one row for each selected particle.
+        """
+        dataset = self.group[field]
+        if self.mask is None:
+            return dataset[()] if column is None else dataset[:, column]
+        shape = dataset.shape[1:] if column is None else dataset.shape[2:]
+        out = np.empty((self.n_selected,) + shape, dtype=dataset.dtype)
+        filled = 0
+        for _, _, values in self._read_blocks(field, column=column):
+            out[filled : filled + values.shape[0]] = values
+            filled += values.shape[0]
+        return out
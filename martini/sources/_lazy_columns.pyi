@@ -0,0 +1,25 @@
+import typing as T
+from numpy import ndarray
+from h5py import Group
+
+class LazyColumns:
+    group: Group
+    block_size: int
+    mask: T.Optional[ndarray]
+
+    def __init__(self, group: Group, block_size: int = ...) -> None: ...
+    @property
+    def n_rows(self) -> int: ...
+    @property
+    def n_selected(self) -> int: ...
+    def _blocks(self) -> T.List[T.Tuple[int, int]]: ...
+    def _read_blocks(
+        self, field: str, column: T.Optional[int] = ...
+    ) -> T.Generator[T.Tuple[int, int, ndarray], None, None]: ...
+    def select(
+        self,
+        field: str,
+        condition: T.Callable[[ndarray], ndarray],
+        column: T.Optional[int] = ...,
+    ) -> None: ...
+    def read(self, field: str, column: T.Optional[int] = ...) -> ndarray: ...
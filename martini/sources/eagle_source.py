@@ -191,18 +191,22 @@ class EAGLESource(SPHSource):
             gamma = f["/RuntimePars"].attrs["EOS_Jeans_GammaEffective"]
             T0 = f["/RuntimePars"].attrs["EOS_Jeans_TempNorm_K"] * U.K
 
+            # the particles of the FoF group are selected first, and each property
+            # is masked as soon as it is read, so that only one property is held in
+            # memory for the whole region at a time
+            mask = eagle_data.read_dataset(0, "GroupNumber") == fof
+
             def fetch(att, ptype=0):
                 # gas is type 0, only need gas properties
-                tmp = eagle_data.read_dataset(ptype, att)
+                tmp = eagle_data.read_dataset(ptype, att)[mask]
                 dset = f["/PartType{:d}/{:s}".format(ptype, att)]
                 aexp = dset.attrs.get("aexp-scale-exponent")
                 hexp = dset.attrs.get("h-scale-exponent")
-                return tmp[()] * np.power(a, aexp) * np.power(h, hexp)
+                return tmp * np.power(a, aexp) * np.power(h, hexp)
 
             code_to_g = f["/Units"].attrs["UnitMass_in_g"] * U.g
             code_to_cm = f["/Units"].attrs["UnitLength_in_cm"] * U.cm
             code_to_cm_s = f["/Units"].attrs["UnitVelocity_in_cm_per_s"] * U.cm / U.s
-            ng_g = fetch("GroupNumber")
             particles = dict(
                 xyz_g=(fetch("Coordinates") * code_to_cm).to(U.kpc),
                 vxyz_g=(fetch("Velocity") * code_to_cm_s).to(U.km / U.s),
@@ -234,10 +238,6 @@ class EAGLESource(SPHSource):
             * code_to_g
         ).to(U.Msun)
 
-        mask = ng_g == fof
-        for k, v in particles.items():
-            particles[k] = v[mask]
-
         particles["xyz_g"] -= cop
         particles["xyz_g"][particles["xyz_g"] > lbox / 2.0] -= lbox.to(U.kpc)
         particles["xyz_g"][particles["xyz_g"] < -lbox / 2.0] += lbox.to(U.kpc)
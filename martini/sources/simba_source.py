@@ -5,6 +5,7 @@ Simba simulations as input.
 
 import numpy as np
 from .sph_source import SPHSource
+from ._lazy_columns import LazyColumns
 from ..sph_kernels import _CubicSplineKernel, find_fwhm
 from os.path import join
 from astropy import units as U, constants as C
@@ -133,58 +134,70 @@ class SimbaSource(SPHSource):
             a = f["Header"].attrs["Time"]
             h = f["Header"].attrs["HubbleParam"]
             lbox = f["Header"].attrs["BoxSize"] / h * U.kpc
-            gas = f["PartType0"]
-            fZ = gas["Metallicity"][()][:, 0]
-            fHe = gas["Metallicity"][()][:, 1]
+
+            with h5py.File(groupFile, "r") as g:
+                groupIDs = g["galaxy_data/GroupID"][()]
+                gmask = groupID == groupIDs
+                # no h^-1 on minpotpos, not sure about comoving yet
+                cop = g["galaxy_data/minpotpos"][()][gmask][0] * a * U.kpc
+                vcent = g["galaxy_data/vel"][()][gmask][0] * np.sqrt(a) * U.km / U.s
+
+            def centred(xyz):
+                """
+                Convert particle coordinates to offsets from the galaxy centre.
+
+                Parameters
+                ----------
+                xyz : ~numpy.typing.ArrayLike
+                    Particle coordinates as stored in the snapshot file.
+
+                Returns
+                -------
+                out : ~astropy.units.Quantity
+                    :class:`~astropy.units.Quantity`, with dimensions of length.
+                    Offsets from the galaxy centre, wrapped in the periodic box.
+                """
+                xyz = xyz * a / h * U.kpc - cop
+                xyz[xyz > lbox / 2.0] -= lbox
+                xyz[xyz < -lbox / 2.0] += lbox
+                return xyz
+
+            # select the particles in the aperture, then read only their properties
+            gas = LazyColumns(f["PartType0"])
+            gas.select(
+                "Coordinates",
+                lambda xyz: np.sum(np.power(centred(xyz), 2), axis=1)
+                < np.power(aperture, 2),
+            )
+            fZ = gas.read("Metallicity", column=0)
+            fHe = gas.read("Metallicity", column=1)
             fH = 1 - fHe - fZ
-            xe = gas["ElectronAbundance"][()]
+            xe = gas.read("ElectronAbundance")
             particles = dict(
-                xyz_g=gas["Coordinates"][()] * a / h * U.kpc,
-                vxyz_g=gas["Velocities"][()] * np.sqrt(a) * U.km / U.s,
+                xyz_g=centred(gas.read("Coordinates")),
+                vxyz_g=gas.read("Velocities") * np.sqrt(a) * U.km / U.s - vcent,
                 T_g=(
                     (4 / (1 + 3 * fH + 4 * fH * xe))
                     * C.m_p
                     * (gamma - 1)
-                    * gas["InternalEnergy"][()]
+                    * gas.read("InternalEnergy")
                     * (U.km / U.s) ** 2
                     / C.k_B
                 ).to(U.K),
-                hsm_g=gas["SmoothingLength"][()]
+                hsm_g=gas.read("SmoothingLength")
                 * a
                 / h
                 * U.kpc
                 * find_fwhm(_CubicSplineKernel().kernel),
-                mHI_g=gas["Masses"][()] * fH * gas["GrackleHI"][()] * 1e10 / h * U.Msun,
+                mHI_g=gas.read("Masses")
+                * fH
+                * gas.read("GrackleHI")
+                * 1e10
+                / h
+                * U.Msun,
             )
             del fH, fHe, xe
 
-        with h5py.File(groupFile, "r") as f:
-            groupIDs = f["galaxy_data/GroupID"][()]
-            gmask = groupID == groupIDs
-            # no h^-1 on minpotpos, not sure about comoving yet
-            cop = f["galaxy_data/minpotpos"][()][gmask][0] * a * U.kpc
-            vcent = f["galaxy_data/vel"][()][gmask][0] * np.sqrt(a) * U.km / U.s
-
-        particles["xyz_g"] -= cop
-        particles["xyz_g"][particles["xyz_g"] > lbox / 2.0] -= lbox
-        particles["xyz_g"][particles["xyz_g"] < -lbox / 2.0] += lbox
-        particles["vxyz_g"] -= vcent
-
-        mask = np.zeros(particles["xyz_g"].shape[0], dtype=bool)
-        outer_cube = (np.abs(particles["xyz_g"]) < aperture).all(axis=1)
-        inner_cube = np.zeros(particles["xyz_g"].shape[0], dtype=bool)
-        inner_cube[outer_cube] = (
-            np.abs(particles["xyz_g"][outer_cube]) < aperture / np.sqrt(3)
-        ).all(axis=1)
-        need_distance = np.logical_and(outer_cube, np.logical_not(inner_cube))
-        mask[inner_cube] = True
-        mask[need_distance] = np.sum(
-            np.power(particles["xyz_g"][need_distance], 2), axis=1
-        ) < np.power(aperture, 2)
-
-        for k, v in particles.items():
-            particles[k] = v[mask]
-
         super().__init__(
             distance=distance,
             vpeculiar=vpeculiar,
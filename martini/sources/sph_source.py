@@ -4,16 +4,22 @@ with any SPH or similar simulation as input.
 """
 
 import numpy as np
+from copy import copy
 from astropy.coordinates import (
     CartesianRepresentation,
     CartesianDifferential,
     SphericalRepresentation,
+    SphericalDifferential,
+    RadialDifferential,
+    UnitSphericalRepresentation,
     SkyCoord,
     SpectralCoord,
     ICRS,
+    BaseRADecFrame,
 )
 from astropy.coordinates.matrix_utilities import rotation_matrix
 import astropy.units as U
+from astropy.constants import c
 from ._L_align import L_align
 from ._cartesian_translation import translate, translate_d
 from ..datacube import HIfreq
@@ -204,41 +210,89 @@ class SPHSource(object):
         self.pixcoords = None
         return
 
-    def _init_skycoords(self, _reset=True):
+    def _sky_frame_coordinates(self):
         """
-        Initialize the sky coordinates of the particles.
+        Calculate the particle positions and velocities in the coordinate frame.
 
-        Parameters
-        ----------
-        _reset : bool
-            If ``True``, return particles to their original positions. Setting to
-            ``False`` is only intended for testing. (Default: ``True``)
+        The source is rotated to its sky position, placed at its distance and given its
+        peculiar velocity and the Hubble flow velocity in a single combined
+        transformation. New arrays are returned and the particle coordinates of the
+        source are unchanged.
+
+        Returns
+        -------
+        out : tuple
+            A 2-tuple containing the positions and velocities, each a
+            :class:`~astropy.units.Quantity` with shape (3, N).
         """
-        # _reset False only for unit testing
         distance_unit_vector = (
             SphericalRepresentation(self.ra, self.dec, 1)
             .represent_as(CartesianRepresentation)
             .xyz
         )
-        distance_vector = distance_unit_vector * self.distance
-        vpeculiar_vector = distance_unit_vector * self.vpeculiar
-
-        self.rotate(axis_angle=("y", -self.dec))
-        self.rotate(axis_angle=("z", self.ra))
-        self.translate(distance_vector)
-        # must be after translate:
-        # \vec{v_H} = (100 h km/s/Mpc * D) * r^, but D * r^ is just \vec{r}:
-        vhubble_vectors = (
-            self.h * 100.0 * U.km * U.s**-1 * U.Mpc**-1
-        ) * self.coordinates_g.xyz
-        self.boost(vpeculiar_vector)
-        # can't use boost for particle-by-particle velocities:
-        self.coordinates_g.differentials["s"] = CartesianDifferential(
-            self.coordinates_g.differentials["s"].d_xyz + vhubble_vectors
+        # rotation_matrix gives left-handed rotation, so transpose for right-handed
+        sky_rotation = rotation_matrix(self.ra, axis="z").T.dot(
+            rotation_matrix(-self.dec, axis="y").T
+        )
+        xyz = np.matmul(sky_rotation, self.coordinates_g.get_xyz())
+        xyz += (distance_unit_vector * self.distance)[:, np.newaxis]
+        vxyz = np.matmul(
+            sky_rotation, self.coordinates_g.differentials["s"].get_d_xyz()
+        )
+        vxyz += (distance_unit_vector * self.vpeculiar)[:, np.newaxis]
+        vxyz += (self.h * 100.0 * U.km * U.s**-1 * U.Mpc**-1) * xyz
+        return xyz, vxyz
+
+    def _init_skycoords(self, _reset=True, fast=False):
+        """
+        Initialize the sky coordinates of the particles.
+
+        Parameters
+        ----------
+        _reset : bool
+            If ``False``, leave the particles at their positions and velocities on the
+            sky, otherwise they are unchanged. Setting to ``False`` is only intended for
+            testing. (Default: ``True``)
+
+        fast : bool, optional
+            If ``True``, calculate the right ascension, declination, distance and
+            radial velocity of the particles with :mod:`numpy` and store only these
+            in the sky coordinates, and do not initialize the spectral coordinates.
+            The pixel coordinates must then be initialized with ``fast=True``, see
+            :meth:`~martini.sources.sph_source.SPHSource._init_pixcoords`. Ignores
+            ``_reset``. (Default: ``False``)
+        """
+        # the particle arrays are transformed out of place, coordinates_g is unchanged
+        xyz, vxyz = self._sky_frame_coordinates()
+        (x, y, z), (vx, vy, vz) = xyz.value, vxyz.value
+        rho2 = x * x + y * y
+        distance = np.sqrt(rho2 + z * z)
+        radial_velocity = (x * vx + y * vy + z * vz) / distance * vxyz.unit
+        if fast:
+            differential = RadialDifferential(radial_velocity, copy=False)
+        else:
+            angular_velocity_unit = vxyz.unit / xyz.unit * U.rad
+            differential = SphericalDifferential(
+                d_lon=(x * vy - y * vx) / rho2 * angular_velocity_unit,
+                d_lat=(vz * rho2 - z * (x * vx + y * vy))
+                / (distance * distance * np.sqrt(rho2))
+                * angular_velocity_unit,
+                d_distance=radial_velocity,
+                copy=False,
+            )
+        sky_frame_coordinates = SphericalRepresentation(
+            lon=np.arctan2(y, x) * U.rad,
+            lat=np.arctan2(z, np.sqrt(rho2)) * U.rad,
+            distance=distance * xyz.unit,
+            differentials={"s": differential},
+            copy=False,
         )
         self.skycoords = SkyCoord(
-            self.coordinates_g, frame=self.coordinate_frame, copy=True
+            self.coordinate_frame.realize_frame(sky_frame_coordinates), copy=False
         )
+        if fast:
+            self.spectralcoords = None
+            return
         origin_skycoord = SkyCoord(
             x=0 * U.kpc,
             y=0 * U.kpc,
@@ -251,23 +305,62 @@ class SPHSource(object):
             frame=self.coordinate_frame,
         )
         self.spectralcoords = SpectralCoord(
-            self.skycoords.radial_velocity,
+            radial_velocity,
             doppler_convention="radio",
             doppler_rest=HIfreq,
             target=self.skycoords,
             observer=origin_skycoord,
         )
-        if _reset:
-            self.coordinates_g.differentials["s"] = CartesianDifferential(
-                self.coordinates_g.differentials["s"].d_xyz - vhubble_vectors
+        if not _reset:
+            # _reset False only for unit testing
+            self.coordinates_g = CartesianRepresentation(
+                xyz, differentials={"s": CartesianDifferential(vxyz)}
             )
-            self.boost(-vpeculiar_vector)
-            self.translate(-distance_vector)
-            self.rotate(axis_angle=("z", -self.ra))
-            self.rotate(axis_angle=("y", self.dec))
         return
 
-    def _init_pixcoords(self, datacube, origin=0):
+    def _fast_projection_supported(self, datacube):
+        """
+        Check whether the pixel coordinates can be calculated without astropy.
+
+        The fast calculation (see
+        :meth:`~martini.sources.sph_source.SPHSource._init_pixcoords`) supports a
+        data cube in the same RA/Dec coordinate frame as the source, with a spectral
+        reference frame (``specsys``) that matches this frame, a gnomonic (``TAN``) or
+        orthographic (``SIN``) projection without distortions or projection
+        parameters, and a radio velocity (``VRAD``) or frequency (``FREQ``) spectral
+        axis.
+
+        Parameters
+        ----------
+        datacube : ~martini.datacube.DataCube
+            The DataCube (including its WCS) for which to calculate coordinates.
+
+        Returns
+        -------
+        out : bool
+            ``True`` if the fast calculation is supported.
+        """
+        if not isinstance(self.coordinate_frame, BaseRADecFrame):
+            return False
+        if not self.coordinate_frame.is_equivalent_frame(datacube.coordinate_frame):
+            return False
+        if datacube.specsys != self.coordinate_frame.name:
+            return False
+        datacube_wcs = datacube.wcs.sub(3)
+        datacube_wcs.wcs.set()
+        ctype = tuple(datacube_wcs.wcs.ctype)
+        return (
+            ctype[0][:4] == "RA--"
+            and ctype[1][:4] == "DEC-"
+            and ctype[0][4:] == ctype[1][4:]
+            and ctype[0][4:] in ("-TAN", "-SIN")
+            and ctype[2] in ("VRAD", "FREQ")
+            and datacube_wcs.wcs.lonpole == 180
+            and len(datacube_wcs.wcs.get_pv()) == 0
+            and not datacube_wcs.has_distortion
+        )
+
+    def _init_pixcoords(self, datacube, origin=0, fast=False):
         """
         Initialize pixel coordinates of the particles.
 
@@ -278,7 +371,24 @@ class SPHSource(object):
 
         origin : int
             Index of the first pixel in the WCS (FITS-style is 1, python-style is 0).
+
+        fast : bool, optional
+            If ``True``, project the sky coordinates to pixel coordinates with
+            :mod:`numpy` instead of transforming them with :mod:`astropy.coordinates`
+            and :meth:`~astropy.wcs.WCS.wcs_world2pix`. All three pixel coordinates
+            (including the spectral axis) agree with the :mod:`astropy` calculation to
+            better than ``1e-6`` pixels. The sky positions, distances and line-of-sight
+            velocities in the sky coordinates are calculated identically in both cases
+            (see :meth:`~martini.sources.sph_source.SPHSource._init_skycoords`), so the
+            particle spectra are identical and the data cubes agree to better than
+            ``1e-6`` times their brightest pixel. Pixels much fainter than this may
+            differ by more in relative terms. Only some data cubes are supported, see
+            :meth:`~martini.sources.sph_source.SPHSource._fast_projection_supported`.
+            (Default: ``False``)
         """
+        if fast:
+            self.pixcoords = self._project_pixcoords(datacube, origin=origin) * U.pix
+            return
         skycoords_df_frame = self.skycoords.transform_to(datacube.coordinate_frame)
         spectralcoords_df_specsys = (
             self.spectralcoords.with_observer_stationary_relative_to(datacube.specsys)
@@ -297,6 +407,79 @@ class SPHSource(object):
         )
         return
 
+    def _project_pixcoords(self, datacube, origin=0):
+        """
+        Project the sky coordinates of the particles to pixel coordinates with numpy.
+
+        The position of each particle is expressed in an orthonormal basis at the
+        reference point of the WCS (towards the reference point, east and north), from
+        which the gnomonic or orthographic projection follows directly. The data cube
+        must be supported, see
+        :meth:`~martini.sources.sph_source.SPHSource._fast_projection_supported`.
+
+        Parameters
+        ----------
+        datacube : ~martini.datacube.DataCube
+            The DataCube (including its WCS) for which to calculate coordinates.
+
+        origin : int
+            Index of the first pixel in the WCS (FITS-style is 1, python-style is 0).
+            (Default: ``0``)
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Array with shape (3, N) containing the pixel coordinates.
+        """
+        datacube_wcs = datacube.wcs.sub(3)
+        datacube_wcs.wcs.set()
+        cunit = datacube_wcs.wcs.cunit
+        ra0, dec0 = (
+            (datacube_wcs.wcs.crval[0] * cunit[0]).to_value(U.rad),
+            (datacube_wcs.wcs.crval[1] * cunit[1]).to_value(U.rad),
+        )
+        basis = np.array(
+            [
+                [np.cos(dec0) * np.cos(ra0), np.cos(dec0) * np.sin(ra0), np.sin(dec0)],
+                [-np.sin(ra0), np.cos(ra0), 0],
+                [
+                    -np.sin(dec0) * np.cos(ra0),
+                    -np.sin(dec0) * np.sin(ra0),
+                    np.cos(dec0),
+                ],
+            ]
+        )
+        sky_unit_vectors = self.skycoords.represent_as(
+            UnitSphericalRepresentation
+        ).to_cartesian()
+        # direction cosines along the line of sight to the reference point, east, north
+        los, east, north = np.matmul(basis, sky_unit_vectors.get_xyz().value)
+        # intermediate world coordinates, in the units of the WCS
+        world = np.empty((3, los.size))
+        if datacube_wcs.wcs.ctype[0][4:] == "-TAN":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                world[0] = np.where(los > 0, east / los, np.nan)
+                world[1] = np.where(los > 0, north / los, np.nan)
+        else:
+            world[0] = np.where(los >= 0, east, np.nan)
+            world[1] = np.where(los >= 0, north, np.nan)
+        world[0] = (world[0] * U.rad).to_value(cunit[0])
+        world[1] = (world[1] * U.rad).to_value(cunit[1])
+        radial_velocity = self.skycoords.radial_velocity
+        if datacube_wcs.wcs.ctype[2] == "VRAD":
+            world[2] = radial_velocity.to_value(cunit[2])
+        else:
+            world[2] = (HIfreq * (1 - radial_velocity / c)).to_value(cunit[2])
+        world[2] -= datacube_wcs.wcs.crval[2]
+        # linear transformation: world = diag(cdelt) . pc . (pixel - crpix)
+        pixel_to_world = np.diag(datacube_wcs.wcs.get_cdelt()).dot(
+            datacube_wcs.wcs.get_pc()
+        )
+        return (
+            np.linalg.solve(pixel_to_world, world)
+            + (datacube_wcs.wcs.crpix - 1 + origin)[:, np.newaxis]
+        )
+
     def apply_mask(self, mask):
         """
         Remove particles from source arrays according to a mask.
@@ -314,19 +497,98 @@ class SPHSource(object):
         if mask_sum == 0:
             raise RuntimeError("No source particles in target region.")
         self.npart = mask_sum
+        self._index_particles(mask)
+        return
+
+    def _index_particles(self, index):
+        """
+        Index all particle arrays, for example to change the order of the particles.
+
+        Parameters
+        ----------
+        index : ~numpy.typing.ArrayLike
+            Boolean mask, or array of particle indices. The number of particles is not
+            updated, see :meth:`~martini.sources.sph_source.SPHSource.apply_mask`.
+        """
         if not self.T_g.isscalar:
-            self.T_g = self.T_g[mask]
+            self.T_g = self.T_g[index]
         if not self.mHI_g.isscalar:
-            self.mHI_g = self.mHI_g[mask]
-        self.coordinates_g = self.coordinates_g[mask]
+            self.mHI_g = self.mHI_g[index]
+        self.coordinates_g = self.coordinates_g[index]
         if self.skycoords is not None:
-            self.skycoords = self.skycoords[mask]
+            self.skycoords = self.skycoords[index]
         if self.spectralcoords is not None:
-            self.spectralcoords = self.spectralcoords[mask]
+            self.spectralcoords = self.spectralcoords[index]
         if self.pixcoords is not None:
-            self.pixcoords = self.pixcoords[:, mask]
+            self.pixcoords = self.pixcoords[:, index]
         if not self.hsm_g.isscalar:
-            self.hsm_g = self.hsm_g[mask]
+            self.hsm_g = self.hsm_g[index]
+        return
+
+    def _merge_particles(self, labels):
+        """
+        Merge groups of particles into single particles.
+
+        Each group of particles sharing a label is replaced by one particle carrying
+        the total HI mass of the group. Its position, velocity, temperature and
+        smoothing length are the HI mass-weighted means of those of the group. The
+        particles are then in order of increasing label. The sky and pixel
+        coordinates are discarded and must be initialized again.
+
+        Parameters
+        ----------
+        labels : ~numpy.typing.ArrayLike
+            Integer array with shape ``(N, )``, particles with the same label are
+            merged.
+        """
+        inverse = np.unique(labels, return_inverse=True)[1].reshape(labels.shape)
+        weights = np.broadcast_to(self.mHI_g.to_value(U.Msun), (self.npart,))
+        weight_sums = np.bincount(inverse, weights=weights)
+        unweighted = weight_sums == 0
+
+        def weighted_mean(q):
+            """
+            Evaluate the HI mass-weighted mean of a particle property in each group.
+
+            Groups without HI mass are weighted uniformly.
+
+            Parameters
+            ----------
+            q : ~astropy.units.Quantity
+                :class:`~astropy.units.Quantity`, with shape ``(N, )``.
+                The particle property.
+
+            Returns
+            -------
+            out : ~astropy.units.Quantity
+                :class:`~astropy.units.Quantity`, with shape ``(M, )`` for ``M``
+                groups. The mean of the property in each group.
+            """
+            values = q.value
+            means = np.bincount(inverse, weights=weights * values)
+            means[unweighted] = np.bincount(inverse, weights=values)[unweighted]
+            means /= np.where(unweighted, np.bincount(inverse), weight_sums)
+            return means * q.unit
+
+        xyz = self.coordinates_g.get_xyz()
+        vxyz = self.coordinates_g.differentials["s"].get_d_xyz()
+        self.coordinates_g = CartesianRepresentation(
+            U.Quantity([weighted_mean(x) for x in xyz]),
+            differentials={
+                "s": CartesianDifferential(
+                    U.Quantity([weighted_mean(vx) for vx in vxyz])
+                )
+            },
+        )
+        if not self.T_g.isscalar:
+            self.T_g = weighted_mean(self.T_g)
+        if not self.hsm_g.isscalar:
+            self.hsm_g = weighted_mean(self.hsm_g)
+        self.mHI_g = (weight_sums * U.Msun).to(self.mHI_g.unit)
+        self.npart = weight_sums.size
+        self.skycoords = None
+        self.spectralcoords = None
+        self.pixcoords = None
         return
 
     def rotate(self, axis_angle=None, rotmat=None, L_coords=None):
@@ -361,7 +623,38 @@ class SPHSource(object):
         if np.sum(args_given) == 0:
             # no-op
             return
-        elif np.sum(args_given) > 1:
+        do_rot = self._rotation_matrix(
+            axis_angle=axis_angle, rotmat=rotmat, L_coords=L_coords
+        )
+        self.current_rotation = do_rot.dot(self.current_rotation)
+        self.coordinates_g = self.coordinates_g.transform(do_rot)
+        return
+
+    def _rotation_matrix(self, axis_angle=None, rotmat=None, L_coords=None):
+        """
+        Calculate the matrix of a rotation of the source, without applying it.
+
+        The arguments are as for :meth:`~martini.sources.sph_source.SPHSource.rotate`.
+
+        Parameters
+        ----------
+        axis_angle : tuple
+            First element one of {``"x"``, ``"y"``, ``"z"``} for the axis to rotate about,
+            second element a :class:`~astropy.units.Quantity` with dimensions of angle,
+            indicating the angle to rotate through (right-handed rotation).
+        rotmat : ~numpy.typing.ArrayLike
+            Rotation matrix with shape (3, 3).
+        L_coords : tuple
+            Inclination, azimuthal angle and optionally position angle, see
+            :meth:`~martini.sources.sph_source.SPHSource.rotate`.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Rotation matrix with shape (3, 3). The identity if no rotation is given.
+        """
+        args_given = (axis_angle is not None, rotmat is not None, L_coords is not None)
+        if np.sum(args_given) > 1:
             raise ValueError("Multiple rotations in a single call not allowed.")
 
         do_rot = np.eye(3)
@@ -394,9 +687,48 @@ class SPHSource(object):
             else:
                 do_rot = rotation_matrix(pa - 270 * U.deg, axis="x").T.dot(do_rot)
 
-        self.current_rotation = do_rot.dot(self.current_rotation)
-        self.coordinates_g = self.coordinates_g.transform(do_rot)
-        return
+        return do_rot
+
+    def _copy(self, rotmat=None, distance=None):
+        """
+        Make a copy of the source, optionally rotated or moved to another distance.
+
+        The arrays of particle properties that do not depend on the orientation or
+        distance of the source (masses, temperatures, smoothing lengths) are shared
+        with this source rather than copied, as are the particle positions and
+        velocities if no rotation is given. If a rotation or distance is given, the sky
+        and pixel coordinates of the copy must be initialized.
+
+        Parameters
+        ----------
+        rotmat : ~numpy.typing.ArrayLike, optional
+            Rotation matrix with shape (3, 3). (Default: ``None``)
+
+        distance : ~astropy.units.Quantity, optional
+            :class:`~astropy.units.Quantity`, with dimensions of length.
+            Distance of the copy, which also sets its velocity offset via Hubble's
+            law. (Default: ``None``)
+
+        Returns
+        -------
+        out : ~martini.sources.sph_source.SPHSource
+            The copy of the source.
+        """
+        source_copy = copy(self)
+        if rotmat is not None:
+            source_copy.current_rotation = rotmat.dot(self.current_rotation)
+            source_copy.coordinates_g = self.coordinates_g.transform(rotmat)
+        if distance is not None:
+            source_copy.distance = distance
+            source_copy.vhubble = (
+                self.h * 100.0 * U.km * U.s**-1 * U.Mpc**-1
+            ) * distance
+            source_copy.vsys = source_copy.vhubble + self.vpeculiar
+        if rotmat is not None or distance is not None:
+            source_copy.skycoords = None
+            source_copy.spectralcoords = None
+            source_copy.pixcoords = None
+        return source_copy
 
     def translate(self, translation_vector):
         """
@@ -45,9 +45,18 @@ class SPHSource:
         coordinate_axis: T.Optional[int] = ...,
         coordinate_frame: BaseRADecFrame = ...,
     ) -> None: ...
-    def _init_skycoords(self, _reset: bool = ...) -> None: ...
-    def _init_pixcoords(self, datacube: DataCube, origin: int = ...) -> None: ...
+    def _sky_frame_coordinates(
+        self,
+    ) -> T.Tuple[U.Quantity[U.kpc], U.Quantity[U.km / U.s]]: ...
+    def _init_skycoords(self, _reset: bool = ..., fast: bool = ...) -> None: ...
+    def _fast_projection_supported(self, datacube: DataCube) -> bool: ...
+    def _init_pixcoords(
+        self, datacube: DataCube, origin: int = ..., fast: bool = ...
+    ) -> None: ...
+    def _project_pixcoords(self, datacube: DataCube, origin: int = ...) -> ndarray: ...
     def apply_mask(self, mask: ndarray) -> None: ...
+    def _index_particles(self, index: ndarray) -> None: ...
+    def _merge_particles(self, labels: ndarray) -> None: ...
     def rotate(
         self,
         axis_angle: T.Optional[T.Tuple[str, U.Quantity[U.deg]]] = ...,
@@ -57,6 +66,20 @@ class SPHSource:
             | T.Tuple[U.Quantity[U.deg], U.Quantity[U.deg], U.Quantity[U.deg]]
         ] = ...,
     ) -> None: ...
+    def _rotation_matrix(
+        self,
+        axis_angle: T.Optional[T.Tuple[str, U.Quantity[U.deg]]] = ...,
+        rotmat: T.Optional[ndarray] = ...,
+        L_coords: T.Optional[
+            T.Tuple[U.Quantity[U.deg], U.Quantity[U.deg]]
+            | T.Tuple[U.Quantity[U.deg], U.Quantity[U.deg], U.Quantity[U.deg]]
+        ] = ...,
+    ) -> ndarray: ...
+    def _copy(
+        self,
+        rotmat: T.Optional[ndarray] = ...,
+        distance: T.Optional[U.Quantity[U.Mpc]] = ...,
+    ) -> SPHSource: ...
     def translate(self, translation_vector: U.Quantity[U.kpc]) -> None: ...
     def boost(self, boost_vector: U.Quantity[U.km / U.s]) -> None: ...
     def save_current_rotation(self, fname: str) -> None: ...
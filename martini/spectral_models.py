@@ -7,6 +7,8 @@ import astropy.units as U
 from astropy import constants as C
 from scipy.special import erf
 from abc import ABCMeta, abstractmethod
+from copy import copy
+from concurrent.futures import ThreadPoolExecutor
 
 
 class _BaseSpectrum(metaclass=ABCMeta):
@@ -43,17 +45,58 @@ class _BaseSpectrum(metaclass=ABCMeta):
         Data type of the arrays storing spectra of each particle, can be used to manage
         memory usage by adjusting precision.
 
+    banded : bool, optional
+        If ``True``, store only a band of channels around the line-of-sight velocity of
+        each particle instead of the full spectrum. The band extends to
+        ``_band_half_widths`` (``6``) times the (largest) half-width of the spectral
+        model on either side of the particle velocity, beyond which the spectra are
+        truncated. The first channel of the band of each particle is stored in
+        :attr:`~martini.spectral_models._BaseSpectrum.spectra_offsets`. This greatly
+        reduces memory usage when the spectra are narrow compared to the bandwidth of
+        the data cube. (Default: ``False``)
+
+    chunk_size : int, optional
+        If provided, the spectra are evaluated for blocks of at most this many particles
+        at a time. The temporary arrays used in the evaluation of the spectra then scale
+        with the size of the block instead of the number of particles. In parallel
+        execution each block is a unit of work for the process pool. By default all
+        particles are evaluated at once (or in ``ncpu`` equal blocks in parallel).
+        (Default: ``None``)
+
+    backend : str, optional
+        With ``ncpu > 1``, use a pool of processes (``"process"``, requires the
+        :mod:`multiprocess` module) or of threads (``"thread"``) to evaluate spectra in
+        parallel. Threads avoid the cost of starting processes and are effective
+        because the evaluation is done in large :mod:`numpy` operations that release the
+        global interpreter lock. (Default: ``"process"``)
+
     See Also
     --------
     martini.spectral_models.GaussianSpectrum
     martini.spectral_models.DiracDeltaSpectrum
     """
 
-    def __init__(self, ncpu=None, spec_dtype=np.float64):
+    _band_half_widths = 6
+
+    def __init__(
+        self,
+        ncpu=None,
+        spec_dtype=np.float64,
+        banded=False,
+        chunk_size=None,
+        backend="process",
+    ):
+        if backend not in ("process", "thread"):
+            raise ValueError("backend must be one of 'process' or 'thread'.")
         self.ncpu = ncpu if ncpu is not None else 1
+        self.backend = backend
         self.spectral_function_extra_data = None
         self.spectra = None
+        self.spectra_offsets = None
+        self.band_width = None
         self.spec_dtype = spec_dtype
+        self.banded = banded
+        self.chunk_size = chunk_size
         return
 
     def init_spectra(self, source, datacube):
@@ -71,7 +114,18 @@ class _BaseSpectrum(metaclass=ABCMeta):
         parallel. To minimize overhead form serializing large amounts of
         data in :mod:`multiprocess` communications, each parallel process inherits the
         entire line-of-sight velocity array (cheap because of copy-on-write
-        behaviour), then masks its copy to the subset to operate on.
+        behaviour), then masks its copy to the subset to operate on. With
+        ``backend="thread"`` a pool of threads is used instead, each filling its own
+        rows of the output array.
+
+        If the instance of this class was initialized with ``banded=True``, the
+        spectra are evaluated only in a band of
+        :attr:`~martini.spectral_models._BaseSpectrum.band_width` channels starting
+        at the channel given for each particle in
+        :attr:`~martini.spectral_models._BaseSpectrum.spectra_offsets`.
+
+        The output array is allocated once and filled in blocks of particles (see the
+        ``chunk_size`` parameter of the class).
 
         Parameters
         ----------
@@ -86,6 +140,136 @@ class _BaseSpectrum(metaclass=ABCMeta):
         self.channel_edges = datacube.velocity_channel_edges
         channel_widths = np.abs(np.diff(self.channel_edges).to(U.km * U.s**-1))
         self.vmids = source.skycoords.radial_velocity
+        self._init_band(source)
+        if self.spectra_offsets is not None:
+            channel_widths = channel_widths[
+                self.spectra_offsets[:, np.newaxis] + np.arange(self.band_width)
+            ]
+        A, unit_factor = self._line_amplitudes(source)
+        n_particles = len(self.vmids)
+        if self.chunk_size is not None:
+            chunk_size = self.chunk_size
+        elif self.ncpu > 1:
+            chunk_size = -(-n_particles // self.ncpu)  # ceil
+        else:
+            chunk_size = n_particles
+        chunks = [
+            np.s_[start : start + chunk_size]
+            for start in range(0, n_particles, max(chunk_size, 1))
+        ]
+        channel_widths = channel_widths.to_value(U.km * U.s**-1).astype(self.spec_dtype)
+        self.spectra = (
+            np.empty(
+                (
+                    n_particles,
+                    datacube.n_channels if self.band_width is None else self.band_width,
+                ),
+                dtype=self.spec_dtype,
+            )
+            * U.Jy
+        )
+
+        def insert_chunk(chunk, raw_spectra):
+            """
+            Normalize spectra for a block of particles and store them.
+
+            Parameters
+            ----------
+            chunk : slice
+                Slice defining the block of particles.
+
+            raw_spectra : ~numpy.typing.ArrayLike
+                Spectra of the particles in the block, normalized to sum to ``1``.
+            """
+            self.spectra.value[chunk] = (
+                A[chunk, np.newaxis]
+                * raw_spectra
+                / (
+                    channel_widths
+                    if self.spectra_offsets is None
+                    else channel_widths[chunk]
+                )
+                * self.spec_dtype(unit_factor)
+            )
+
+        if self.ncpu == 1:
+            for chunk in chunks:
+                insert_chunk(chunk, self.evaluate_spectra(source, datacube, mask=chunk))
+        elif self.backend == "thread":
+
+            def evaluate_chunk(chunk):
+                """
+                Evaluate and store spectra for a block of particles.
+
+                Parameters
+                ----------
+                chunk : slice
+                    Slice defining the block of particles.
+                """
+                # evaluate_spectra sets spectral_function_extra_data for the chunk, so
+                # each thread works on its own (shallow) copy of this instance
+                insert_chunk(
+                    chunk, copy(self).evaluate_spectra(source, datacube, chunk)
+                )
+
+            with ThreadPoolExecutor(max_workers=self.ncpu) as executor:
+                for future in [executor.submit(evaluate_chunk, c) for c in chunks]:
+                    future.result()  # re-raises any exception
+        else:
+            from multiprocess.pool import Pool
+
+            with Pool(processes=self.ncpu) as pool:
+                for chunk, raw_spectra in zip(
+                    chunks,
+                    pool.imap(
+                        lambda mask: self.evaluate_spectra(source, datacube, mask=mask),
+                        chunks,
+                    ),
+                ):
+                    insert_chunk(chunk, raw_spectra)
+
+        return
+
+    def _index_spectra(self, spectral_model, index):
+        """
+        Take the spectra of a subset of particles from another spectral model.
+
+        Parameters
+        ----------
+        spectral_model : ~martini.spectral_models._BaseSpectrum
+            Spectral model for which
+            :meth:`~martini.spectral_models._BaseSpectrum.init_spectra` was called.
+
+        index : ~numpy.typing.ArrayLike
+            Integer array with the indices of the particles to take, in order.
+        """
+        self.channel_edges = spectral_model.channel_edges
+        self.vmids = spectral_model.vmids[index]
+        self.spectra = spectral_model.spectra[index]
+        self.band_width = spectral_model.band_width
+        self.spectra_offsets = (
+            None
+            if spectral_model.spectra_offsets is None
+            else spectral_model.spectra_offsets[index]
+        )
+        return
+
+    def _line_amplitudes(self, source):
+        """
+        Calculate the amplitude of the line of each particle.
+
+        Parameters
+        ----------
+        source : ~martini.sources.sph_source.SPHSource
+            Source object containing arrays of particle properties.
+
+        Returns
+        -------
+        out : tuple
+            A 2-tuple containing the HI mass of each particle divided by the square of
+            its distance, in units of Msun / Mpc^2, and the factor converting these
+            units divided by a velocity in km / s to Jy.
+        """
         A = source.mHI_g * np.power(source.skycoords.distance.to(U.Mpc), -2)
         MHI_Jy = (
             U.Msun * U.Mpc**-2 * (U.km * U.s**-1) ** -1,
@@ -93,37 +277,107 @@ class _BaseSpectrum(metaclass=ABCMeta):
             lambda x: (1 / 2.36e5) * x,
             lambda x: 2.36e5 * x,
         )
-        if self.ncpu == 1:
-            raw_spectra = self.evaluate_spectra(source, datacube)
-        else:
-            from multiprocess.pool import Pool
+        unit_factor = (U.Msun * U.Mpc**-2 * (U.km * U.s**-1) ** -1).to(
+            U.Jy, equivalencies=[MHI_Jy]
+        )
+        return A.to_value(U.Msun * U.Mpc**-2).astype(self.spec_dtype), unit_factor
 
-            with Pool(processes=self.ncpu) as pool:
-                raw_spectra = np.vstack(
-                    pool.map(
-                        lambda mask: self.evaluate_spectra(source, datacube, mask=mask),
-                        [
-                            (
-                                np.s_[
-                                    icpu
-                                    * len(self.vmids)
-                                    // self.ncpu : (icpu + 1)
-                                    * len(self.vmids)
-                                    // self.ncpu
-                                ]
-                                if icpu is not None
-                                else np.s_[...]
-                            )
-                            for icpu in range(self.ncpu)
-                        ],
-                    )
+    def global_spectrum(self, source, datacube):
+        """
+        Calculate the sum of the spectra of all particles.
+
+        Gives the same result as summing the spectra evaluated by
+        :meth:`~martini.spectral_models._BaseSpectrum.init_spectra` over particles, but
+        the spectra of blocks of particles (see the ``chunk_size`` parameter of the
+        class) are accumulated into a single spectrum in turn instead of being stored.
+        If the instance of this class was initialized with ``banded=True`` the spectra
+        are evaluated only in the band of channels of each particle. The spectra are
+        not evaluated in parallel.
+
+        Parameters
+        ----------
+        source : ~martini.sources.sph_source.SPHSource
+            Source object containing arrays of particle properties.
+
+        datacube : ~martini.datacube.DataCube
+            :class:`~martini.datacube.DataCube` object defining the observational
+            parameters, including spectral channels.
+
+        Returns
+        -------
+        out : ~astropy.units.Quantity
+            :class:`~astropy.units.Quantity` with dimensions of flux density.
+            Spectrum summed over all particles, in Jy.
+        """
+        self.channel_edges = datacube.velocity_channel_edges
+        self.vmids = source.skycoords.radial_velocity
+        self._init_band(source)
+        A, unit_factor = self._line_amplitudes(source)
+        n_particles = len(self.vmids)
+        chunk_size = self.chunk_size if self.chunk_size is not None else n_particles
+        spectrum = np.zeros(datacube.n_channels)
+        for start in range(0, n_particles, max(chunk_size, 1)):
+            chunk = np.s_[start : start + chunk_size]
+            weighted_spectra = A[chunk, np.newaxis] * self.evaluate_spectra(
+                source, datacube, mask=chunk
+            )
+            if self.spectra_offsets is None:
+                spectrum += weighted_spectra.sum(axis=0)
+            else:
+                spectrum += np.bincount(
+                    (
+                        self.spectra_offsets[chunk, np.newaxis]
+                        + np.arange(self.band_width)
+                    ).reshape(-1),
+                    weights=weighted_spectra.reshape(-1),
+                    minlength=datacube.n_channels,
                 )
-        self.spectra = (
-            A.astype(self.spec_dtype)[..., np.newaxis]
-            * raw_spectra
-            / channel_widths.astype(self.spec_dtype)
-        ).to(U.Jy, equivalencies=[MHI_Jy])
+        channel_widths = np.abs(np.diff(self.channel_edges).to_value(U.km * U.s**-1))
+        return spectrum / channel_widths * unit_factor * U.Jy
+
+    def _init_band(self, source):
+        """
+        Determine the band of channels to evaluate for each particle.
 
+        Sets :attr:`~martini.spectral_models._BaseSpectrum.band_width` and
+        :attr:`~martini.spectral_models._BaseSpectrum.spectra_offsets`, or leaves them
+        as ``None`` if full spectra are to be evaluated.
+
+        Parameters
+        ----------
+        source : ~martini.sources.sph_source.SPHSource
+            Source object containing arrays of particle properties.
+        """
+        self.spectra_offsets = None
+        self.band_width = None
+        if not self.banded:
+            return
+        edges = self.channel_edges.to_value(U.km * U.s**-1)
+        n_channels = edges.size - 1
+        # pad by one channel either side so that rounding can't clip the band
+        band_half_channels = (
+            int(
+                np.ceil(
+                    self._band_half_widths
+                    * np.max(self.half_width(source)).to_value(U.km * U.s**-1)
+                    / np.min(np.abs(np.diff(edges)))
+                )
+            )
+            + 1
+        )
+        band_width = 2 * band_half_channels + 1
+        if band_width >= n_channels:
+            return
+        vmids = self.vmids.to_value(U.km * U.s**-1)
+        channel_coords = np.arange(n_channels + 1)
+        if edges[0] > edges[-1]:
+            edges, channel_coords = edges[::-1], channel_coords[::-1]
+        # velocities outside the bandpass are clamped to the edge channels
+        channels = np.floor(np.interp(vmids, edges, channel_coords)).astype(int)
+        self.spectra_offsets = np.clip(
+            channels - band_half_channels, 0, n_channels - band_width
+        )
+        self.band_width = band_width
         return
 
     def evaluate_spectra(self, source, datacube, mask=np.s_[...]):
@@ -148,6 +402,13 @@ class _BaseSpectrum(metaclass=ABCMeta):
         mask : slice, optional
             Slice defining the subset of particles to operate on.
             (Default: ``np.s_[...]``)
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Array with one row per particle containing the spectrum of each particle
+            (normalized to sum to ``1``), in the band of channels for the particle if
+            spectra are banded.
         """
         vmids = self.vmids[mask]
         self.init_spectral_function_extra_data(source, datacube, mask=mask)
@@ -159,33 +420,24 @@ class _BaseSpectrum(metaclass=ABCMeta):
             upper_edges_slice = np.s_[:-1]
         else:
             raise ValueError("Channel edges are not monotonic sequence.")
-        return self.spectral_function(
-            (
-                np.tile(
-                    self.channel_edges.to_value(self.channel_edges.unit)[
-                        lower_edges_slice
-                    ],
-                    vmids.shape + (1,),
-                )
-                * self.channel_edges.unit
-            ).astype(self.spec_dtype),
-            (
-                np.tile(
-                    self.channel_edges.to_value(self.channel_edges.unit)[
-                        upper_edges_slice
-                    ],
-                    vmids.shape + (1,),
-                )
-                * self.channel_edges.unit
-            ).astype(self.spec_dtype),
-            (
-                np.tile(
-                    vmids.to_value(vmids.unit),
-                    np.shape(self.channel_edges[:-1]) + (1,) * vmids.ndim,
-                ).T
-                * vmids.unit
-            ).astype(self.spec_dtype),
+        if self.spectra_offsets is None:
+            channels = np.s_[np.newaxis, :]
+            n_channels = datacube.n_channels
+        else:
+            channels = self.spectra_offsets[mask][:, np.newaxis] + np.arange(
+                self.band_width
+            )
+            n_channels = self.band_width
+        edges = self.channel_edges.to_value(self.channel_edges.unit).astype(
+            self.spec_dtype
+        )
+        raw_spectra = self.spectral_function(
+            edges[lower_edges_slice][channels] * self.channel_edges.unit,
+            edges[upper_edges_slice][channels] * self.channel_edges.unit,
+            vmids.to_value(vmids.unit).astype(self.spec_dtype)[..., np.newaxis]
+            * vmids.unit,
         ).to_value(U.dimensionless_unscaled)
+        return np.broadcast_to(raw_spectra, vmids.shape + (n_channels,))
 
     @abstractmethod
     def half_width(self, source):
@@ -207,7 +459,12 @@ class _BaseSpectrum(metaclass=ABCMeta):
         Abstract method; implementation of the spectral model.
 
         Should calculate the flux in each spectral channel, calculation should
-        be vectorized (with :mod:`numpy`).
+        be vectorized (with :mod:`numpy`). The arguments (and any arrays in
+        :attr:`~martini.spectral_models._BaseSpectrum.spectral_function_extra_data`)
+        are not expanded to a common shape, but broadcast against each other: the channel
+        edges have shape ``(1, N_channels)`` (or one row per particle if spectra are
+        banded) and the velocities have shape ``(N_particles, 1)``. The result should
+        have the broadcast shape.
 
         Parameters
         ----------
@@ -237,7 +494,9 @@ class _BaseSpectrum(metaclass=ABCMeta):
         Derived classes should override this function, if needed, to populate the dict
         with any information from the source that is required by the
         :meth:`~martini.spectral_models._BaseSpectrum.spectral_function`,
-        then call ``super().init_spectral_function_extra_data``.
+        then call ``super().init_spectral_function_extra_data``. This masks the
+        per-particle arrays and reshapes them to shape ``(N_particles, 1)``, or scalars to
+        shape ``(1, 1)``, to broadcast against the channel edges.
 
         Parameters
         ----------
@@ -259,13 +518,9 @@ class _BaseSpectrum(metaclass=ABCMeta):
         if self.spectral_function_extra_data is None:
             self.spectral_function_extra_data = dict()
         self.spectral_function_extra_data = {
-            k: np.tile(
-                v[mask] if not v.isscalar else v,
-                np.shape(datacube.channel_edges[:-1])
-                + (1,) * source.skycoords.radial_velocity.ndim,
-            )
-            .astype(self.spec_dtype)
-            .T
+            k: np.atleast_1d(v[mask] if not v.isscalar else v).astype(self.spec_dtype)[
+                ..., np.newaxis
+            ]
             for k, v in self.spectral_function_extra_data.items()
         }
         return
@@ -297,15 +552,44 @@ class GaussianSpectrum(_BaseSpectrum):
         Data type of the arrays storing spectra of each particle, can be used to manage
         memory usage by adjusting precision.
 
+    banded : bool, optional
+        If ``True``, store spectra only in a band of channels within ``6`` times sigma
+        of the velocity of each particle. See
+        :class:`~martini.spectral_models._BaseSpectrum`. (Default: ``False``)
+
+    chunk_size : int, optional
+        If provided, evaluate spectra in blocks of at most this many particles to bound
+        memory usage. See :class:`~martini.spectral_models._BaseSpectrum`.
+        (Default: ``None``)
+
+    backend : str, optional
+        Use a pool of processes (``"process"``) or threads (``"thread"``) when
+        ``ncpu > 1``. See :class:`~martini.spectral_models._BaseSpectrum`.
+        (Default: ``"process"``)
+
     See Also
     --------
     martini.spectral_models._BaseSpectrum
     martini.spectral_models.DiracDeltaSpectrum
     """
 
-    def __init__(self, sigma=7.0 * U.km * U.s**-1, ncpu=None, spec_dtype=np.float64):
+    def __init__(
+        self,
+        sigma=7.0 * U.km * U.s**-1,
+        ncpu=None,
+        spec_dtype=np.float64,
+        banded=False,
+        chunk_size=None,
+        backend="process",
+    ):
         self.sigma_mode = sigma
-        super().__init__(ncpu=ncpu, spec_dtype=spec_dtype)
+        super().__init__(
+            ncpu=ncpu,
+            spec_dtype=spec_dtype,
+            banded=banded,
+            chunk_size=chunk_size,
+            backend=backend,
+        )
 
         return
 
@@ -364,6 +648,55 @@ class GaussianSpectrum(_BaseSpectrum):
         super().init_spectral_function_extra_data(source, datacube, mask=mask)
         return
 
+    def global_spectrum(self, source, datacube):
+        """
+        Calculate the sum of the spectra of all particles.
+
+        The flux of a particle in a channel is a difference of its cumulative
+        distribution function at the channel edges, so the sum over particles is a
+        difference of the summed cumulative distribution functions. These are
+        evaluated only at the channel edges, as plain arrays without units, in blocks
+        of particles (see the ``chunk_size`` parameter of the class). The spectra are
+        not truncated even if the instance of this class was initialized with
+        ``banded=True``.
+
+        Parameters
+        ----------
+        source : ~martini.sources.sph_source.SPHSource
+            Source object containing arrays of particle properties.
+
+        datacube : ~martini.datacube.DataCube
+            :class:`~martini.datacube.DataCube` object defining the observational
+            parameters, including spectral channels.
+
+        Returns
+        -------
+        out : ~astropy.units.Quantity
+            :class:`~astropy.units.Quantity` with dimensions of flux density.
+            Spectrum summed over all particles, in Jy.
+        """
+        self.channel_edges = datacube.velocity_channel_edges
+        self.vmids = source.skycoords.radial_velocity
+        edges = self.channel_edges.to_value(U.km * U.s**-1)
+        vmids = self.vmids.to_value(U.km * U.s**-1)
+        sigma = np.broadcast_to(
+            self.half_width(source).to_value(U.km * U.s**-1), vmids.shape
+        )
+        A, unit_factor = self._line_amplitudes(source)
+        n_particles = vmids.size
+        chunk_size = self.chunk_size if self.chunk_size is not None else n_particles
+        cdf = np.zeros(edges.size)
+        for start in range(0, n_particles, max(chunk_size, 1)):
+            chunk = np.s_[start : start + chunk_size]
+            cdf += A[chunk] @ erf(
+                (edges - vmids[chunk, np.newaxis])
+                / (np.sqrt(2.0) * sigma[chunk, np.newaxis])
+            )
+        # channel edges may be in increasing or decreasing order of velocity
+        spectrum = 0.5 * np.abs(np.diff(cdf))
+        channel_widths = np.abs(np.diff(edges))
+        return spectrum / channel_widths * unit_factor * U.Jy
+
     def half_width(self, source):
         """
         Calculate 1D velocity dispersions from particle temperatures, or return
@@ -405,10 +738,38 @@ class DiracDeltaSpectrum(_BaseSpectrum):
     spec_dtype : type, optional
         Data type of the arrays storing spectra of each particle, can be used to manage
         memory usage by adjusting precision.
+
+    banded : bool, optional
+        If ``True``, store spectra only in a band of a few channels around the velocity
+        of each particle. See :class:`~martini.spectral_models._BaseSpectrum`.
+        (Default: ``False``)
+
+    chunk_size : int, optional
+        If provided, evaluate spectra in blocks of at most this many particles to bound
+        memory usage. See :class:`~martini.spectral_models._BaseSpectrum`.
+        (Default: ``None``)
+
+    backend : str, optional
+        Use a pool of processes (``"process"``) or threads (``"thread"``) when
+        ``ncpu > 1``. See :class:`~martini.spectral_models._BaseSpectrum`.
+        (Default: ``"process"``)
     """
 
-    def __init__(self, ncpu=None, spec_dtype=np.float64):
-        super().__init__(ncpu=ncpu, spec_dtype=spec_dtype)
+    def __init__(
+        self,
+        ncpu=None,
+        spec_dtype=np.float64,
+        banded=False,
+        chunk_size=None,
+        backend="process",
+    ):
+        super().__init__(
+            ncpu=ncpu,
+            spec_dtype=spec_dtype,
+            banded=banded,
+            chunk_size=chunk_size,
+            backend=backend,
+        )
         return
 
     def spectral_function(self, a, b, vmids):
@@ -437,6 +798,48 @@ class DiracDeltaSpectrum(_BaseSpectrum):
 
         return np.heaviside(vmids - a, 1.0) * np.heaviside(b - vmids, 0.0)
 
+    def global_spectrum(self, source, datacube):
+        """
+        Calculate the sum of the spectra of all particles.
+
+        Each particle contributes only to the channel containing its line-of-sight
+        velocity, so the sum is a histogram of the velocities weighted by the
+        amplitude of the line of each particle, and no spectra need to be evaluated.
+
+        Parameters
+        ----------
+        source : ~martini.sources.sph_source.SPHSource
+            Source object containing arrays of particle properties.
+
+        datacube : ~martini.datacube.DataCube
+            :class:`~martini.datacube.DataCube` object defining the observational
+            parameters, including spectral channels.
+
+        Returns
+        -------
+        out : ~astropy.units.Quantity
+            :class:`~astropy.units.Quantity` with dimensions of flux density.
+            Spectrum summed over all particles, in Jy.
+        """
+        self.channel_edges = datacube.velocity_channel_edges
+        self.vmids = source.skycoords.radial_velocity
+        edges = self.channel_edges.to_value(U.km * U.s**-1)
+        vmids = self.vmids.to_value(U.km * U.s**-1)
+        n_channels = datacube.n_channels
+        if edges[0] > edges[-1]:
+            # decreasing velocity along the spectral axis, e.g. frequency channels
+            channels = n_channels - np.searchsorted(edges[::-1], vmids, side="right")
+        else:
+            channels = np.searchsorted(edges, vmids, side="right") - 1
+        # a particle is in the channel with lower edge <= vmid < upper edge
+        in_band = (channels >= 0) & (channels < n_channels)
+        A, unit_factor = self._line_amplitudes(source)
+        spectrum = np.bincount(
+            channels[in_band], weights=A[in_band], minlength=n_channels
+        )
+        channel_widths = np.abs(np.diff(edges))
+        return spectrum / channel_widths * unit_factor * U.Jy
+
     def half_width(self, source):
         """
         Dirac-delta function has 0 width.
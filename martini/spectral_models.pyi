@@ -11,18 +11,39 @@ from types import EllipsisType
 class _BaseSpectrum(metaclass=abc.ABCMeta):
     __metaclass__: Incomplete
     spectra: T.Optional[U.Quantity[U.Jy]]
+    spectra_offsets: T.Optional[np.ndarray]
+    band_width: T.Optional[int]
     ncpu: int
     spec_dtype: type
+    banded: bool
+    chunk_size: T.Optional[int]
+    backend: str
+    _band_half_widths: int
     spectral_function_extra_data: T.Optional[T.Dict[str, T.Any]]
 
-    def __init__(self, ncpu: T.Optional[int] = ..., spec_dtype: type = ...) -> None: ...
+    def __init__(
+        self,
+        ncpu: T.Optional[int] = ...,
+        spec_dtype: type = ...,
+        banded: bool = ...,
+        chunk_size: T.Optional[int] = ...,
+        backend: str = ...,
+    ) -> None: ...
     def init_spectra(self, source: SPHSource, datacube: DataCube) -> None: ...
+    def _index_spectra(
+        self, spectral_model: _BaseSpectrum, index: np.ndarray
+    ) -> None: ...
+    def _line_amplitudes(self, source: SPHSource) -> T.Tuple[np.ndarray, float]: ...
+    def global_spectrum(
+        self, source: SPHSource, datacube: DataCube
+    ) -> U.Quantity[U.Jy]: ...
+    def _init_band(self, source: SPHSource) -> None: ...
     def evaluate_spectra(
         self,
         source: SPHSource,
         datacube: DataCube,
         mask: T.Union[slice, EllipsisType] = ...,
-    ) -> None: ...
+    ) -> np.ndarray: ...
     @abstractmethod
     def half_width(self, source: SPHSource) -> U.Quantity[U.km / U.s]: ...
     @abstractmethod
@@ -47,6 +68,9 @@ class GaussianSpectrum(_BaseSpectrum):
         sigma: T.Union[str, U.Quantity[U.km / U.s]] = ...,
         ncpu: T.Optional[int] = None,
         spec_dtype: type = ...,
+        banded: bool = ...,
+        chunk_size: T.Optional[int] = ...,
+        backend: str = ...,
     ) -> None: ...
     def spectral_function(
         self,
@@ -60,14 +84,27 @@ class GaussianSpectrum(_BaseSpectrum):
         datacube: DataCube,
         mask: T.Union[slice, EllipsisType] = ...,
     ) -> None: ...
+    def global_spectrum(
+        self, source: SPHSource, datacube: DataCube
+    ) -> U.Quantity[U.Jy]: ...
     def half_width(self, source: SPHSource) -> U.Quantity[U.km / U.s]: ...
 
 class DiracDeltaSpectrum(_BaseSpectrum):
-    def __init__(self, ncpu: T.Optional[int] = ..., spec_dtype: type = ...) -> None: ...
+    def __init__(
+        self,
+        ncpu: T.Optional[int] = ...,
+        spec_dtype: type = ...,
+        banded: bool = ...,
+        chunk_size: T.Optional[int] = ...,
+        backend: str = ...,
+    ) -> None: ...
     def spectral_function(
         self,
         a: U.Quantity[U.km / U.s],
         b: U.Quantity[U.km / U.s],
         vmids: U.Quantity[U.km / U.s],
     ) -> U.Quantity[U.dimensionless_unscaled]: ...
+    def global_spectrum(
+        self, source: SPHSource, datacube: DataCube
+    ) -> U.Quantity[U.Jy]: ...
     def half_width(self, source: SPHSource) -> U.Quantity[U.km / U.s]: ...
@@ -7,6 +7,10 @@ import numpy as np
 import astropy.units as U
 from scipy.special import erf
 from scipy.optimize import fsolve
+from martini import _kernel_accel
+
+# kernel integral lookup tables, shared by all instances of a kernel class
+_kernel_tables = dict()
 
 
 def find_fwhm(f):
@@ -43,20 +47,46 @@ class _BaseSPHKernel(object):
 
     :meth:`~martini.sph_kernels._BaseSPHKernel._kernel_integral` should define the
     integral of the kernel over a pixel given the distance between the pixel centre and
-    the particle centre, and the smoothing length (both in units of pixels). The integral
-    should be normalized so that evaluated over the entire kernel it is equal to ``1``.
+    the particle centre, and the smoothing length (both
+    :class:`~astropy.units.Quantity` with dimensions of pixels). The integral should be
+    normalized so that evaluated over the entire kernel it is equal to ``1``, and
+    returned with dimensions of pixels^-2. Kernels that set the class attribute
+    ``unitless_integral`` to ``True`` instead receive and return plain arrays in units
+    of pixels, without attached :mod:`astropy.units`, which avoids the overhead of
+    unit handling in the source insertion loop. All kernels defined in this module do
+    so.
 
     :meth:`~martini.sph_kernels._BaseSPHKernel._validate` should check whether any
     approximations converge to sufficient accuracy (for instance, depending on the
     ratio of the pixel size and smoothing length), and raise an error if not. It should
     return a boolean array with ``True`` for particles which pass validation, and
     ``False`` otherwise.
+
+    Kernels whose integral over a pixel is a function of the distance to the pixel
+    centre in units of the smoothing length only (divided by the square of the
+    smoothing length), vanishing beyond one smoothing length, can offer a
+    ``tabulate`` option to replace the evaluation of
+    :meth:`~martini.sph_kernels._BaseSPHKernel._kernel_integral` by interpolation in a
+    lookup table (see :meth:`~martini.sph_kernels._BaseSPHKernel._kernel_table`).
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, interpolate the kernel integral in a lookup table.
+        (Default: ``False``)
     """
 
     __metaclass__ = ABCMeta
 
-    def __init__(self):
+    # number of points in the lookup table of the kernel integral
+    _table_size = 2**14 + 1
+
+    # _kernel_integral takes and returns plain arrays in pixels, rather than Quantity
+    unitless_integral = False
+
+    def __init__(self, tabulate=False):
         self._rescale = 1
+        self.tabulate = tabulate
         return
 
     def _px_weight(self, dij, mask=None):
@@ -82,15 +112,133 @@ class _BaseSPHKernel(object):
             :class:`~astropy.units.Quantity`, with dimensions of pixels^-2.
             Integral of smoothing kernel over pixel, per unit pixel area.
         """
+        return (
+            self._px_weight_value(
+                dij.to_value(U.pix), self.sm_lengths.to_value(U.pix), mask=mask
+            )
+            * U.pix**-2
+        )
+
+    def _px_weight_value(self, dij, sm_lengths, mask=None):
+        """
+        Calculate kernel integral using scaled smoothing lengths, without units.
+
+        Equivalent to :meth:`~martini.sph_kernels._BaseSPHKernel._px_weight`, but
+        inputs and output are plain arrays in units of pixels, avoiding the overhead of
+        :mod:`astropy.units` in the source insertion loop.
+
+        Parameters
+        ----------
+        dij : ~numpy.typing.ArrayLike
+            Distances from pixel centre to particle positions, in pixels.
+
+        sm_lengths : ~numpy.typing.ArrayLike
+            Smoothing lengths of all particles (before applying ``mask``), in pixels.
+
+        mask : ~numpy.typing.ArrayLike or slice, optional
+            Boolean mask to apply to any maskable attributes. (Default: ``None``)
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Integral of smoothing kernel over pixel, per unit pixel area (in pixels^-2),
+            with the floating point precision of ``sm_lengths``.
+        """
         if mask is not None:
             try:
                 rescale = self._rescale[mask]
             except (TypeError, IndexError):
                 rescale = self._rescale
-            rescaled_h = self.sm_lengths[mask] * rescale
+            rescaled_h = sm_lengths[mask] * rescale
         else:
-            rescaled_h = self.sm_lengths * self._rescale
-        return self._kernel_integral(dij, rescaled_h, mask=mask)
+            rescaled_h = sm_lengths * self._rescale
+        return np.asarray(self._pixel_integral(dij, rescaled_h, mask=mask)).astype(
+            np.result_type(sm_lengths, np.float32), copy=False
+        )
+
+    def _pixel_integral(self, dij, h, mask=np.s_[...]):
+        """
+        Calculate the kernel integral over a pixel, from the lookup table if enabled.
+
+        Parameters
+        ----------
+        dij : ~numpy.typing.ArrayLike
+            Distances from pixel centre to particle positions, in pixels.
+        h : ~numpy.typing.ArrayLike
+            Particle smoothing lengths (FWHM), in pixels.
+        mask : ~numpy.typing.ArrayLike or slice
+            Boolean array, or slice. If the kernel has other internal properties to
+            mask, it may use this.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Integral of smoothing kernel over pixel, per unit pixel area (in
+            pixels^-2).
+        """
+        if not self.tabulate:
+            return self._unitless_kernel_integral(dij, h, mask=mask)
+        values, slopes = self._kernel_table()
+        # position in the table, which spans 0 <= R <= 1 in equal steps
+        x = np.sqrt(np.power(dij, 2).sum(axis=0)) / h * (self._table_size - 1)
+        # the last entry is 0 with slope 0, used for R >= 1
+        np.minimum(x, self._table_size - 1, out=x)
+        i = x.astype(np.intp)
+        return (values[i] + (x - i) * slopes[i]) / np.power(h, 2)
+
+    def _unitless_kernel_integral(self, dij, h, mask=np.s_[...]):
+        """
+        Evaluate the kernel integral, with plain arrays in pixels as arguments and result.
+
+        Kernels with ``unitless_integral`` set to ``False`` are passed
+        :class:`~astropy.units.Quantity` arguments, and their result is converted back to
+        a plain array.
+
+        Parameters
+        ----------
+        dij : ~numpy.typing.ArrayLike
+            Distances from pixel centre to particle positions, in pixels.
+        h : ~numpy.typing.ArrayLike
+            Particle smoothing lengths (FWHM), in pixels.
+        mask : ~numpy.typing.ArrayLike or slice
+            Boolean array, or slice. If the kernel has other internal properties to
+            mask, it may use this.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Integral of smoothing kernel over pixel, per unit pixel area (in
+            pixels^-2).
+        """
+        if self.unitless_integral:
+            return self._kernel_integral(dij, h, mask=mask)
+        return self._kernel_integral(dij * U.pix, h * U.pix, mask=mask).to_value(
+            U.pix**-2
+        )
+
+    def _kernel_table(self):
+        """
+        Get the lookup table of the kernel integral, creating it on first use.
+
+        The integral over a pixel at a distance ``R`` from the particle, in units of
+        the smoothing length, is evaluated with
+        :meth:`~martini.sph_kernels._BaseSPHKernel._kernel_integral` for a smoothing
+        length of one pixel at ``_table_size`` equally spaced ``0 <= R <= 1``. The
+        table is created once per kernel class and shared between instances.
+
+        Returns
+        -------
+        out : tuple
+            A 2-tuple containing the tabulated values and the slopes between
+            successive values (with a final slope of ``0``).
+        """
+        if type(self) not in _kernel_tables:
+            R = np.linspace(0, 1, self._table_size)
+            values = self._unitless_kernel_integral(
+                np.vstack((R, np.zeros(R.shape))), np.ones(R.shape)
+            )
+            _kernel_tables[type(self)] = (values, np.r_[np.diff(values), 0.0])
+        return _kernel_tables[type(self)]
 
     def _confirm_validation(self, noraise=False, quiet=False):
         """
@@ -197,6 +345,32 @@ class _BaseSPHKernel(object):
 
         return
 
+    def _particle_order(self):
+        """
+        Get an order of the particles that speeds up the kernel integral, if any.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike or None
+            Array of particle indices in the preferred order, or ``None`` if the order
+            does not matter.
+        """
+        return None
+
+    def _point_like(self):
+        """
+        Determine which particles the kernel treats as point-like.
+
+        A point-like particle contributes all of its flux to the pixel containing its
+        centre.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Boolean array with shape ``(N, )``, ``True`` for point-like particles.
+        """
+        return np.zeros(np.shape(self.sm_lengths), dtype=bool)
+
     def _init_sm_lengths(self, source=None, datacube=None):
         """
         Determine kernel sizes in pixel units.
@@ -247,13 +421,15 @@ class _BaseSPHKernel(object):
         """
         Abstract method; calculate the kernel integral over a pixel.
 
+        The arguments and return value are plain arrays in the units given below if
+        ``unitless_integral`` is ``True``, and :class:`~astropy.units.Quantity`
+        otherwise.
+
         Parameters
         ----------
-        dij : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        dij : ~astropy.units.Quantity or ~numpy.typing.ArrayLike
             Distances from pixel centre to particle positions, in pixels.
-        h : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        h : ~astropy.units.Quantity or ~numpy.typing.ArrayLike
             Particle smoothing lengths (FWHM), in pixels.
         mask : ~numpy.typing.ArrayLike or slice
             Boolean array, or slice. If the kernel has other internal properties to
@@ -261,9 +437,9 @@ class _BaseSPHKernel(object):
 
         Returns
         -------
-        out : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels^-2.
-            Integral of smoothing kernel over pixel, per unit pixel area.
+        out : ~astropy.units.Quantity or ~numpy.typing.ArrayLike
+            Integral of smoothing kernel over pixel, per unit pixel area (in
+            pixels^-2).
         """
 
         pass
@@ -317,12 +493,21 @@ class _WendlandC2Kernel(_BaseSPHKernel):
         \\end{cases}
 
     defines the WendlandC2 kernel.
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, the kernel integral is interpolated in a lookup table, which is
+        faster. The interpolation error is less than 1e-7 times the value at the
+        kernel centre. (Default: ``False``)
     """
 
+    unitless_integral = True
+
     min_valid_size = 1.51
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, tabulate=False):
+        super().__init__(tabulate=tabulate)
         _unscaled_fwhm = find_fwhm(lambda r: self.eval_kernel(r, 1))
         self.size_in_fwhm = 1 / _unscaled_fwhm
         self._rescale /= _unscaled_fwhm
@@ -367,11 +552,9 @@ class _WendlandC2Kernel(_BaseSPHKernel):
 
         Parameters
         ----------
-        dij : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        dij : ~numpy.typing.ArrayLike
             Distances from pixel centre to particle positions, in pixels.
-        h : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        h : ~numpy.typing.ArrayLike
             Particle smoothing lengths (FWHM), in pixels.
         mask : ~numpy.typing.ArrayLike or slice
             Boolean array, or slice. If the kernel has other internal properties to mask,
@@ -383,8 +566,15 @@ class _WendlandC2Kernel(_BaseSPHKernel):
             Approximate kernel integral over the pixel area.
         """
 
+        compiled = _kernel_accel.compiled_integral("wendland_c2")
+        if compiled is not None:
+            # the vectorized single precision loop may evaluate the branches that are
+            # not taken, raising spurious floating point warnings
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return compiled(dij[0], dij[1], h)
+
         dr2 = np.power(dij, 2).sum(axis=0)
-        retval = np.zeros(h.shape)
+        retval = np.zeros(h.shape, dtype=np.result_type(h, np.float32))
         R2 = dr2 / (h * h)
         retval[R2 == 0] = 2.0 / 3.0
         use = np.logical_and(R2 < 1, R2 != 0)
@@ -452,12 +642,21 @@ class _WendlandC6Kernel(_BaseSPHKernel):
         \\end{cases}
 
     defines the WendlandC6 kernel.
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, the kernel integral is interpolated in a lookup table, which is
+        faster. The interpolation error is less than 1e-6 times the value at the
+        kernel centre. (Default: ``False``)
     """
 
+    unitless_integral = True
+
     min_valid_size = 1.29
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, tabulate=False):
+        super().__init__(tabulate=tabulate)
         _unscaled_fwhm = find_fwhm(lambda r: self.eval_kernel(r, 1))
         self.size_in_fwhm = 1 / _unscaled_fwhm
         self._rescale /= _unscaled_fwhm
@@ -506,11 +705,9 @@ class _WendlandC6Kernel(_BaseSPHKernel):
 
         Parameters
         ----------
-        dij : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        dij : ~numpy.typing.ArrayLike
             Distances from pixel centre to particle positions, in pixels.
-        h : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        h : ~numpy.typing.ArrayLike
             Particle smoothing lengths, in pixels.
         mask : ~numpy.typing.ArrayLike or slice
             Boolean array, or slice. If the kernel has other internal properties to mask,
@@ -624,8 +821,12 @@ class _WendlandC6Kernel(_BaseSPHKernel):
                 + z
             )
 
+        compiled = _kernel_accel.compiled_integral("wendland_c6")
+        if compiled is not None:
+            return compiled(dij[0], dij[1], h)
+
         dr2 = np.power(dij, 2).sum(axis=0)
-        retval = np.zeros(h.shape)
+        retval = np.zeros(h.shape, dtype=np.result_type(h, np.float32))
         R = np.sqrt(dr2) / h
         use = np.logical_and(R < 1, R != 0)
         norm = 1365 / 64 / np.pi
@@ -694,12 +895,22 @@ class _CubicSplineKernel(_BaseSPHKernel):
         \\end{cases}
 
     defines the cubic spline kernel.
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, the kernel integral is interpolated in a lookup table, which is
+        faster. The interpolation error is less than 2e-4 times the value at the
+        kernel centre, largest where the integral changes steeply just inside half
+        of the kernel support. (Default: ``False``)
     """
 
+    unitless_integral = True
+
     min_valid_size = 1.16
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, tabulate=False):
+        super().__init__(tabulate=tabulate)
         _unscaled_fwhm = find_fwhm(lambda r: self.eval_kernel(r, 1))
         self.size_in_fwhm = 1 / _unscaled_fwhm
         self._rescale /= _unscaled_fwhm
@@ -749,11 +960,9 @@ class _CubicSplineKernel(_BaseSPHKernel):
 
         Parameters
         ----------
-        dij : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels
+        dij : ~numpy.typing.ArrayLike
             Distances from pixel centre to particle positions, in pixels.
-        h : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels
+        h : ~numpy.typing.ArrayLike
             Particle smoothing lengths, in pixels.
         mask : ~numpy.typing.ArrayLike or slice
             Boolean array, or slice. If the kernel has other internal properties to mask,
@@ -765,9 +974,13 @@ class _CubicSplineKernel(_BaseSPHKernel):
             Approximate kernel integral over the pixel area.
         """
 
-        dij *= 2  # changes interval from [0, 2) to [0, 1)
+        compiled = _kernel_accel.compiled_integral("cubic_spline")
+        if compiled is not None:
+            return compiled(dij[0], dij[1], h)
+
+        dij = 2 * dij  # changes interval from [0, 2) to [0, 1)
         dr2 = np.power(dij, 2).sum(axis=0)
-        retval = np.zeros(h.shape)
+        retval = np.zeros(h.shape, dtype=np.result_type(h, np.float32))
         R2 = dr2 / (h * h)
         retval[R2 == 0] = 11.0 / 16.0 + 0.25 * 0.25
         case1 = np.logical_and(R2 > 0, R2 <= 1)
@@ -870,6 +1083,8 @@ class _GaussianKernel(_BaseSPHKernel):
         (Default: ``3``)
     """
 
+    unitless_integral = True
+
     def __init__(self, truncate=3.0):
         self.truncate = truncate
         if self.truncate < 2:
@@ -944,11 +1159,9 @@ class _GaussianKernel(_BaseSPHKernel):
 
         Parameters
         ----------
-        dij : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        dij : ~numpy.typing.ArrayLike
             Distances from pixel centre to particle positions, in pixels.
-        h : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        h : ~numpy.typing.ArrayLike
             Particle smoothing lengths (FWHM), in pixels.
         mask : ~numpy.typing.ArrayLike or slice
             Boolean array, or slice. If the kernel has other internal properties to mask,
@@ -959,15 +1172,23 @@ class _GaussianKernel(_BaseSPHKernel):
         out : ~numpy.typing.ArrayLike
             Kernel integral over the pixel area.
         """
+        compiled = _kernel_accel.compiled_integral("gaussian")
+        if compiled is not None:
+            # in the precision of h, so that float32 inputs are not upcast
+            float_type = np.result_type(h, np.float32).type
+            return compiled(
+                dij[0], dij[1], h, float_type(self.truncate), float_type(self.norm)
+            )
+
         sig = 1 / (2 * np.sqrt(2 * np.log(2)))  # s.t. FWHM = 1
         dr = np.sqrt(np.power(dij, 2).sum(axis=0))
         with np.errstate(invalid="ignore"):
             zmax = np.sqrt(np.power(self.truncate, 2) - np.power(dr / h / sig, 2))
         zmax = np.where(self.truncate > dr / h / sig, zmax, 0)
-        x0 = (dij[0] - 0.5 * U.pix) / h / np.sqrt(2) / sig
-        x1 = (dij[0] + 0.5 * U.pix) / h / np.sqrt(2) / sig
-        y0 = (dij[1] - 0.5 * U.pix) / h / np.sqrt(2) / sig
-        y1 = (dij[1] + 0.5 * U.pix) / h / np.sqrt(2) / sig
+        x0 = (dij[0] - 0.5) / h / np.sqrt(2) / sig
+        x1 = (dij[0] + 0.5) / h / np.sqrt(2) / sig
+        y0 = (dij[1] - 0.5) / h / np.sqrt(2) / sig
+        y1 = (dij[1] + 0.5) / h / np.sqrt(2) / sig
 
         retval = (
             0.25 * erf(zmax / np.sqrt(2)) * (erf(x1) - erf(x0)) * (erf(y1) - erf(y0))
@@ -976,10 +1197,10 @@ class _GaussianKernel(_BaseSPHKernel):
         # explicit truncation not required as only pixels inside
         # truncation radius should be passed, next line useful for
         # testing, however
-        retval[(dr - np.sqrt(0.5) * U.pix) / h / sig > self.truncate] = 0
+        retval[(dr - np.sqrt(0.5)) / h / sig > self.truncate] = 0
 
         retval /= self.norm
-        return retval * h.unit**-2
+        return retval.astype(np.result_type(h, np.float32), copy=False)
 
     def _validate(self, sm_lengths, noraise=False, quiet=False):
         """
@@ -1038,6 +1259,8 @@ class DiracDeltaKernel(_BaseSPHKernel):
         (Default: 1.0)
     """
 
+    unitless_integral = True
+
     max_valid_size = 0.5
 
     def __init__(self, size_in_fwhm=1.0):
@@ -1081,11 +1304,9 @@ class DiracDeltaKernel(_BaseSPHKernel):
 
         Parameters
         ----------
-        dij : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        dij : ~numpy.typing.ArrayLike
             Distances from pixel centre to particle positions, in pixels.
-        h : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        h : ~numpy.typing.ArrayLike
             Particle smoothing lengths (FWHM), in pixels.
         mask : ~numpy.typing.ArrayLike or slice, optional
             Boolean mask to apply to any maskable attributes. (Default: ``np.s_[...]``)
@@ -1095,7 +1316,20 @@ class DiracDeltaKernel(_BaseSPHKernel):
         out : ~numpy.typing.ArrayLike
             Kernel integral over the pixel area.
         """
-        return np.where((np.abs(dij) < 0.5 * U.pix).all(axis=0), 1, 0) * U.pix**-2
+        return np.where((np.abs(dij) < 0.5).all(axis=0), 1.0, 0.0)
+
+    def _point_like(self):
+        """
+        Determine which particles the kernel treats as point-like.
+
+        All particles are point-like for this kernel.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Boolean array with shape ``(N, )``, ``True`` for point-like particles.
+        """
+        return np.ones(np.shape(self.sm_lengths), dtype=bool)
 
     def _validate(self, sm_lengths, noraise=False, quiet=False):
         """
@@ -1158,10 +1392,20 @@ class _AdaptiveKernel(_BaseSPHKernel):
         An iterable containing classes inheriting from
         :class:`~martini.sph_kernels._BaseSPHKernel`.
         Kernels to use, ordered by decreasing priority.
+
+    presort : bool, optional
+        If ``True``, the particles are sorted by the kernel that they use when the
+        :class:`~martini.martini.Martini` instance is initialized, so that the
+        particles using each kernel can be found without searching the particles
+        contributing to every pixel. (Default: ``False``)
     """
 
-    def __init__(self, kernels):
+    unitless_integral = True
+
+    def __init__(self, kernels, presort=False):
         self.kernels = kernels
+        self.presort = presort
+        self._kernel_starts = None  # initialized when particles are sorted
         super().__init__()
         self.size_in_fwhm = None  # initialized during Martini.__init__
         self._rescale = None  # initialized during Martini.__init__
@@ -1198,6 +1442,7 @@ class _AdaptiveKernel(_BaseSPHKernel):
         self._rescale = _rescales[self.kernel_indices]
         # ensure default is 0th entry
         self._rescale[self.kernel_indices == -1] = _rescales[0]
+        self._kernel_starts = None  # particles not yet sorted by kernel
 
         return
 
@@ -1214,9 +1459,49 @@ class _AdaptiveKernel(_BaseSPHKernel):
         self._rescale = self._rescale[mask]
         self.kernel_indices = self.kernel_indices[mask]
         super()._apply_mask(mask)
+        if self.presort and np.all(np.diff(self.kernel_indices) >= 0):
+            # index of first particle using each kernel (-1 first), and the end
+            self._kernel_starts = np.searchsorted(
+                self.kernel_indices, np.arange(-1, len(self.kernels) + 1)
+            )
+        else:
+            self._kernel_starts = None
 
         return
 
+    def _particle_order(self):
+        """
+        Get an order of the particles that speeds up the kernel integral, if any.
+
+        With ``presort=True`` the particles are ordered by the kernel that they use.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike or None
+            Array of particle indices in the preferred order, or ``None`` if the order
+            does not matter.
+        """
+        if not self.presort:
+            return None
+        return np.argsort(self.kernel_indices, kind="stable")
+
+    def _point_like(self):
+        """
+        Determine which particles the kernel treats as point-like.
+
+        These are the particles using a :class:`~martini.sph_kernels.DiracDeltaKernel`.
+
+        Returns
+        -------
+        out : ~numpy.typing.ArrayLike
+            Boolean array with shape ``(N, )``, ``True`` for point-like particles.
+        """
+        point_like_kernels = np.array(
+            [isinstance(K, DiracDeltaKernel) for K in self.kernels]
+        )
+        # particles without a valid kernel (index -1) use the first kernel
+        return point_like_kernels[np.maximum(self.kernel_indices, 0)]
+
     def eval_kernel(self, r, h):
         """
         Evaluate the kernel, handling array casting and rescaling.
@@ -1256,15 +1541,15 @@ class _AdaptiveKernel(_BaseSPHKernel):
         """
         Calculate the kernel integral over a pixel.
 
-        Adaptively determines which kernel to use.
+        Adaptively determines which kernel to use. If the particles have been sorted
+        by kernel (see ``presort``) and ``mask`` is a sorted array of particle indices,
+        the particles using each kernel are contiguous and are found by bisection.
 
         Parameters
         ----------
-        dij : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        dij : ~numpy.typing.ArrayLike
             Distances from pixel centre to particle positions, in pixels.
-        h : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        h : ~numpy.typing.ArrayLike
             Particle smoothing lengths (FWHM), in pixels.
         mask : ~numpy.typing.ArrayLike or slice
             Boolean array, or slice. If the kernel has other internal properties to mask,
@@ -1276,11 +1561,25 @@ class _AdaptiveKernel(_BaseSPHKernel):
             Approximate kernel integral over the pixel area.
         """
 
-        retval = np.zeros(h.shape) * h.unit**-2
+        retval = np.zeros(h.shape, dtype=np.result_type(h, np.float32))
+        if (
+            self._kernel_starts is not None
+            and isinstance(mask, np.ndarray)
+            and mask.dtype.kind in "iu"
+            and np.all(mask[1:] >= mask[:-1])
+        ):
+            bounds = np.searchsorted(mask, self._kernel_starts)
+            for ik, (first, last) in enumerate(zip(bounds[:-1], bounds[1:]), start=-1):
+                if last > first:
+                    K = self.kernels[0] if ik == -1 else self.kernels[ik]
+                    retval[first:last] = K._pixel_integral(
+                        dij[:, first:last], h[first:last]
+                    )
+            return retval
         for ik in np.unique(self.kernel_indices[mask]):
             K = self.kernels[0] if ik == -1 else self.kernels[ik]
             kmask = self.kernel_indices[mask] == ik
-            retval[kmask] = K._kernel_integral(dij[:, kmask], h[kmask])
+            retval[kmask] = K._pixel_integral(dij[:, kmask], h[kmask])
         return retval
 
     def _validate(self, sm_lengths, noraise=False, quiet=False):
@@ -1344,12 +1643,21 @@ class _QuarticSplineKernel(_BaseSPHKernel):
         \\end{cases}
 
     defines the quartic spline kernel.
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, the kernel integral is interpolated in a lookup table, which is
+        faster. The interpolation error is less than 1e-7 times the value at the
+        kernel centre. (Default: ``False``)
     """
 
+    unitless_integral = True
+
     min_valid_size = 1.2385
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, tabulate=False):
+        super().__init__(tabulate=tabulate)
         _unscaled_fwhm = find_fwhm(lambda r: self.eval_kernel(r, 1))
         self.size_in_fwhm = 1 / _unscaled_fwhm
         self._rescale /= _unscaled_fwhm
@@ -1413,11 +1721,9 @@ class _QuarticSplineKernel(_BaseSPHKernel):
 
         Parameters
         ----------
-        dij : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        dij : ~numpy.typing.ArrayLike
             Distances from pixel centre to particle positions, in pixels.
-        h : ~astropy.units.Quantity
-            :class:`~astropy.units.Quantity`, with dimensions of pixels.
+        h : ~numpy.typing.ArrayLike
             Particle smoothing lengths, in pixels.
         mask : ~numpy.typing.ArrayLike or slice
             Boolean array, or slice. If the kernel has other internal properties to mask,
@@ -1429,9 +1735,13 @@ class _QuarticSplineKernel(_BaseSPHKernel):
             Approximate kernel integral over the pixel area.
         """
 
+        compiled = _kernel_accel.compiled_integral("quartic_spline")
+        if compiled is not None:
+            return compiled(dij[0], dij[1], h)
+
         dr = np.sqrt(np.power(dij, 2).sum(axis=0))
-        retval = np.zeros(h.shape)
-        R = (dr / h).to_value(U.dimensionless_unscaled)
+        retval = np.zeros(h.shape, dtype=np.result_type(h, np.float32))
+        R = dr / h
 
         def IA(R, z, A):
             """
@@ -1537,11 +1847,28 @@ class WendlandC2Kernel(_AdaptiveKernel):
     surface integral of the WendlandC2 kernel is not accurate to within better than 1%.
     To strictly use the WendlandC2 kernel, use
     :class:`~martini.sph_kernels._WendlandC2Kernel` instead.
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, the kernel integral is interpolated in a lookup table, which is
+        faster. The interpolation error is less than 1e-7 times the value at the
+        kernel centre. (Default: ``False``)
+
+    presort : bool, optional
+        If ``True``, the particles are sorted by the kernel that they use (this kernel
+        or one of the fallbacks), which speeds up the kernel integral when many
+        particles use a fallback. (Default: ``False``)
     """
 
-    def __init__(self):
+    def __init__(self, tabulate=False, presort=False):
         super().__init__(
-            (_WendlandC2Kernel(), DiracDeltaKernel(), _GaussianKernel(truncate=6.0))
+            (
+                _WendlandC2Kernel(tabulate=tabulate),
+                DiracDeltaKernel(),
+                _GaussianKernel(truncate=6.0),
+            ),
+            presort=presort,
         )
         self.size_in_fwhm = None  # initialized during Martini.__init__
         self._rescale = None  # initialized during Martini.__init__
@@ -1597,11 +1924,28 @@ class WendlandC6Kernel(_AdaptiveKernel):
     surface integral of the WendlandC6 kernel is not accurate to within better than 1%.
     To strictly use the WendlandC6 kernel, use
     :class:`~martini.sph_kernels._WendlandC6Kernel` instead.
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, the kernel integral is interpolated in a lookup table, which is
+        faster. The interpolation error is less than 1e-6 times the value at the
+        kernel centre. (Default: ``False``)
+
+    presort : bool, optional
+        If ``True``, the particles are sorted by the kernel that they use (this kernel
+        or one of the fallbacks), which speeds up the kernel integral when many
+        particles use a fallback. (Default: ``False``)
     """
 
-    def __init__(self):
+    def __init__(self, tabulate=False, presort=False):
         super().__init__(
-            (_WendlandC6Kernel(), DiracDeltaKernel(), _GaussianKernel(truncate=6.0))
+            (
+                _WendlandC6Kernel(tabulate=tabulate),
+                DiracDeltaKernel(),
+                _GaussianKernel(truncate=6.0),
+            ),
+            presort=presort,
         )
         self.size_in_fwhm = None  # initialized during Martini.__init__
         self._rescale = None  # initialized during Martini.__init__
@@ -1660,11 +2004,29 @@ class CubicSplineKernel(_AdaptiveKernel):
     surface integral of the cubic spline kernel is not accurate to within better than 1%.
     To strictly use the cubic spline kernel, use
     :class:`~martini.sph_kernels._CubicSplineKernel` instead.
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, the kernel integral is interpolated in a lookup table, which is
+        faster. The interpolation error is less than 2e-4 times the value at the
+        kernel centre, largest where the integral changes steeply just inside half
+        of the kernel support. (Default: ``False``)
+
+    presort : bool, optional
+        If ``True``, the particles are sorted by the kernel that they use (this kernel
+        or one of the fallbacks), which speeds up the kernel integral when many
+        particles use a fallback. (Default: ``False``)
     """
 
-    def __init__(self):
+    def __init__(self, tabulate=False, presort=False):
         super().__init__(
-            (_CubicSplineKernel(), DiracDeltaKernel(), _GaussianKernel(truncate=6.0))
+            (
+                _CubicSplineKernel(tabulate=tabulate),
+                DiracDeltaKernel(),
+                _GaussianKernel(truncate=6.0),
+            ),
+            presort=presort,
         )
         self.size_in_fwhm = None  # initialized during Martini.__init__
         self._rescale = None  # initialized during Martini.__init__
@@ -1733,15 +2095,21 @@ class GaussianKernel(_AdaptiveKernel):
         Number of standard deviations at which to truncate kernel.
         Truncation radii <2 would lead to large errors and are not permitted.
         (Default: ``3``)
+
+    presort : bool, optional
+        If ``True``, the particles are sorted by the kernel that they use (this kernel
+        or one of the fallbacks), which speeds up the kernel integral when many
+        particles use a fallback. (Default: ``False``)
     """
 
-    def __init__(self, truncate=3.0):
+    def __init__(self, truncate=3.0, presort=False):
         super().__init__(
             (
                 _GaussianKernel(truncate=truncate),
                 DiracDeltaKernel(),
                 _GaussianKernel(truncate=6.0),
-            )
+            ),
+            presort=presort,
         )
         self.size_in_fwhm = None  # initialized during Martini.__init__
         self._rescale = None  # initialized during Martini.__init__
@@ -1806,11 +2174,28 @@ class QuarticSplineKernel(_AdaptiveKernel):
     surface integral of the quartic spline kernel is not accurate to within better
     than 1%. To strictly use the quartic spline kernel, use
     :class:`~martini.sph_kernels._QuarticSplineKernel` instead.
+
+    Parameters
+    ----------
+    tabulate : bool, optional
+        If ``True``, the kernel integral is interpolated in a lookup table, which is
+        faster. The interpolation error is less than 1e-7 times the value at the
+        kernel centre. (Default: ``False``)
+
+    presort : bool, optional
+        If ``True``, the particles are sorted by the kernel that they use (this kernel
+        or one of the fallbacks), which speeds up the kernel integral when many
+        particles use a fallback. (Default: ``False``)
     """
 
-    def __init__(self):
+    def __init__(self, tabulate=False, presort=False):
         super().__init__(
-            (_QuarticSplineKernel(), DiracDeltaKernel(), _GaussianKernel(truncate=6.0))
+            (
+                _QuarticSplineKernel(tabulate=tabulate),
+                DiracDeltaKernel(),
+                _GaussianKernel(truncate=6.0),
+            ),
+            presort=presort,
         )
         self.size_in_fwhm = None  # initialized during Martini.__init__
         self._rescale = None  # initialized during Martini.__init__
@@ -8,15 +8,36 @@ import astropy.units as U
 from martini.datacube import DataCube as DataCube
 from martini.sources.sph_source import SPHSource as SPHSource
 
+_kernel_tables: T.Dict[type, T.Tuple[ndarray, ndarray]]
+
 def find_fwhm(f: T.Callable[[ndarray], float]) -> float: ...
 
 class _BaseSPHKernel(metaclass=abc.ABCMeta):
     __metaclass__: Incomplete
+    _table_size: int
+    unitless_integral: bool
+    tabulate: bool
 
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ...) -> None: ...
     def _px_weight(
         self, dij: U.Quantity[U.pix], mask: T.Optional[ndarray] = ...
     ) -> U.Quantity[U.pix**2]: ...
+    def _px_weight_value(
+        self, dij: ndarray, sm_lengths: ndarray, mask: T.Optional[ndarray] = ...
+    ) -> ndarray: ...
+    def _pixel_integral(
+        self,
+        dij: ndarray,
+        h: ndarray,
+        mask: ndarray | EllipsisType | slice = ...,
+    ) -> ndarray: ...
+    def _unitless_kernel_integral(
+        self,
+        dij: ndarray,
+        h: ndarray,
+        mask: ndarray | EllipsisType | slice = ...,
+    ) -> ndarray: ...
+    def _kernel_table(self) -> T.Tuple[ndarray, ndarray]: ...
     def _confirm_validation(self, noraise: bool = ..., quiet: bool = ...) -> bool: ...
     def _validate_error(
         self,
@@ -34,6 +55,8 @@ class _BaseSPHKernel(metaclass=abc.ABCMeta):
     sm_ranges: ndarray
 
     def _apply_mask(self, mask: ndarray) -> None: ...
+    def _particle_order(self) -> T.Optional[ndarray]: ...
+    def _point_like(self) -> ndarray: ...
     def _init_sm_lengths(
         self, source: T.Optional[SPHSource] = ..., datacube: T.Optional[DataCube] = ...
     ) -> None: ...
@@ -42,8 +65,8 @@ class _BaseSPHKernel(metaclass=abc.ABCMeta):
     @abstractmethod
     def _kernel_integral(
         self,
-        dij: U.Quantity[U.pix],
-        h: U.Quantity[U.pix],
+        dij: ndarray,
+        h: ndarray,
         mask: ndarray | EllipsisType | slice = ...,
     ) -> ndarray: ...
     @abstractmethod
@@ -55,12 +78,12 @@ class _WendlandC2Kernel(_BaseSPHKernel):
     min_valid_size: float
     size_in_fwhm: float
 
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
     def _kernel_integral(
         self,
-        dij: U.Quantity[U.pix],
-        h: U.Quantity[U.pix],
+        dij: ndarray,
+        h: ndarray,
         mask: ndarray | EllipsisType | slice = ...,
     ) -> ndarray: ...
     def _validate(
@@ -71,12 +94,12 @@ class _WendlandC6Kernel(_BaseSPHKernel):
     min_valid_size: float
     size_in_fwhm: float
 
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
     def _kernel_integral(
         self,
-        dij: U.Quantity[U.pix],
-        h: U.Quantity[U.pix],
+        dij: ndarray,
+        h: ndarray,
         mask: ndarray | EllipsisType | slice = ...,
     ) -> ndarray: ...
     def _validate(
@@ -87,12 +110,12 @@ class _CubicSplineKernel(_BaseSPHKernel):
     min_valid_size: float
     size_in_fwhm: float
 
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
     def _kernel_integral(
         self,
-        dij: U.Quantity[U.pix],
-        h: U.Quantity[U.pix],
+        dij: ndarray,
+        h: ndarray,
         mask: ndarray | EllipsisType | slice = ...,
     ) -> ndarray: ...
     def _validate(
@@ -110,8 +133,8 @@ class _GaussianKernel(_BaseSPHKernel):
     def kernel(self, q: ndarray) -> ndarray: ...
     def _kernel_integral(
         self,
-        dij: U.Quantity[U.pix],
-        h: U.Quantity[U.pix],
+        dij: ndarray,
+        h: ndarray,
         mask: ndarray | EllipsisType | slice = ...,
     ) -> ndarray: ...
     def _validate(
@@ -124,10 +147,11 @@ class DiracDeltaKernel(_BaseSPHKernel):
 
     def __init__(self, size_in_fwhm: float = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
+    def _point_like(self) -> ndarray: ...
     def _kernel_integral(
         self,
-        dij: U.Quantity[U.pix],
-        h: U.Quantity[U.pix],
+        dij: ndarray,
+        h: ndarray,
         mask: ndarray | EllipsisType | slice = ...,
     ) -> ndarray: ...
     def _validate(
@@ -137,8 +161,12 @@ class DiracDeltaKernel(_BaseSPHKernel):
 class _AdaptiveKernel(_BaseSPHKernel):
     kernels: T.Tuple[_BaseSPHKernel]
     size_in_fwhm: T.Optional[T.Tuple[float]]
+    presort: bool
+    _kernel_starts: T.Optional[ndarray]
 
-    def __init__(self, kernels: T.Tuple[_BaseSPHKernel]) -> None: ...
+    def __init__(
+        self, kernels: T.Tuple[_BaseSPHKernel], presort: bool = ...
+    ) -> None: ...
 
     kernel_indices: ndarray
 
@@ -146,14 +174,16 @@ class _AdaptiveKernel(_BaseSPHKernel):
         self, source: T.Optional[SPHSource] = ..., datacube: T.Optional[DataCube] = ...
     ) -> None: ...
     def _apply_mask(self, mask: ndarray) -> None: ...
+    def _particle_order(self) -> T.Optional[ndarray]: ...
+    def _point_like(self) -> ndarray: ...
     def eval_kernel(
         self, r: ndarray | U.Quantity[U.arcsec], h: ndarray | U.Quantity[U.arcsec]
     ) -> U.Quantity | ndarray | float: ...
     def kernel(self, q: ndarray) -> ndarray: ...
     def _kernel_integral(
         self,
-        dij: U.Quantity[U.pix],
-        h: U.Quantity[U.pix],
+        dij: ndarray,
+        h: ndarray,
         mask: ndarray | EllipsisType | slice = ...,
     ) -> ndarray: ...
     def _validate(
@@ -164,12 +194,12 @@ class _QuarticSplineKernel(_BaseSPHKernel):
     min_valid_size: float
     size_in_fwhm: float
 
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
     def _kernel_integral(
         self,
-        dij: U.Quantity[U.pix],
-        h: U.Quantity[U.pix],
+        dij: ndarray,
+        h: ndarray,
         mask: ndarray | EllipsisType | slice = ...,
     ) -> ndarray: ...
     def _validate(
@@ -177,23 +207,23 @@ class _QuarticSplineKernel(_BaseSPHKernel):
     ) -> ndarray: ...
 
 class WendlandC2Kernel(_AdaptiveKernel):
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ..., presort: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
 
 class WendlandC6Kernel(_AdaptiveKernel):
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ..., presort: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
 
 class CubicSplineKernel(_AdaptiveKernel):
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ..., presort: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
 
 class GaussianKernel(_AdaptiveKernel):
-    def __init__(self, truncate: float = ...) -> None: ...
+    def __init__(self, truncate: float = ..., presort: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
 
 class QuarticSplineKernel(_AdaptiveKernel):
-    def __init__(self) -> None: ...
+    def __init__(self, tabulate: bool = ..., presort: bool = ...) -> None: ...
     def kernel(self, q: ndarray) -> ndarray: ...
 
 class AdaptiveKernel(object):
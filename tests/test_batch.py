@@ -0,0 +1,405 @@
+import pytest
+import numpy as np
+from copy import deepcopy
+from martini.martini import Martini
+from martini.batch import orientation_batch, configuration_batch
+from martini.datacube import DataCube
+from martini.beams import GaussianBeam
+from martini.noise import GaussianNoise
+from martini.sph_kernels import _CubicSplineKernel
+from martini.spectral_models import GaussianSpectrum
+from astropy import units as U
+
+rotations = (
+    {"axis_angle": ("x", 30 * U.deg)},
+    {"axis_angle": ("y", 60 * U.deg)},
+    {"rotmat": np.array([[0.0, 1.0, 0.0], [-1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])},
+)
+
+
+def batch_kwargs(source, beam=None, noise=None):
+    """
+    Arguments for a batch of small mock observations of a source.
+
+    Parameters
+    ----------
+    source : ~martini.sources.sph_source.SPHSource
+        The source to observe.
+
+    beam : ~martini.beams._BaseBeam, optional
+        The beam. (Default: ``None``)
+
+    noise : ~martini.noise._BaseNoise, optional
+        The noise module. (Default: ``None``)
+
+    Returns
+    -------
+    out : dict
+        Keyword arguments for :func:`~martini.batch.orientation_batch`.
+    """
+    return dict(
+        datacube=DataCube(
+            n_px_x=16,
+            n_px_y=16,
+            n_channels=16,
+            px_size=30 * U.arcsec,
+            channel_width=4 * U.km / U.s,
+            spectral_centre=source.vsys,
+        ),
+        sph_kernel=_CubicSplineKernel(),
+        spectral_model=GaussianSpectrum(),
+        beam=beam,
+        noise=noise,
+        quiet=True,
+        insert_kwargs=dict(progressbar=False),
+    )
+
+
+class TestOrientationBatch:
+    @pytest.mark.parametrize("with_beam", (False, True))
+    def test_orientations_match_individual(self, many_particle_source, with_beam):
+        """
+        Check that the mock observations of a batch match those made one at a time
+        with a rotated source.
+        """
+        source = many_particle_source()
+        kwargs = batch_kwargs(
+            source,
+            beam=(
+                GaussianBeam(bmaj=60 * U.arcsec, bmin=60 * U.arcsec)
+                if with_beam
+                else None
+            ),
+        )
+        batch = list(orientation_batch(source, rotations, **kwargs))
+        assert len(batch) == len(rotations)
+        for rotation, M_batch in zip(rotations, batch):
+            rotated_source = deepcopy(source)
+            rotated_source.rotate(**rotation)
+            M = Martini(
+                source=rotated_source,
+                datacube=kwargs["datacube"].copy(),
+                beam=deepcopy(kwargs["beam"]),
+                sph_kernel=_CubicSplineKernel(),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+            )
+            M.insert_source_in_cube(progressbar=False)
+            assert M_batch.datacube._array.sum() > 0
+            assert U.allclose(M_batch.datacube._array, M.datacube._array)
+            assert np.allclose(
+                M_batch.source.current_rotation, rotated_source.current_rotation
+            )
+
+    def test_source_unchanged(self, many_particle_source):
+        """
+        Check that the source and datacube given to the batch are not modified.
+        """
+        source = many_particle_source()
+        xyz = source.coordinates_g.get_xyz().copy()
+        npart = source.npart
+        kwargs = batch_kwargs(
+            source, beam=GaussianBeam(bmaj=60 * U.arcsec, bmin=60 * U.arcsec)
+        )
+        crpix = kwargs["datacube"].wcs.wcs.crpix.copy()
+        list(orientation_batch(source, rotations, **kwargs))
+        assert source.npart == npart
+        assert U.allclose(source.coordinates_g.get_xyz(), xyz)
+        assert np.allclose(source.current_rotation, np.eye(3))
+        assert source.skycoords is None
+        assert kwargs["datacube"].padx == 0
+        assert np.allclose(kwargs["datacube"].wcs.wcs.crpix, crpix)
+
+    def test_postprocess(self, many_particle_source):
+        """
+        Check that the result of the postprocess function is yielded.
+        """
+        source = many_particle_source()
+        results = list(
+            orientation_batch(
+                source,
+                rotations,
+                postprocess=lambda M, index: (index, M.datacube._array.sum()),
+                **batch_kwargs(source),
+            )
+        )
+        for index, (result_index, flux) in enumerate(results):
+            assert result_index == index
+            assert flux > 0
+
+    def test_noise(self, many_particle_source):
+        """
+        Check that each mock observation gets a different, reproducible, noise
+        realization.
+        """
+        source = many_particle_source()
+
+        def noise_cubes():
+            """
+            Make a batch with noise and return the noise cubes.
+
+            Returns
+            -------
+            out : list
+                The noise cube of each observation.
+            """
+            kwargs = batch_kwargs(
+                source,
+                beam=GaussianBeam(bmaj=60 * U.arcsec, bmin=60 * U.arcsec),
+                noise=GaussianNoise(rms=1.0e-6 * U.Jy * U.beam**-1, seed=0),
+            )
+            return list(
+                orientation_batch(
+                    source,
+                    rotations,
+                    postprocess=lambda M, index: M._noise_cube(),
+                    **kwargs,
+                )
+            )
+
+        first, second = noise_cubes(), noise_cubes()
+        assert not U.allclose(first[0], first[1])
+        for a, b in zip(first, second):
+            assert U.allclose(a, b)
+
+    def test_parallel(self, many_particle_source):
+        """
+        Check that a batch shared between processes gives the same result as in serial.
+        """
+        pytest.importorskip(
+            "multiprocess", reason="multiprocess (optional dependency) not available."
+        )
+        source = many_particle_source()
+        kwargs = batch_kwargs(source)
+        serial = [
+            M.datacube._array for M in orientation_batch(source, rotations, **kwargs)
+        ]
+        parallel = list(
+            orientation_batch(
+                source,
+                rotations,
+                ncpu=2,
+                postprocess=lambda M, index: M.datacube._array,
+                **kwargs,
+            )
+        )
+        for a, b in zip(serial, parallel):
+            assert U.allclose(a, b)
+
+
+def configurations(source):
+    """
+    Configurations for a batch of small mock observations of a source.
+
+    The second and third configurations share a distance and velocity channels, the
+    others each have their own.
+
+    Parameters
+    ----------
+    source : ~martini.sources.sph_source.SPHSource
+        The source to observe.
+
+    Returns
+    -------
+    out : list
+        List of configurations for :func:`~martini.batch.configuration_batch`.
+    """
+    vsys_far = source.vsys * 2
+
+    def datacube(n_px, px_size, spectral_centre, channel_width=4 * U.km / U.s):
+        """
+        Make a small data cube.
+
+        Parameters
+        ----------
+        n_px : int
+            Number of pixels along each spatial axis.
+
+        px_size : ~astropy.units.Quantity
+            Size of the pixels, with dimensions of angle.
+
+        spectral_centre : ~astropy.units.Quantity
+            Velocity at the centre of the channels.
+
+        channel_width : ~astropy.units.Quantity, optional
+            Width of the channels. (Default: ``4 * U.km / U.s``)
+
+        Returns
+        -------
+        out : ~martini.datacube.DataCube
+            The data cube.
+        """
+        return DataCube(
+            n_px_x=n_px,
+            n_px_y=n_px,
+            n_channels=16,
+            px_size=px_size,
+            channel_width=channel_width,
+            spectral_centre=spectral_centre,
+        )
+
+    return [
+        (None, datacube(16, 30 * U.arcsec, source.vsys), None),
+        (
+            2 * source.distance,
+            datacube(16, 30 * U.arcsec, vsys_far),
+            GaussianBeam(bmaj=60 * U.arcsec, bmin=60 * U.arcsec),
+        ),
+        (2 * source.distance, datacube(8, 15 * U.arcsec, vsys_far), None),
+        (
+            2 * source.distance,
+            datacube(16, 30 * U.arcsec, vsys_far, channel_width=3 * U.km / U.s),
+            None,
+        ),
+    ]
+
+
+class TestConfigurationBatch:
+    @pytest.mark.parametrize("banded", (False, True))
+    def test_configurations_match_individual(self, many_particle_source, banded):
+        """
+        Check that the mock observations of a batch match those made one at a time
+        with the source at each distance.
+        """
+        source = many_particle_source()
+        batch = list(
+            configuration_batch(
+                source,
+                configurations(source),
+                sph_kernel=_CubicSplineKernel(),
+                spectral_model=GaussianSpectrum(sigma="thermal", banded=banded),
+                quiet=True,
+                insert_kwargs=dict(progressbar=False, skip_validation=True),
+            )
+        )
+        assert len(batch) == len(configurations(source))
+        for (distance, datacube, beam), M_batch in zip(configurations(source), batch):
+            M = Martini(
+                source=many_particle_source(
+                    distance=source.distance if distance is None else distance
+                ),
+                datacube=datacube,
+                beam=beam,
+                sph_kernel=_CubicSplineKernel(),
+                spectral_model=GaussianSpectrum(sigma="thermal", banded=banded),
+                quiet=True,
+            )
+            M.insert_source_in_cube(progressbar=False, skip_validation=True)
+            assert M_batch.source.npart == M.source.npart
+            assert M_batch.datacube._array.sum() > 0
+            assert U.allclose(M_batch.datacube._array, M.datacube._array)
+
+    def test_spectra_shared(self, many_particle_source, monkeypatch):
+        """
+        Check that spectra are evaluated once for configurations with the same
+        distance and channels.
+        """
+        source = many_particle_source()
+        calls = []
+        init_spectra = GaussianSpectrum.init_spectra
+
+        def counting_init_spectra(self, source, datacube):
+            """
+            Count calls and evaluate the spectra.
+
+            Parameters
+            ----------
+            source : ~martini.sources.sph_source.SPHSource
+                The source.
+
+            datacube : ~martini.datacube.DataCube
+                The data cube.
+            """
+            calls.append(source.npart)
+            init_spectra(self, source, datacube)
+
+        monkeypatch.setattr(GaussianSpectrum, "init_spectra", counting_init_spectra)
+        list(
+            configuration_batch(
+                source,
+                configurations(source),
+                sph_kernel=_CubicSplineKernel(),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+                insert_kwargs=dict(progressbar=False, skip_validation=True),
+            )
+        )
+        # once for each of the two single configurations, once for the shared pair
+        assert len(calls) == 3
+
+    def test_single_precision(self, many_particle_source):
+        """
+        Check that the shared spectra of a batch of single precision data cubes are
+        in single precision.
+        """
+        source = many_particle_source()
+        single_configurations = configurations(source)
+        for _, datacube, _ in single_configurations:
+            datacube._set_dtype(np.float32)
+        for M in configuration_batch(
+            source,
+            single_configurations,
+            sph_kernel=_CubicSplineKernel(),
+            spectral_model=GaussianSpectrum(),
+            quiet=True,
+            insert_kwargs=dict(progressbar=False, skip_validation=True),
+        ):
+            assert M.dtype == np.float32
+            assert M.spectral_model.spectra.dtype == np.float32
+            assert M.datacube._array.dtype == np.float32
+
+    def test_source_unchanged(self, many_particle_source):
+        """
+        Check that the source and data cubes given to the batch are not modified.
+        """
+        source = many_particle_source()
+        distance, vsys = source.distance, source.vsys
+        batch_configurations = configurations(source)
+        crpixs = [dc.wcs.wcs.crpix.copy() for _, dc, _ in batch_configurations]
+        list(
+            configuration_batch(
+                source,
+                batch_configurations,
+                sph_kernel=_CubicSplineKernel(),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+                insert_kwargs=dict(progressbar=False, skip_validation=True),
+            )
+        )
+        assert source.npart == 100
+        assert source.distance == distance
+        assert source.vsys == vsys
+        assert source.skycoords is None
+        for (_, datacube, _), crpix in zip(batch_configurations, crpixs):
+            assert datacube.padx == 0
+            assert np.allclose(datacube.wcs.wcs.crpix, crpix)
+
+    def test_parallel(self, many_particle_source):
+        """
+        Check that a batch shared between processes gives the same result as in serial.
+        """
+        pytest.importorskip(
+            "multiprocess", reason="multiprocess (optional dependency) not available."
+        )
+        source = many_particle_source()
+        kwargs = dict(
+            sph_kernel=_CubicSplineKernel(),
+            spectral_model=GaussianSpectrum(),
+            quiet=True,
+            insert_kwargs=dict(progressbar=False, skip_validation=True),
+        )
+        serial = [
+            M.datacube._array
+            for M in configuration_batch(source, configurations(source), **kwargs)
+        ]
+        parallel = list(
+            configuration_batch(
+                source,
+                configurations(source),
+                ncpu=2,
+                postprocess=lambda M, index: M.datacube._array,
+                **kwargs,
+            )
+        )
+        for a, b in zip(serial, parallel):
+            assert U.allclose(a, b)
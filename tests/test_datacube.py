@@ -1,7 +1,9 @@
+import mmap
 import pytest
 import os
 import numpy as np
 from astropy import wcs
+from astropy.coordinates import FK5
 from astropy import units as U
 from martini import DataCube
 from martini.datacube import HIfreq
@@ -191,6 +193,8 @@ class TestDataCube:
             "n_channels",
             "padx",
             "pady",
+            "stokes_axis",
+            "specsys",
         ):
             assert getattr(dc_random, attr) == getattr(copy, attr)
         for attr in (
@@ -215,6 +219,159 @@ class TestDataCube:
             else:
                 assert getattr(copy, attr) is None
         check_wcs_match(dc_random.wcs, copy.wcs)
+        # changing the WCS of the copy leaves the original unchanged
+        crpix = dc_random.wcs.wcs.crpix.copy()
+        copy.wcs.wcs.crpix = crpix + 2
+        assert np.allclose(dc_random.wcs.wcs.crpix, crpix)
+
+    def test_copy_regression(self):
+        """
+        Check that a copy keeps the Stokes axis, coordinate frame and spectral
+        reference frame, and that padding the copy leaves the original unchanged.
+
+        Copies used to be created with the default values of these and to share the
+        WCS of the original.
+        """
+        dc = DataCube(
+            n_px_x=8,
+            n_px_y=8,
+            n_channels=4,
+            stokes_axis=True,
+            coordinate_frame=FK5(equinox="J2000"),
+            specsys="lsrk",
+        )
+        copy = dc.copy()
+        assert copy.stokes_axis
+        assert copy._array.shape == (8, 8, 4, 1)
+        assert isinstance(copy.coordinate_frame, FK5)
+        assert copy.specsys == "lsrk"
+        assert copy.wcs.wcs.specsys == "lsrk"
+        assert copy.wcs.wcs.radesys == "FK5"
+        assert copy.wcs.naxis == 4
+        assert copy.wcs is not dc.wcs
+        crpix = dc.wcs.wcs.crpix.copy()
+        copy.add_pad((2, 2))
+        assert np.all(dc.wcs.wcs.crpix == crpix)
+        assert np.all(copy.wcs.wcs.crpix == crpix + np.array([2, 2, 0, 0]))
+        assert dc._array.shape == (8, 8, 4, 1)
+
+    @pytest.mark.parametrize("stokes_axis", (False, True))
+    def test_memmap(self, tmp_path, stokes_axis):
+        """
+        Check that a datacube backed by a memory-mapped file stays backed by it when
+        padded, converted to other units and copied.
+        """
+
+        def memmapped(datacube):
+            """
+            Check whether the datacube array is backed by a memory-mapped file.
+
+            Parameters
+            ----------
+            datacube : ~martini.datacube.DataCube
+                The datacube to check.
+
+            Returns
+            -------
+            out : bool
+                ``True`` if the array is a view of a memory-mapped file.
+            """
+            base = datacube._array
+            while isinstance(base, np.ndarray) and base.base is not None:
+                base = base.base
+            return isinstance(base, mmap.mmap)
+
+        dc = DataCube(
+            n_px_x=8,
+            n_px_y=8,
+            n_channels=4,
+            stokes_axis=stokes_axis,
+            memmap_dir=tmp_path,
+        )
+        assert memmapped(dc)
+        assert dc._array.shape == (8, 8, 4) + ((1,) if stokes_axis else ())
+        dc._array[2, 3, 1] = 1 * U.Jy * U.pix**-2
+        dc.add_pad((2, 2))
+        assert memmapped(dc)
+        assert dc._array[4, 5, 1] == 1 * U.Jy * U.pix**-2
+        assert dc._array.sum() == 1 * U.Jy * U.pix**-2
+        dc._to_unit(U.Jy * U.arcsec**-2, equivalencies=[dc.arcsec2_to_pix])
+        assert memmapped(dc)
+        assert U.isclose(dc._array.sum(), 1 * U.Jy / dc.px_size**2)
+        copy = dc.copy()
+        assert memmapped(copy)
+        assert U.allclose(copy._array, dc._array)
+        copy._array[...] = 0
+        assert dc._array.sum() > 0
+        dc.drop_pad()
+        assert memmapped(dc)
+        assert dc._array[2, 3, 1] > 0
+        assert len(list(dc.spectra)) == dc.n_px_x * dc.n_px_y
+        assert all(np.shares_memory(spectrum, dc._array) for spectrum in dc.spectra)
+
+    @pytest.mark.parametrize("stokes_axis", (False, True))
+    @pytest.mark.parametrize("pad", ((2, 3), (0, 2), (3, 0)))
+    def test_pad_memmap(self, tmp_path, stokes_axis, pad):
+        """
+        Check that a memory-mapped datacube is padded in its own file, with the same
+        result as a datacube in memory.
+        """
+        rng = np.random.default_rng(seed=0)
+        kwargs = dict(n_px_x=7, n_px_y=5, n_channels=4, stokes_axis=stokes_axis)
+        dc = DataCube(memmap_dir=tmp_path, **kwargs)
+        dc_memory = DataCube(**kwargs)
+        values = rng.random(dc._array.shape)
+        # leave the last rows empty, they are moved before any non-zero row
+        values[-2:] = 0
+        dc._array[...] = values * dc._array.unit
+        dc_memory._array[...] = values * dc_memory._array.unit
+        memmap_file = dc._memmap[0]
+        dc.add_pad(pad)
+        dc_memory.add_pad(pad)
+        assert dc._memmap[0] is memmap_file
+        assert dc._array.base is dc._memmap[1]
+        assert np.all(dc._array == dc_memory._array)
+        # an empty datacube stays empty
+        dc_empty = DataCube(memmap_dir=tmp_path, **kwargs)
+        dc_empty.add_pad(pad)
+        assert not np.any(dc_empty._array.value)
+
+    def test_serialize_memmap(self, tmp_path):
+        """
+        Check that a memory-mapped datacube can be serialized for parallel execution,
+        and is deserialized in memory.
+        """
+        dill = pytest.importorskip(
+            "dill", reason="dill (optional dependency) not available."
+        )
+        dc = DataCube(n_px_x=8, n_px_y=8, n_channels=4, memmap_dir=tmp_path)
+        dc._array[2, 3, 1] = 1 * U.Jy * U.pix**-2
+        dc.add_pad((2, 2))
+        deserialized = dill.loads(dill.dumps(dc))
+        assert deserialized._memmap is None
+        assert np.all(deserialized._array == dc._array)
+
+    def test_dtype(self, dc_zeros):
+        """
+        Check that a single precision datacube keeps its precision when padded,
+        converted to other units and copied, and that its precision can be changed.
+        """
+        dc = DataCube(n_px_x=8, n_px_y=8, n_channels=4, dtype=np.float32)
+        assert dc._array.dtype == np.float32
+        dc._array[2, 3, 1] = 1 * U.Jy * U.pix**-2
+        dc.add_pad((2, 2))
+        assert dc._array.dtype == np.float32
+        dc._to_unit(U.Jy * U.arcsec**-2, equivalencies=[dc.arcsec2_to_pix])
+        assert dc._array.dtype == np.float32
+        assert dc.copy()._array.dtype == np.float32
+        dc._set_dtype(np.float64)
+        assert dc.dtype == np.float64
+        assert dc._array.dtype == np.float64
+        assert U.isclose(dc._array[4, 5, 1], 1 * U.Jy / dc.px_size**2)
+        assert dc_zeros.dtype == np.float64
+        assert dc_zeros._array.dtype == np.float64
+        with pytest.raises(ValueError, match="dtype must be"):
+            DataCube(dtype=np.float16)
 
     @pytest.mark.parametrize("with_pad", (False, True))
     def test_save_and_load_state(self, dc_random, with_pad):
@@ -259,6 +416,21 @@ class TestDataCube:
         finally:
             os.remove("test_savestate.hdf5")
 
+    def test_load_state_memmap(self, dc_random, tmp_path):
+        """
+        Check that a datacube can be loaded into a memory-mapped file.
+        """
+        pytest.importorskip("h5py", reason="h5py (optional dependency) not available.")
+        dc_random.add_pad((3, 3))
+        filename = tmp_path / "test_savestate.hdf5"
+        dc_random.save_state(filename)
+        loaded = DataCube.load_state(filename, memmap_dir=tmp_path)
+        assert loaded.memmap_dir == tmp_path
+        assert isinstance(loaded._memmap[1], np.memmap)
+        assert np.shares_memory(loaded._array, loaded._memmap[1])
+        assert U.allclose(dc_random._array, loaded._array)
+        assert (loaded.padx, loaded.pady) == (3, 3)
+
     def test_init_with_mixed_spectral_centre_and_channel_width_units(self):
         """
         Check that we can specify channel spacing and central channel in mixed units.
@@ -1,11 +1,28 @@
 import os
+import gc
 import pytest
+import tracemalloc
 import numpy as np
+from itertools import product
 from martini.martini import Martini, GlobalProfile, _BaseMartini
 from martini.datacube import DataCube, HIfreq
 from martini.beams import GaussianBeam
+from martini.noise import GaussianNoise
+from martini._checkpoint import Checkpoint
+from martini._parallel import (
+    pixel_tiles,
+    particle_counts,
+    schedule_tiles,
+    balanced_strips,
+    shared_zeros,
+)
 from test_sph_kernels import simple_kernels
-from martini.sph_kernels import _CubicSplineKernel, _GaussianKernel, DiracDeltaKernel
+from martini.sph_kernels import (
+    _CubicSplineKernel,
+    _GaussianKernel,
+    DiracDeltaKernel,
+    CubicSplineKernel,
+)
 from martini.spectral_models import DiracDeltaSpectrum, GaussianSpectrum
 from astropy import units as U
 from astropy.io import fits
@@ -214,7 +231,16 @@ class TestMartini:
         m.insert_source_in_cube(progressbar=False)
         check_mass_accuracy(m, out_mode)
 
-    def test_convolve_beam(self, single_particle_source):
+    @pytest.mark.parametrize(
+        "convolve_kwargs",
+        (
+            dict(batched=False),
+            dict(batched=True),
+            dict(batched=True, max_batch_bytes=1, workers=2),
+        ),
+    )
+    @pytest.mark.parametrize("stokes_axis", (False, True))
+    def test_convolve_beam(self, single_particle_source, convolve_kwargs, stokes_axis):
         """
         Check that beam convolution gives result matching manual calculation.
         """
@@ -224,6 +250,7 @@ class TestMartini:
             n_px_y=16,
             n_channels=16,
             spectral_centre=source.distance * source.h * 100 * U.km / U.s / U.Mpc,
+            stokes_axis=stokes_axis,
         )
         beam = GaussianBeam()
         noise = None
@@ -253,9 +280,54 @@ class TestMartini:
             U.Jy * U.beam**-1,
             equivalencies=U.beam_angular_area(m.beam.area),
         )
-        m.convolve_beam()
+        m.convolve_beam(**convolve_kwargs)
         assert U.allclose(m.datacube._array, convolved_cube)
 
+    @pytest.mark.parametrize(
+        ("dtype", "rtol"), ((np.float64, 1e-12), (np.float32, 1e-6))
+    )
+    def test_batched_convolution_matches_channelwise(
+        self, many_particle_source, dtype, rtol
+    ):
+        """
+        Check that the batched beam convolution matches the channel-by-channel
+        convolution within round-off (relative to the peak), on a padded cube with a
+        Stokes axis.
+        """
+        source = many_particle_source()
+        cubes = list()
+        for convolve_kwargs in (dict(), dict(batched=True, max_batch_bytes=1)):
+            m = Martini(
+                source=source,
+                datacube=DataCube(
+                    n_px_x=20,
+                    n_px_y=16,
+                    n_channels=12,
+                    channel_width=4 * U.km / U.s,
+                    spectral_centre=source.distance
+                    * source.h
+                    * 100
+                    * U.km
+                    / U.s
+                    / U.Mpc,
+                    stokes_axis=True,
+                    dtype=dtype,
+                ),
+                beam=GaussianBeam(bmaj=30 * U.arcsec, bmin=20 * U.arcsec),
+                noise=None,
+                sph_kernel=CubicSplineKernel(),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+            )
+            assert m.datacube.padx > 0 and m.datacube.pady > 0
+            m.insert_source_in_cube(progressbar=False)
+            m.convolve_beam(**convolve_kwargs)
+            cubes.append(m.datacube._array)
+        channelwise, batched = cubes
+        assert batched.dtype == dtype
+        assert channelwise.max() > 0
+        assert U.allclose(batched, channelwise, rtol=0, atol=rtol * channelwise.max())
+
     def test_add_noise(self, m_init):
         """
         Check that noise provided goes into the datacube when we call add_noise.
@@ -629,16 +701,78 @@ class TestMartini:
             if os.path.exists(filename):
                 os.remove(filename)
 
+    def test_hdf5_separable_coordinates(self, m):
+        """
+        Check that separable coordinate arrays match the full 3D coordinate grids.
+        """
+        h5py = pytest.importorskip(
+            "h5py", reason="h5py (optional dependency) not available."
+        )
+        filename, separable_filename = "cube.hdf5", "separable_cube.hdf5"
+        try:
+            m.write_hdf5(filename, channel_block=3)
+            m.write_hdf5(separable_filename, separable_coordinates=True)
+            with h5py.File(filename, "r") as f, h5py.File(separable_filename, "r") as g:
+                for suffix in ("", "_vertices"):
+                    assert g["RA" + suffix].ndim == g["Dec" + suffix].ndim == 2
+                    channel_name = "channel_" + ("vertices" if suffix else "mids")
+                    assert g[channel_name].ndim == 1
+                    for name in ("RA" + suffix, "Dec" + suffix):
+                        assert g[name].attrs["Unit"] == f[name].attrs["Unit"]
+                        assert np.allclose(
+                            f[name][()], g[name][()][..., np.newaxis], rtol=0, atol=0
+                        )
+                    assert np.allclose(
+                        f[channel_name][()],
+                        g[channel_name][()][np.newaxis, np.newaxis],
+                        rtol=0,
+                        atol=0,
+                    )
+                assert np.all(f["FluxCube"][()] == g["FluxCube"][()])
+        finally:
+            for fn in (filename, separable_filename):
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+    def test_hdf5_compression(self, m):
+        """
+        Check that chunked, compressed output holds the same data.
+        """
+        pytest.importorskip("h5py", reason="h5py (optional dependency) not available.")
+        f = m.write_hdf5("cube.hdf5", memmap=True)
+        g = m.write_hdf5(
+            "compressed_cube.hdf5",
+            memmap=True,
+            chunks=(4, 4, 4),
+            compression="gzip",
+            compression_opts=4,
+        )
+        try:
+            for name in ("FluxCube", "RA", "Dec", "channel_mids"):
+                assert g[name].chunks == (4, 4, 4)
+                assert g[name].compression == "gzip"
+                assert f[name].compression is None
+                assert np.all(f[name][()] == g[name][()])
+            assert set(g["FluxCube"].attrs) == set(f["FluxCube"].attrs)
+        finally:
+            f.close()
+            g.close()
+
 
 class TestParallel:
-    def test_parallel_consistent_with_serial(self, many_particle_source, dc_zeros):
+    @pytest.mark.parametrize("backend", ("process", "shared_memory", "thread"))
+    def test_parallel_consistent_with_serial(
+        self, many_particle_source, dc_zeros, backend
+    ):
         """
         Check that running the source insertion loop in parallel gives the same result
         as running in serial.
         """
-        pytest.importorskip(
-            "multiprocess", reason="multiprocess (optional dependency) not available"
-        )
+        if backend != "thread":
+            pytest.importorskip(
+                "multiprocess",
+                reason="multiprocess (optional dependency) not available",
+            )
 
         m = Martini(
             source=many_particle_source(),
@@ -663,10 +797,1066 @@ class TestParallel:
             0.0,
         )
 
-        m.insert_source_in_cube(ncpu=2, progressbar=False)
+        m.insert_source_in_cube(ncpu=2, progressbar=False, backend=backend)
+
+        assert U.allclose(m.datacube._array, expected_result)
+
+    @pytest.mark.parametrize("memmap", (False, True))
+    def test_shared_memory_peak_memory(self, many_particle_source, tmp_path, memmap):
+        """
+        Check that the shared memory backend makes no copy of the datacube array in
+        this process, and gives the same result as in serial.
+        """
+        pytest.importorskip(
+            "multiprocess",
+            reason="multiprocess (optional dependency) not available",
+        )
+        m = Martini(
+            source=many_particle_source(),
+            datacube=DataCube(
+                n_px_x=32,
+                n_px_y=32,
+                n_channels=256,
+                spectral_centre=3 * 70 * U.km / U.s,
+                channel_width=1 * U.km / U.s,
+                memmap_dir=tmp_path if memmap else None,
+            ),
+            beam=None,
+            noise=None,
+            sph_kernel=_GaussianKernel(),
+            spectral_model=GaussianSpectrum(),
+            quiet=True,
+        )
+        m.insert_source_in_cube(skip_validation=True, progressbar=False)
+        expected_result = m.datacube._array.copy()
+        assert expected_result.sum() > 0
+        m.reset()
+        # a first parallel run, so that imports are not counted below
+        m.insert_source_in_cube(
+            ncpu=2, backend="shared_memory", skip_validation=True, progressbar=False
+        )
+        m.reset()
+        nbytes = m.datacube._array.nbytes
+        tracemalloc.start()
+        try:
+            m.insert_source_in_cube(
+                ncpu=2,
+                backend="shared_memory",
+                skip_validation=True,
+                progressbar=False,
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < nbytes / 4
+        assert U.allclose(m.datacube._array, expected_result)
+
+    def test_shared_zeros(self):
+        """
+        Check that the shared memory block stays open while its array is in use, also
+        after being unlinked, and is closed once the array is released.
+        """
+        pytest.importorskip(
+            "multiprocess",
+            reason="multiprocess (optional dependency) not available",
+        )
+        shm, array = shared_zeros((4, 4, 8), np.float32)
+        shm.unlink()
+        quantity = array[1:] << U.Jy
+        del array
+        gc.collect()
+        assert shm.buf is not None
+        quantity += 1 * U.Jy
+        assert np.all(quantity.value == 1)
+        del quantity
+        gc.collect()
+        assert shm.buf is None
+
+    def test_pixel_tiles(self, m_init):
+        """
+        Check that the pixel tiles cover every pixel exactly once.
+        """
+        tiles = pixel_tiles(*m_init.datacube._array.shape[:2], tile_size=7)
+        pixels = [ij_px for tile in tiles for ij_px in tile]
+        assert len(pixels) == len(set(pixels))
+        assert set(pixels) == set(
+            product(
+                np.arange(m_init.datacube._array.shape[0]),
+                np.arange(m_init.datacube._array.shape[1]),
+            )
+        )
+
+    def test_particle_counts(self, many_particle_source, dc_zeros):
+        """
+        Check that the number of particles overlapping each pixel matches the spatial
+        index.
+        """
+        m = Martini(
+            source=many_particle_source(hsm_g=np.logspace(-2, 0.5, 100) * U.kpc),
+            datacube=dc_zeros,
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=CubicSplineKernel(),
+            spectral_model=GaussianSpectrum(),
+        )
+        n_px_x, n_px_y = m.datacube._array.shape[:2]
+        counts = particle_counts(m._pixcoords[:2], m._sm_ranges, n_px_x, n_px_y)
+        assert counts.shape == (n_px_x, n_px_y)
+        assert counts.sum() > 0
+        for ij_px in product(np.arange(n_px_x), np.arange(n_px_y)):
+            assert counts[ij_px] == m.spatial_index.query(ij_px).size
+
+    def test_schedule_tiles(self, m_init):
+        """
+        Check that the scheduled tiles cover every pixel and that the most expensive
+        tile, with the most overlapping particles, comes first.
+        """
+        n_px_x, n_px_y = m_init.datacube._array.shape[:2]
+        tiles = schedule_tiles(
+            m_init._pixcoords[:2],
+            m_init._sm_ranges,
+            n_px_x,
+            n_px_y,
+            tile_size=4,
+            pixel_cost=0,
+        )
+        assert sorted(ij_px for tile in tiles for ij_px in tile) == list(
+            product(range(n_px_x), range(n_px_y))
+        )
+        counts = particle_counts(
+            m_init._pixcoords[:2], m_init._sm_ranges, n_px_x, n_px_y
+        )
+        tile_counts = [counts[tuple(np.array(tile).T)].sum() for tile in tiles]
+        assert tile_counts[0] == max(tile_counts)
+        assert tile_counts[0] > 0
 
+    def test_threaded_particle_engine(self, many_particle_source, dc_zeros):
+        """
+        Check that the loop over particles split between threads gives the same result
+        as running in serial.
+        """
+        m = Martini(
+            source=many_particle_source(),
+            datacube=dc_zeros,
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=CubicSplineKernel(),
+            spectral_model=GaussianSpectrum(),
+        )
+        m.insert_source_in_cube(engine="particle", progressbar=False)
+        expected_result = m.datacube._array
+        assert expected_result.sum() > 0
+        m.reset()
+        m.insert_source_in_cube(
+            engine="particle", ncpu=3, backend="thread", progressbar=False
+        )
         assert U.allclose(m.datacube._array, expected_result)
 
+    def test_balanced_strips(self, m_init):
+        """
+        Check that the strips of rows cover every row exactly once.
+        """
+        n_px_x, n_px_y = m_init.datacube._array.shape[:2]
+        strips = balanced_strips(
+            m_init._pixcoords[:2], m_init._sm_ranges, n_px_x, n_px_y, n_strips=5
+        )
+        assert 1 < len(strips) <= 5
+        rows = np.concatenate([np.arange(first, last) for first, last in strips])
+        assert np.all(np.sort(rows) == np.arange(n_px_x))
+
+    def test_invalid_backend(self, m_init):
+        """
+        Check that an unknown parallel backend raises.
+        """
+        with pytest.raises(ValueError, match="backend must be one of"):
+            m_init.insert_source_in_cube(backend="mpi")
+
+
+class TestInsertionEngines:
+    @pytest.mark.parametrize("sph_kernel", (_GaussianKernel, CubicSplineKernel))
+    def test_particle_engine_consistent_with_pixel_engine(
+        self, many_particle_source, dc_zeros, sph_kernel
+    ):
+        """
+        Check that inserting the source by looping over particles gives the same result
+        as looping over pixels.
+        """
+        m = Martini(
+            source=many_particle_source(
+                # spread of sizes exercises adaptive kernel fallbacks
+                hsm_g=np.logspace(-2, 0.3, 100)
+                * U.kpc,
+            ),
+            datacube=dc_zeros,
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=sph_kernel(),
+            spectral_model=GaussianSpectrum(),
+        )
+
+        # non-adaptive kernels fail validation for the smallest particles
+        m.insert_source_in_cube(engine="pixel", skip_validation=True, progressbar=False)
+        expected_result = m.datacube._array
+
+        # check that we're not testing on a zero array
+        assert m.datacube._array.sum() > 0
+
+        m.reset()
+        m.insert_source_in_cube(
+            engine="particle", skip_validation=True, progressbar=False
+        )
+
+        assert U.allclose(m.datacube._array, expected_result)
+
+    @pytest.mark.parametrize("engine", ("pixel", "particle"))
+    @pytest.mark.parametrize(
+        "SpectralModel, kwargs",
+        (
+            # narrow enough that the band is narrower than the cube:
+            (GaussianSpectrum, dict(sigma=2 * U.km / U.s)),
+            (DiracDeltaSpectrum, dict()),
+        ),
+    )
+    def test_banded_spectra_consistent_with_dense(
+        self, many_particle_source, dc_zeros, engine, SpectralModel, kwargs
+    ):
+        """
+        Check that inserting banded spectra gives the same result as full spectra.
+        """
+        m = Martini(
+            source=many_particle_source(),
+            datacube=dc_zeros,
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=_GaussianKernel(),
+            spectral_model=SpectralModel(**kwargs),
+        )
+        m.insert_source_in_cube(engine=engine, progressbar=False)
+        expected_result = m.datacube._array
+        assert expected_result.sum() > 0
+        m.reset()
+        m.spectral_model = SpectralModel(banded=True, **kwargs)
+        m.spectral_model.init_spectra(m.source, m.datacube)
+        assert m.spectral_model.spectra_offsets is not None
+        m.insert_source_in_cube(engine=engine, progressbar=False)
+        assert U.allclose(
+            m.datacube._array, expected_result, atol=1.0e-8 * expected_result.max()
+        )
+
+    def test_particle_engine_small_blocks(self, m_init):
+        """
+        Check that splitting the particles into many blocks doesn't change the result.
+        """
+        m_init.insert_source_in_cube(engine="particle", progressbar=False)
+        expected_result = m_init.datacube._array
+        m_init.reset()
+        m_init._scatter_particle_spectra(progressbar=False, max_block_elements=1)
+        m_init._datacube._array = m_init._datacube._array.to(
+            U.Jy / U.arcsec**2, equivalencies=[m_init._datacube.arcsec2_to_pix]
+        )
+        assert U.allclose(m_init.datacube._array, expected_result)
+
+    def test_invalid_engine(self, m_init):
+        """
+        Check that we get an error for an unknown engine or unsupported ncpu.
+        """
+        with pytest.raises(ValueError, match="engine must be one of"):
+            m_init.insert_source_in_cube(engine="voxel")
+        with pytest.raises(ValueError, match="supports ncpu > 1 only with 'thread'"):
+            m_init.insert_source_in_cube(engine="particle", ncpu=2)
+
+
+class TestMergeParticles:
+    @pytest.mark.parametrize("sph_kernel", (DiracDeltaKernel, CubicSplineKernel))
+    def test_merge_point_like_particles(
+        self, many_particle_source, dc_zeros, sph_kernel
+    ):
+        """
+        Check that merging point-like particles reduces the particle count, conserves
+        the mass and the flux in each pixel, and barely changes the datacube.
+        """
+        np.random.seed(0)
+        source_kwargs = dict(
+            # concentrated in a few pixels, much smaller than a pixel
+            xyz_g=(np.random.rand(300).reshape((100, 3)) - 0.5) * 1 * U.kpc,
+            vxyz_g=(np.random.rand(300).reshape((100, 3)) - 0.5) * 10 * U.km / U.s,
+            hsm_g=np.ones(100) * 0.01 * U.kpc,
+        )
+        martinis = [
+            Martini(
+                source=many_particle_source(**source_kwargs),
+                datacube=dc_zeros.copy(),
+                sph_kernel=sph_kernel(),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+                merge_tolerance=merge_tolerance,
+            )
+            for merge_tolerance in (None, 2 * U.km / U.s)
+        ]
+        assert martinis[1].source.npart < martinis[0].source.npart
+        assert U.isclose(martinis[1].source.mHI_g.sum(), martinis[0].source.mHI_g.sum())
+        arrays = list()
+        for m in martinis:
+            m.insert_source_in_cube(progressbar=False)
+            arrays.append(m.datacube._array)
+        assert arrays[0].sum() > 0
+        spectral_axis = 2
+        assert U.allclose(
+            arrays[1].sum(axis=spectral_axis), arrays[0].sum(axis=spectral_axis)
+        )
+        assert U.allclose(arrays[1], arrays[0], atol=0.05 * arrays[0].max())
+
+    def test_no_point_like_particles(self, many_particle_source, dc_zeros):
+        """
+        Check that particles that are not point-like are not merged.
+        """
+        m = Martini(
+            source=many_particle_source(),
+            datacube=dc_zeros,
+            sph_kernel=CubicSplineKernel(),
+            spectral_model=GaussianSpectrum(),
+            quiet=True,
+        )
+        npart = m.source.npart
+        m._merge_point_like_particles(1000 * U.km / U.s)
+        assert m.source.npart == npart
+
+    def test_invalid_merge_tolerance(self, m_init):
+        """
+        Check that a merging tolerance that is not positive is rejected.
+        """
+        with pytest.raises(ValueError, match="merge_tolerance must be positive."):
+            m_init._merge_point_like_particles(0 * U.km / U.s)
+
+
+class TestFastProjection:
+    @pytest.mark.parametrize("with_beam", (False, True))
+    def test_fast_projection_consistent(
+        self, many_particle_source, dc_zeros, with_beam
+    ):
+        """
+        Check that calculating the particle coordinates with numpy gives the same data
+        cube as calculating them with astropy.
+        """
+        # fixed positions, so that the test does not depend on the random defaults
+        rng = np.random.default_rng(seed=0)
+        xyz_g = (rng.random((100, 3)) - 0.5) * 10 * U.kpc
+        vxyz_g = (rng.random((100, 3)) - 0.5) * 40 * U.km * U.s**-1
+        martinis = [
+            Martini(
+                source=many_particle_source(xyz_g=xyz_g, vxyz_g=vxyz_g),
+                datacube=dc_zeros.copy(),
+                beam=(
+                    GaussianBeam(bmaj=30 * U.arcsec, bmin=30 * U.arcsec)
+                    if with_beam
+                    else None
+                ),
+                sph_kernel=CubicSplineKernel(),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+                fast_projection=fast_projection,
+            )
+            for fast_projection in (False, True)
+        ]
+        assert not martinis[0]._fast_projection
+        assert martinis[1]._fast_projection
+        assert U.allclose(
+            martinis[1].source.pixcoords,
+            martinis[0].source.pixcoords,
+            atol=1e-6 * U.pix,
+        )
+        for m in martinis:
+            m.insert_source_in_cube(progressbar=False)
+        expected = martinis[0].datacube._array
+        assert expected.sum() > 0
+        # relative to the brightest pixel, faint pixels can differ more in relative terms
+        assert U.allclose(
+            martinis[1].datacube._array, expected, rtol=0, atol=1e-6 * expected.max()
+        )
+
+    def test_unsupported_datacube(self, many_particle_source):
+        """
+        Check that astropy is used for a data cube not supported by the fast
+        calculation.
+        """
+        source = many_particle_source()
+        m = Martini(
+            source=source,
+            datacube=DataCube(
+                n_px_x=16, n_px_y=16, spectral_centre=source.vsys, specsys="lsrk"
+            ),
+            sph_kernel=CubicSplineKernel(),
+            spectral_model=GaussianSpectrum(),
+            quiet=True,
+            fast_projection=True,
+        )
+        assert not m._fast_projection
+        assert m.source.spectralcoords is not None
+
+    @pytest.mark.parametrize("direct", (False, True))
+    def test_global_profile(self, many_particle_source, direct):
+        """
+        Check that calculating the particle coordinates with numpy gives the same
+        spectrum for a global profile.
+        """
+        rng = np.random.default_rng(seed=0)
+        xyz_g = (rng.random((100, 3)) - 0.5) * 10 * U.kpc
+        vxyz_g = (rng.random((100, 3)) - 0.5) * 40 * U.km * U.s**-1
+        spectra = [
+            GlobalProfile(
+                source=many_particle_source(xyz_g=xyz_g, vxyz_g=vxyz_g),
+                spectral_model=GaussianSpectrum(),
+                n_channels=32,
+                spectral_centre=3 * 70 * U.km / U.s,
+                quiet=True,
+                direct=direct,
+                fast_projection=fast_projection,
+            ).spectrum
+            for fast_projection in (False, True)
+        ]
+        assert spectra[0].sum() > 0
+        assert U.allclose(spectra[1], spectra[0], rtol=0, atol=1e-6 * spectra[0].max())
+
+
+class TestSpatialIndex:
+    @pytest.mark.parametrize("sph_kernel", (_GaussianKernel, CubicSplineKernel))
+    def test_query_matches_brute_force(
+        self, many_particle_source, dc_zeros, sph_kernel
+    ):
+        """
+        Check that the particles found for each pixel by the spatial index are exactly
+        those found by checking every particle.
+        """
+        m = Martini(
+            source=many_particle_source(hsm_g=np.logspace(-2, 0.5, 100) * U.kpc),
+            datacube=dc_zeros,
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=sph_kernel(),
+            spectral_model=GaussianSpectrum(),
+        )
+        assert m.source.npart > 0
+        for ij_px in product(
+            np.arange(m.datacube._array.shape[0]),
+            np.arange(m.datacube._array.shape[1]),
+        ):
+            ij = np.array(ij_px)[..., np.newaxis] * U.pix
+            expected = np.flatnonzero(
+                (np.abs(ij - m.source.pixcoords[:2]) <= m.sph_kernel.sm_ranges).all(
+                    axis=0
+                )
+            )
+            assert np.all(m.spatial_index.query(ij_px) == expected)
+
+    def test_unbounded_footprints(self, gp):
+        """
+        Check that particles with unbounded footprints are found for any pixel.
+        """
+        assert np.all(gp.spatial_index.query((0, 0)) == np.arange(gp.source.npart))
+        assert np.all(gp.spatial_index.query((5, -3)) == np.arange(gp.source.npart))
+
+
+class TestUnitlessArrays:
+    def test_cached_arrays(self, m_init):
+        """
+        Check that the cached plain arrays hold the particle properties in canonical
+        units, sharing memory with the originals where possible.
+        """
+        assert not isinstance(m_init._pixcoords, U.Quantity)
+        assert np.all(m_init._pixcoords == m_init.source.pixcoords.to_value(U.pix))
+        assert np.shares_memory(m_init._pixcoords, m_init.source.pixcoords)
+        assert np.all(
+            m_init._sm_lengths == m_init.sph_kernel.sm_lengths.to_value(U.pix)
+        )
+        assert np.all(m_init._sm_ranges == m_init.sph_kernel.sm_ranges.to_value(U.pix))
+        assert np.all(m_init._spectra == m_init.spectral_model.spectra.to_value(U.Jy))
+        assert np.shares_memory(m_init._spectra, m_init.spectral_model.spectra)
+
+    def test_cached_arrays_follow_changes(self, m_init):
+        """
+        Check that the cached plain arrays are rebuilt when the arrays they are derived
+        from are replaced.
+        """
+        spectra = m_init._spectra
+        assert m_init._spectra is spectra
+        m_init.spectral_model.init_spectra(m_init.source, m_init.datacube)
+        assert m_init._spectra is not spectra
+        assert np.shares_memory(m_init._spectra, m_init.spectral_model.spectra)
+        m_init.source.pixcoords = m_init.source.pixcoords + 1 * U.pix
+        assert np.all(m_init._pixcoords == m_init.source.pixcoords.to_value(U.pix))
+        m_init.sph_kernel.sm_lengths = 2 * m_init.sph_kernel.sm_lengths
+        assert np.all(
+            m_init._sm_lengths == m_init.sph_kernel.sm_lengths.to_value(U.pix)
+        )
+        m_init.dtype = np.float32
+        assert m_init._spectra.dtype == np.float32
+
+    def test_pixel_spectrum_units(self, m_init):
+        """
+        Check that pixel spectra are evaluated without units and that units are
+        attached on insertion into the datacube.
+        """
+        ij_px = tuple(np.array(m_init.datacube._array.shape[:2]) // 2)
+        ((insertion_slice, spectrum),) = m_init._evaluate_pixel_spectrum(
+            (0, [ij_px]), progressbar=False
+        )
+        assert not isinstance(spectrum, U.Quantity)
+        assert spectrum.sum() > 0
+        m_init._insert_pixel(insertion_slice, spectrum)
+        assert U.allclose(
+            m_init.datacube._array[insertion_slice], spectrum * U.Jy * U.pix**-2
+        )
+
+
+class TestStreaming:
+    @pytest.mark.parametrize("engine", ("pixel", "particle"))
+    @pytest.mark.parametrize("banded", (False, True))
+    def test_stream_consistent_with_write_fits(
+        self, many_particle_source, dc_zeros, engine, banded
+    ):
+        """
+        Check that streaming blocks of channels to a FITS file gives the same result as
+        the usual insertion, convolution and output of the whole cube.
+        """
+        m = Martini(
+            source=many_particle_source(),
+            datacube=dc_zeros,
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=_GaussianKernel(),
+            spectral_model=GaussianSpectrum(banded=banded),
+        )
+        filename = "cube.fits"
+        streamed_filename = "streamed_cube.fits"
+        try:
+            # a block size that does not divide the number of channels
+            m.stream_to_fits(
+                streamed_filename,
+                channel_block=5,
+                add_noise=False,
+                engine=engine,
+                skip_validation=True,
+                progressbar=False,
+            )
+            # the datacube of the instance is left untouched
+            assert np.all(m.datacube._array == 0)
+            m.insert_source_in_cube(
+                engine=engine, skip_validation=True, progressbar=False
+            )
+            m.convolve_beam()
+            m.write_fits(filename)
+            with fits.open(filename) as f, fits.open(streamed_filename) as g:
+                assert f[0].data.sum() > 0
+                assert f[0].data.shape == g[0].data.shape
+                assert np.allclose(
+                    g[0].data, f[0].data, rtol=1e-8, atol=1e-12 * f[0].data.max()
+                )
+                for key in ("BUNIT", "CRPIX1", "CRPIX2", "CRPIX3", "NAXIS"):
+                    assert g[0].header[key] == f[0].header[key]
+                for key in ("DATAMAX", "DATAMIN"):
+                    assert np.isclose(g[0].header[key], f[0].header[key])
+        finally:
+            for fn in (filename, streamed_filename):
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+    def test_stream_consistent_with_write_hdf5(self, many_particle_source, dc_zeros):
+        """
+        Check that streaming blocks of channels to a HDF5 file gives the same result as
+        the usual insertion, convolution and output of the whole cube.
+        """
+        h5py = pytest.importorskip(
+            "h5py", reason="h5py (optional dependency) not available."
+        )
+        m = Martini(
+            source=many_particle_source(),
+            datacube=dc_zeros,
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=_GaussianKernel(),
+            spectral_model=GaussianSpectrum(),
+        )
+        filename = "cube.hdf5"
+        streamed_filename = "streamed_cube.hdf5"
+        try:
+            m.stream_to_hdf5(
+                streamed_filename,
+                channel_block=5,
+                add_noise=False,
+                skip_validation=True,
+                progressbar=False,
+                compression="gzip",
+            )
+            assert np.all(m.datacube._array == 0)
+            m.insert_source_in_cube(skip_validation=True, progressbar=False)
+            m.convolve_beam()
+            m.write_hdf5(filename)
+            with h5py.File(filename, "r") as f, h5py.File(streamed_filename, "r") as g:
+                assert f["FluxCube"][()].sum() > 0
+                assert g["FluxCube"].compression == "gzip"
+                assert np.allclose(
+                    g["FluxCube"][()],
+                    f["FluxCube"][()],
+                    rtol=1e-8,
+                    atol=1e-12 * f["FluxCube"][()].max(),
+                )
+                for name in ("RA", "Dec", "channel_mids", "RA_vertices", "Beam"):
+                    assert np.allclose(g[name][()], f[name][()])
+                for key, value in f["FluxCube"].attrs.items():
+                    if key != "DateCreated":
+                        assert g["FluxCube"].attrs[key] == value
+        finally:
+            for fn in (filename, streamed_filename):
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+    def test_stream_noise(self, m_init):
+        """
+        Check that noise is added when streaming, with the requested rms.
+        """
+        filename = "streamed_cube.fits"
+        try:
+            m_init.stream_to_fits(
+                filename, channel_block=4, add_noise=False, progressbar=False
+            )
+            with fits.open(filename) as f:
+                noiseless = f[0].data
+            m_init.stream_to_fits(filename, channel_block=4, progressbar=False)
+            with fits.open(filename) as f:
+                noise = f[0].data - noiseless
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+        assert np.isclose(
+            np.std(noise),
+            m_init.noise.target_rms.to_value(U.Jy * U.beam**-1),
+            rtol=0.2,
+        )
+
+    def test_stream_invalid_arguments(self, m_init):
+        """
+        Check that invalid arguments are rejected and existing files are not
+        overwritten unless requested.
+        """
+        with pytest.raises(ValueError, match="channel_block must be at least 1"):
+            m_init.stream_to_fits("streamed_cube.fits", channel_block=0)
+        filename = "streamed_cube.fits"
+        try:
+            open(filename, "w").close()
+            with pytest.raises(OSError, match="already exists"):
+                m_init.stream_to_fits(filename, overwrite=False)
+            assert os.path.getsize(filename) == 0
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    @pytest.mark.parametrize("channel_block", (3, 64))
+    def test_write_fits_blocks(self, m, channel_block):
+        """
+        Check that writing a cube to FITS in blocks of channels gives the datacube
+        contents, in double or single precision.
+        """
+        filenames = {bitpix: f"cube_{-bitpix}.fits" for bitpix in (-64, -32)}
+        try:
+            for bitpix, filename in filenames.items():
+                m.write_fits(filename, bitpix=bitpix, channel_block=channel_block)
+            with fits.open(filenames[-64]) as f, fits.open(filenames[-32]) as g:
+                f.verify("exception")
+                g.verify("exception")
+                assert f[0].header["BITPIX"] == -64
+                assert g[0].header["BITPIX"] == -32
+                assert g[0].data.dtype.itemsize == 4
+                expected = m.datacube._array.to_value(U.Unit(f[0].header["BUNIT"])).T
+                assert np.array_equal(f[0].data, expected)
+                assert np.allclose(g[0].data, expected, rtol=1e-6)
+                assert np.isclose(f[0].header["DATAMAX"], expected.max())
+                assert np.isclose(f[0].header["DATAMIN"], expected.min())
+            assert os.path.getsize(filenames[-32]) < os.path.getsize(filenames[-64])
+        finally:
+            for filename in filenames.values():
+                if os.path.exists(filename):
+                    os.remove(filename)
+
+    def test_write_fits_invalid_arguments(self, m):
+        """
+        Check that an unsupported data type or block size is rejected.
+        """
+        filename = "cube.fits"
+        try:
+            with pytest.raises(ValueError, match="bitpix"):
+                m.write_fits(filename, bitpix=16)
+            with pytest.raises(ValueError, match="channel_block must be at least 1"):
+                m.write_fits(filename, channel_block=0)
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+
+class TestMemmap:
+    def test_memmap_consistent_with_memory(self, many_particle_source, tmp_path):
+        """
+        Check that a mock observation with the datacube array in a memory-mapped file
+        matches one held in memory, and that the array stays in the file throughout.
+        """
+        cubes = []
+        for memmap_dir in (None, tmp_path):
+            m = Martini(
+                source=many_particle_source(),
+                datacube=DataCube(
+                    n_px_x=16,
+                    n_px_y=16,
+                    n_channels=16,
+                    spectral_centre=3 * 70 * U.km / U.s,
+                    memmap_dir=memmap_dir,
+                ),
+                beam=GaussianBeam(),
+                noise=GaussianNoise(rms=1.0e-6 * U.Jy * U.beam**-1, seed=0),
+                sph_kernel=_GaussianKernel(),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+            )
+            if memmap_dir is not None:
+                padded_array = m.datacube._array
+                assert isinstance(padded_array.base, np.memmap)
+            m.insert_source_in_cube(skip_validation=True, progressbar=False)
+            m.add_noise()
+            m.convolve_beam()
+            cubes.append(m.datacube._array)
+        # the final array is a view of the padded array allocated in the file
+        assert np.shares_memory(cubes[1], padded_array)
+        assert cubes[1].unit == cubes[0].unit
+        assert cubes[0].sum() > 0
+        assert U.allclose(cubes[1], cubes[0])
+
+
+class TestSinglePrecision:
+    @staticmethod
+    def make_martini(source, dtype=None, datacube_dtype=np.float64, banded=False):
+        """
+        Make a small mock observation.
+
+        Parameters
+        ----------
+        source : ~martini.sources.sph_source.SPHSource
+            The source to observe.
+
+        dtype : type, optional
+            Precision of the calculation. (Default: ``None``)
+
+        datacube_dtype : type, optional
+            Precision of the datacube given to Martini. (Default: ``numpy.float64``)
+
+        banded : bool, optional
+            Whether the spectral model stores banded spectra. (Default: ``False``)
+
+        Returns
+        -------
+        out : ~martini.martini.Martini
+            The Martini instance.
+        """
+        return Martini(
+            source=source,
+            datacube=DataCube(
+                n_px_x=16,
+                n_px_y=16,
+                n_channels=16,
+                spectral_centre=3 * 70 * U.km / U.s,
+                dtype=datacube_dtype,
+            ),
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=_CubicSplineKernel(),
+            spectral_model=GaussianSpectrum(banded=banded),
+            quiet=True,
+            dtype=dtype,
+        )
+
+    @pytest.mark.parametrize("engine", ("pixel", "particle"))
+    @pytest.mark.parametrize("banded", (False, True))
+    def test_accuracy(self, many_particle_source, engine, banded):
+        """
+        Check that a mock observation in single precision stays in single precision
+        and agrees with one in double precision to about one part in 10^5 of the
+        brightest pixel.
+        """
+        cubes = dict()
+        for dtype in (np.float64, np.float32):
+            m = self.make_martini(many_particle_source(), dtype=dtype, banded=banded)
+            assert m._spectra.dtype == dtype
+            assert m._pixcoords.dtype == dtype
+            assert m._sm_lengths.dtype == dtype
+            m.insert_source_in_cube(
+                engine=engine, skip_validation=True, progressbar=False
+            )
+            assert m.datacube._array.dtype == dtype
+            m.convolve_beam()
+            assert m.datacube._array.dtype == dtype
+            cubes[dtype] = m.datacube._array
+        assert cubes[np.float64].sum() > 0
+        assert cubes[np.float32].unit == cubes[np.float64].unit
+        assert np.allclose(
+            cubes[np.float32].value,
+            cubes[np.float64].value,
+            rtol=0,
+            atol=1e-5 * cubes[np.float64].value.max(),
+        )
+
+    def test_dtype_from_datacube(self, many_particle_source):
+        """
+        Check that the precision of the datacube is used by default, and that the
+        datacube is converted if another precision is requested.
+        """
+        m = self.make_martini(many_particle_source(), datacube_dtype=np.float32)
+        assert m.dtype == np.float32
+        assert m.datacube._array.dtype == np.float32
+        assert m.spectral_model.spec_dtype == np.float32
+        m.reset()
+        assert m.datacube._array.dtype == np.float32
+        m = self.make_martini(
+            many_particle_source(), dtype=np.float64, datacube_dtype=np.float32
+        )
+        assert m.datacube.dtype == np.float64
+        assert m.datacube._array.dtype == np.float64
+        with pytest.raises(ValueError, match="dtype must be"):
+            self.make_martini(many_particle_source(), dtype=np.int64)
+
+    def test_fits_precision(self, many_particle_source):
+        """
+        Check that FITS output is in the precision of the datacube unless requested
+        otherwise.
+        """
+        m = self.make_martini(many_particle_source(), dtype=np.float32)
+        m.insert_source_in_cube(skip_validation=True, progressbar=False)
+        m.convolve_beam()
+        filename = "cube.fits"
+        try:
+            for bitpix, expected in ((None, -32), (-64, -64)):
+                m.write_fits(filename, bitpix=bitpix)
+                with fits.open(filename) as f:
+                    assert f[0].header["BITPIX"] == expected
+                    assert np.allclose(f[0].data, m.datacube._array.value.T)
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+
+class TestCheckpoint:
+    @staticmethod
+    def make_martini(source):
+        """
+        Make a small mock observation.
+
+        Parameters
+        ----------
+        source : ~martini.sources.sph_source.SPHSource
+            The source to observe.
+
+        Returns
+        -------
+        out : ~martini.martini.Martini
+            The mock observation, with its source not yet inserted.
+        """
+        return Martini(
+            source=source,
+            datacube=DataCube(
+                n_px_x=40, n_px_y=40, n_channels=16, spectral_centre=source.vsys
+            ),
+            beam=GaussianBeam(),
+            noise=None,
+            sph_kernel=_GaussianKernel(),
+            spectral_model=GaussianSpectrum(),
+            quiet=True,
+        )
+
+    @pytest.mark.parametrize(
+        "ncpu, backend", ((1, "process"), (2, "thread"), (2, "process"))
+    )
+    def test_resume(self, many_particle_source, tmp_path, monkeypatch, ncpu, backend):
+        """
+        Check that an interrupted insertion resumes from its checkpoint, skipping the
+        completed pixels, and gives the same result as an uninterrupted insertion.
+        """
+        pytest.importorskip("h5py", reason="h5py (optional dependency) not available.")
+        if backend == "process":
+            pytest.importorskip(
+                "multiprocess",
+                reason="multiprocess (optional dependency) not available.",
+            )
+        if ncpu == 1:
+            backend = "process"
+        checkpoint = str(tmp_path / "checkpoint.hdf5")
+        m_reference = self.make_martini(many_particle_source())
+        m_reference.insert_source_in_cube(skip_validation=True, progressbar=False)
+
+        class Interrupted(Exception):
+            """
+            Stands in for the job being stopped.
+            """
+
+        update = Checkpoint.update
+        calls = []
+
+        def interrupting_update(self, ij_pxs, datacube):
+            """
+            Record the completed pixels, then stop the insertion after a few tiles.
+
+            Parameters
+            ----------
+            ij_pxs : list
+                The completed pixels.
+
+            datacube : ~martini.datacube.DataCube
+                The datacube being filled.
+            """
+            update(self, ij_pxs, datacube)
+            calls.append(len(ij_pxs))
+            if len(calls) >= 2:
+                raise Interrupted
+
+        monkeypatch.setattr(Checkpoint, "update", interrupting_update)
+        with pytest.raises(Interrupted):
+            self.make_martini(many_particle_source()).insert_source_in_cube(
+                skip_validation=True,
+                progressbar=False,
+                ncpu=ncpu,
+                backend=backend,
+                checkpoint=checkpoint,
+                checkpoint_interval=0,
+            )
+        monkeypatch.undo()
+        assert os.path.exists(checkpoint)
+
+        evaluated = []
+        evaluate_pixel_spectrum = Martini._evaluate_pixel_spectrum
+
+        def counting_evaluate(self, ranks_and_ij_pxs, progressbar=True):
+            """
+            Count the pixels evaluated.
+
+            Parameters
+            ----------
+            ranks_and_ij_pxs : tuple
+                The rank and pixels to evaluate.
+
+            progressbar : bool, optional
+                Whether to display a progress bar. (Default: ``True``)
+
+            Returns
+            -------
+            out : list
+                The insertion slices and spectra of the pixels.
+            """
+            evaluated.append(len(ranks_and_ij_pxs[1]))
+            return evaluate_pixel_spectrum(
+                self, ranks_and_ij_pxs, progressbar=progressbar
+            )
+
+        monkeypatch.setattr(Martini, "_evaluate_pixel_spectrum", counting_evaluate)
+        m = self.make_martini(many_particle_source())
+        m.insert_source_in_cube(
+            skip_validation=True,
+            progressbar=False,
+            ncpu=ncpu,
+            backend=backend,
+            checkpoint=checkpoint,
+        )
+        if backend != "process" or ncpu == 1:
+            # evaluated in this process, the pixels restored were skipped
+            n_px = np.prod(m.datacube._array.shape[:2])
+            assert sum(evaluated) == n_px - sum(calls)
+        assert not os.path.exists(checkpoint)
+        assert m.datacube._array.sum() > 0
+        assert U.allclose(m.datacube._array, m_reference.datacube._array)
+
+    @pytest.mark.parametrize("memmap", (False, True))
+    def test_load_peak_memory(self, tmp_path, memmap):
+        """
+        Check that loading a checkpoint reads the array into the datacube without
+        holding copies of the whole cube in memory.
+        """
+        pytest.importorskip("h5py", reason="h5py (optional dependency) not available.")
+        rng = np.random.default_rng(seed=0)
+        checkpoint = Checkpoint(str(tmp_path / "checkpoint.hdf5"))
+        datacube = DataCube(n_px_x=32, n_px_y=32, n_channels=256)
+        checkpoint.load(datacube)
+        datacube._array[...] = rng.random(datacube._array.shape) * datacube._array.unit
+        checkpoint.done[:5] = True
+        checkpoint.save(datacube)
+        restored = DataCube(
+            n_px_x=32,
+            n_px_y=32,
+            n_channels=256,
+            memmap_dir=tmp_path if memmap else None,
+        )
+        tracemalloc.start()
+        try:
+            n_done = Checkpoint(checkpoint.filename).load(restored)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert n_done == 5 * 32
+        assert np.all(restored._array == datacube._array)
+        assert peak < restored._array.nbytes / 4
+
+    def test_invalid(self, many_particle_source, tmp_path):
+        """
+        Check that unsupported engines and mismatched checkpoint files are rejected.
+        """
+        pytest.importorskip("h5py", reason="h5py (optional dependency) not available.")
+        checkpoint = str(tmp_path / "checkpoint.hdf5")
+        m = self.make_martini(many_particle_source())
+        with pytest.raises(ValueError, match="checkpoint is only supported"):
+            m.insert_source_in_cube(
+                skip_validation=True, engine="particle", checkpoint=checkpoint
+            )
+        DataCube(n_px_x=4, n_px_y=4, n_channels=4).save_state(checkpoint)
+        with pytest.raises(ValueError, match="different source or configuration"):
+            m.insert_source_in_cube(skip_validation=True, checkpoint=checkpoint)
+        os.remove(checkpoint)
+        saved = Checkpoint(checkpoint)
+        saved.load(DataCube(n_px_x=4, n_px_y=4, n_channels=4))
+        saved.save(DataCube(n_px_x=4, n_px_y=4, n_channels=4))
+        with pytest.raises(ValueError, match="has an array of shape"):
+            Checkpoint(checkpoint).load(DataCube(n_px_x=8, n_px_y=8, n_channels=4))
+
+    @pytest.mark.parametrize("change", ("channels", "source"))
+    def test_fingerprint(self, many_particle_source, tmp_path, change):
+        """
+        Check that a checkpoint written for a datacube of the same shape but different
+        channels, or for a different source, is not resumed from.
+        """
+        pytest.importorskip("h5py", reason="h5py (optional dependency) not available.")
+        checkpoint = str(tmp_path / "checkpoint.hdf5")
+        m = self.make_martini(many_particle_source())
+        if change == "channels":
+            m_other = Martini(
+                source=many_particle_source(),
+                datacube=DataCube(
+                    n_px_x=40,
+                    n_px_y=40,
+                    n_channels=16,
+                    spectral_centre=m.source.vsys + 10 * U.km / U.s,
+                ),
+                beam=GaussianBeam(),
+                noise=None,
+                sph_kernel=_GaussianKernel(),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+            )
+        else:
+            source = many_particle_source()
+            source.mHI_g = 2 * source.mHI_g
+            m_other = self.make_martini(source)
+        assert m_other.datacube._array.shape == m.datacube._array.shape
+        assert m_other._checkpoint_fingerprint() != m._checkpoint_fingerprint()
+        assert m._checkpoint_fingerprint() == m._checkpoint_fingerprint()
+        saved = Checkpoint(checkpoint, fingerprint=m_other._checkpoint_fingerprint())
+        saved.load(m_other._datacube)
+        saved.save(m_other._datacube)
+        with pytest.raises(ValueError, match="different source or configuration"):
+            m.insert_source_in_cube(skip_validation=True, checkpoint=checkpoint)
+        assert os.path.exists(checkpoint)
+
 
 class TestGlobalProfile:
     @pytest.mark.parametrize("spectral_model", (DiracDeltaSpectrum, GaussianSpectrum))
@@ -773,6 +1963,65 @@ class TestGlobalProfile:
         else:
             assert GlobalProfile(**kwargs).source.npart == 1
 
+    @pytest.mark.parametrize(
+        "spectral_model", (GaussianSpectrum(), GaussianSpectrum(sigma="thermal"))
+    )
+    @pytest.mark.parametrize("freq_channels", (False, True))
+    def test_direct(self, spectral_model, freq_channels, many_particle_source):
+        """
+        Check that the spectrum calculated directly from the particle velocities matches
+        the spectrum from source insertion.
+        """
+        source = many_particle_source()
+        spectral_centre = source.vsys
+        channel_width = 4 * U.km / U.s
+        if freq_channels:
+            spectral_centre = spectral_centre.to(
+                U.Hz, equivalencies=U.doppler_radio(HIfreq)
+            )
+            channel_width = 20 * U.kHz
+        kwargs = dict(
+            spectral_model=spectral_model,
+            n_channels=32,
+            channel_width=channel_width,
+            spectral_centre=spectral_centre,
+            quiet=True,
+        )
+        m = GlobalProfile(source=many_particle_source(), **kwargs)
+        m_direct = GlobalProfile(source=source, direct=True, **kwargs)
+        assert m_direct.sph_kernel is None
+        # far tails of summed cumulative distributions lose some relative precision
+        assert U.allclose(m_direct.spectrum, m.spectrum, atol=1e-10 * m.spectrum.max())
+        # datacube is left empty
+        assert m_direct._datacube._array.sum() == 0
+
+    def test_direct_dirac_delta(self, many_particle_source):
+        """
+        Check that the spectrum calculated directly for a Dirac-delta spectral model is
+        a histogram of the particle velocities weighted by their fluxes.
+        """
+        source = many_particle_source()
+        m = GlobalProfile(
+            source=source,
+            spectral_model=DiracDeltaSpectrum(),
+            n_channels=32,
+            channel_width=4 * U.km / U.s,
+            spectral_centre=source.vsys,
+            direct=True,
+        )
+        edges = m.velocity_channel_edges
+        # np.histogram needs increasing bins
+        order = np.s_[::-1] if edges[0] > edges[-1] else np.s_[:]
+        weights = (m.source.mHI_g / m.source.skycoords.distance**2).to_value(
+            U.Msun / U.Mpc**2
+        )
+        histogram = np.histogram(
+            m.source.skycoords.radial_velocity, bins=edges[order], weights=weights
+        )[0][order]
+        assert np.allclose(
+            m.spectrum / m.spectrum.max(), histogram / histogram.max(), rtol=1.0e-10
+        )
+
     def test_reset(self, gp):
         """
         Check that resetting global profile instance zeros out datacube and spectrum.
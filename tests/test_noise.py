@@ -17,6 +17,25 @@ class TestNoise:
         noise = noise_generator.generate(datacube, beam)
         assert noise.shape == datacube._array.shape
 
+    def test_noise_dtype(self):
+        """
+        Check that noise has the precision of the datacube array, and the same
+        amplitude in single and double precision.
+        """
+        rms = 1.0 * U.Jy * U.beam**-1
+        beam = GaussianBeam()
+        noise = {
+            dtype: GaussianNoise(rms=rms, seed=0).generate(
+                DataCube(n_px_x=64, n_px_y=64, n_channels=16, dtype=dtype), beam
+            )
+            for dtype in (np.float64, np.float32)
+        }
+        for dtype, noise_cube in noise.items():
+            assert noise_cube.dtype == dtype
+        assert U.isclose(
+            np.std(noise[np.float32]), np.std(noise[np.float64]), rtol=0.01
+        )
+
     def test_noise_amplitude(self, m_init):
         """
         Check that we generate noise with correct amplitude.
@@ -7,7 +7,14 @@ from martini.datacube import DataCube
 from martini.sources import SPHSource
 from martini.sources._cartesian_translation import translate, translate_d
 from martini.sources._L_align import L_align
-from astropy.coordinates import CartesianRepresentation, CartesianDifferential
+from martini.sources._lazy_columns import LazyColumns
+from astropy.coordinates import (
+    CartesianRepresentation,
+    CartesianDifferential,
+    FK5,
+    LSRK,
+    SkyCoord,
+)
 from martini.__version__ import __version__
 
 
@@ -83,6 +90,80 @@ class TestSourceUtilities:
         assert U.allclose(cd_translated.get_d_xyz(), translation)
 
 
+class TestLazyColumns:
+    @pytest.fixture
+    def columns(self, tmp_path):
+        """
+        Create an HDF5 file with particle properties and open it lazily.
+
+        Parameters
+        ----------
+        tmp_path : pathlib.Path
+            Temporary directory.
+
+        Yields
+        ------
+        out : tuple
+            A 2-tuple containing the
+            :class:`~martini.sources._lazy_columns.LazyColumns` instance (reading
+            in blocks of 7 rows) and a :obj:`dict` of the arrays in the file.
+        """
+        h5py = pytest.importorskip(
+            "h5py", reason="h5py (optional dependency) not available."
+        )
+        rng = np.random.default_rng(seed=0)
+        data = dict(
+            Coordinates=rng.uniform(-10, 10, size=(100, 3)),
+            Masses=rng.uniform(size=100),
+        )
+        with h5py.File(tmp_path / "particles.hdf5", "w") as f:
+            group = f.create_group("PartType0")
+            for field, values in data.items():
+                group.create_dataset(field, data=values)
+            group.create_group("Subgroup")
+        with h5py.File(tmp_path / "particles.hdf5", "r") as f:
+            yield LazyColumns(f["PartType0"], block_size=7), data
+
+    def test_read_all(self, columns):
+        """
+        Check that all particles are read if none have been selected.
+        """
+        lazy, data = columns
+        assert lazy.n_rows == lazy.n_selected == 100
+        assert np.array_equal(lazy.read("Masses"), data["Masses"])
+        assert np.array_equal(
+            lazy.read("Coordinates", column=2), data["Coordinates"][:, 2]
+        )
+
+    def test_select(self, columns):
+        """
+        Check that successive selections narrow down the particles read.
+        """
+        lazy, data = columns
+        lazy.select("Coordinates", lambda xyz: np.sum(xyz**2, axis=1) < 8**2)
+        lazy.select("Coordinates", lambda x: x > 0, column=0)
+        expected = np.logical_and(
+            np.sum(data["Coordinates"] ** 2, axis=1) < 8**2,
+            data["Coordinates"][:, 0] > 0,
+        )
+        assert 0 < lazy.n_selected < 100
+        assert np.array_equal(lazy.mask, expected)
+        assert np.array_equal(lazy.read("Masses"), data["Masses"][expected])
+        assert np.array_equal(lazy.read("Coordinates"), data["Coordinates"][expected])
+        assert np.array_equal(
+            lazy.read("Coordinates", column=1), data["Coordinates"][expected, 1]
+        )
+
+    def test_select_none(self, columns):
+        """
+        Check that an empty selection reads empty arrays.
+        """
+        lazy, data = columns
+        lazy.select("Masses", lambda m: m > 2)
+        assert lazy.n_selected == 0
+        assert lazy.read("Coordinates").shape == (0, 3)
+
+
 class TestSPHSource:
     def test_coordinate_input(self):
         """
@@ -237,6 +318,42 @@ class TestSPHSource:
         ]
         assert not all(ax_equal)
 
+    def test_init_skycoords_out_of_place(self, s):
+        """
+        Check that the sky coordinates are calculated without modifying the particle
+        coordinates, and match those of the particles moved to their sky positions.
+        """
+        initial_coords = s.coordinates_g
+        xyz, vxyz = s._sky_frame_coordinates()
+        s._init_skycoords()
+        assert s.coordinates_g is initial_coords
+        expected = SkyCoord(
+            CartesianRepresentation(
+                xyz, differentials={"s": CartesianDifferential(vxyz)}
+            ),
+            frame=s.coordinate_frame,
+        )
+        for skycoords in (
+            (s.skycoords, expected),
+            (s.skycoords.transform_to(LSRK()), expected.transform_to(LSRK())),
+        ):
+            assert U.allclose(skycoords[0].ra, skycoords[1].ra)
+            assert U.allclose(skycoords[0].dec, skycoords[1].dec)
+            assert U.allclose(skycoords[0].distance, skycoords[1].distance)
+            assert U.allclose(
+                skycoords[0].pm_ra_cosdec,
+                skycoords[1].pm_ra_cosdec,
+                atol=1e-9 * U.mas / U.yr,
+            )
+            assert U.allclose(
+                skycoords[0].pm_dec, skycoords[1].pm_dec, atol=1e-9 * U.mas / U.yr
+            )
+            assert U.allclose(
+                skycoords[0].radial_velocity,
+                skycoords[1].radial_velocity,
+                atol=1e-9 * U.km / U.s,
+            )
+
     def test_init_pixcoords(self):
         """
         Check that pixel coordinates are accurately calculated from angular positions and
@@ -286,6 +403,84 @@ class TestSPHSource:
             atol=1e-4 * U.pix,
         )
 
+    @pytest.mark.parametrize("projection", ("TAN", "SIN"))
+    @pytest.mark.parametrize("channel_width", (4 * U.km / U.s, 20 * U.kHz))
+    @pytest.mark.parametrize(
+        "ra, dec", ((0 * U.deg, 0 * U.deg), (30 * U.deg, -60 * U.deg))
+    )
+    def test_fast_projection(self, projection, channel_width, ra, dec):
+        """
+        Check that the fast calculation of sky and pixel coordinates agrees with the
+        calculation with astropy.
+        """
+        rng = np.random.default_rng(seed=0)
+        source = SPHSource(
+            distance=5 * U.Mpc,
+            ra=ra + 0.01 * U.deg,
+            dec=dec - 0.01 * U.deg,
+            rotation={"L_coords": (60 * U.deg, 30 * U.deg)},
+            T_g=np.ones(1000) * 1e4 * U.K,
+            mHI_g=np.ones(1000) * 1e4 * U.Msun,
+            xyz_g=rng.normal(size=(1000, 3)) * 10 * U.kpc,
+            vxyz_g=rng.normal(size=(1000, 3)) * 100 * U.km / U.s,
+            hsm_g=np.ones(1000) * U.kpc,
+        )
+        datacube = DataCube(
+            n_px_x=32,
+            n_px_y=32,
+            n_channels=32,
+            px_size=20 * U.arcsec,
+            channel_width=channel_width,
+            spectral_centre=source.vsys,
+            ra=ra,
+            dec=dec,
+        )
+        datacube.wcs.wcs.ctype = [
+            f"RA---{projection}",
+            f"DEC--{projection}",
+            datacube.wcs.wcs.ctype[2],
+        ]
+        assert source._fast_projection_supported(datacube)
+        source._init_skycoords()
+        source._init_pixcoords(datacube)
+        skycoords, pixcoords = source.skycoords, source.pixcoords
+        source._init_skycoords(fast=True)
+        assert source.spectralcoords is None
+        assert U.allclose(source.skycoords.ra, skycoords.ra, atol=1e-9 * U.arcsec)
+        assert U.allclose(source.skycoords.dec, skycoords.dec, atol=1e-9 * U.arcsec)
+        assert U.allclose(source.skycoords.distance, skycoords.distance)
+        assert U.allclose(
+            source.skycoords.radial_velocity,
+            skycoords.radial_velocity,
+            atol=1e-6 * U.m / U.s,
+        )
+        source._init_pixcoords(datacube, fast=True)
+        assert U.allclose(source.pixcoords, pixcoords, atol=1e-6 * U.pix)
+
+    @pytest.mark.parametrize(
+        "datacube_kwargs, ctype",
+        (
+            (dict(), ("RA---TAN", "DEC--TAN", "VRAD")),
+            (dict(specsys="lsrk"), ("RA---TAN", "DEC--TAN", "VRAD")),
+            (dict(coordinate_frame=FK5()), ("RA---TAN", "DEC--TAN", "VRAD")),
+            (dict(), ("RA---CAR", "DEC--CAR", "VRAD")),
+            (dict(), ("RA---TAN", "DEC--TAN", "VOPT")),
+        ),
+    )
+    def test_fast_projection_supported(self, s, datacube_kwargs, ctype):
+        """
+        Check that the fast calculation of pixel coordinates is only used when the
+        data cube is supported.
+        """
+        datacube = DataCube(**datacube_kwargs)
+        datacube.wcs.wcs.ctype = ctype
+        supported = len(datacube_kwargs) == 0 and ctype == (
+            "RA---TAN",
+            "DEC--TAN",
+            "VRAD",
+        )
+        assert s._fast_projection_supported(datacube) == supported
+
     @pytest.mark.parametrize("ra", (0 * U.deg, 30 * U.deg, -30 * U.deg))
     @pytest.mark.parametrize("dec", (0 * U.deg, 30 * U.deg, -30 * U.deg))
     def test_sky_location(self, ra, dec):
@@ -331,6 +526,46 @@ class TestSPHSource:
             s.coordinates_g.differentials["s"].get_d_xyz(),
         )
 
+    def test_index_particles(self, s):
+        """
+        Check that particle arrays can be reordered.
+        """
+        s.mHI_g = np.arange(s.npart) * U.Msun
+        s._init_skycoords()
+        order = np.arange(s.npart)[::-1]
+        xyz_before = s.coordinates_g.get_xyz()
+        s._index_particles(order)
+        assert s.npart == order.size
+        assert U.allclose(s.mHI_g, order * U.Msun)
+        assert U.allclose(s.coordinates_g.get_xyz(), xyz_before[:, order])
+        assert s.skycoords.size == order.size
+
+    def test_merge_particles(self, s):
+        """
+        Check that groups of particles are merged with mass-weighted properties.
+        """
+        s.mHI_g = np.arange(1, s.npart + 1) * U.Msun
+        s.T_g = np.arange(1, s.npart + 1) * U.K
+        s._init_skycoords()
+        # merge the first three particles, keep the others
+        labels = np.r_[0, 0, 0, np.arange(1, s.npart - 2)]
+        mHI_before = s.mHI_g.copy()
+        xyz_before = s.coordinates_g.get_xyz()
+        s._merge_particles(labels)
+        assert s.npart == labels.max() + 1
+        assert s.skycoords is None and s.pixcoords is None
+        assert U.isclose(s.mHI_g.sum(), mHI_before.sum())
+        assert U.isclose(s.mHI_g[0], mHI_before[:3].sum())
+        assert U.isclose(
+            s.T_g[0],
+            (mHI_before[:3] * np.arange(1, 4) * U.K).sum() / mHI_before[:3].sum(),
+        )
+        assert U.allclose(
+            s.coordinates_g.get_xyz()[:, 0],
+            (xyz_before[:, :3] * mHI_before[:3]).sum(axis=1) / mHI_before[:3].sum(),
+        )
+        assert U.allclose(s.coordinates_g.get_xyz()[:, 1:], xyz_before[:, 3:])
+
     def test_apply_badmask(self, s):
         """
         Check that bad masks are rejected.
@@ -557,6 +792,60 @@ class TestSimbaSource:
             in nb_content
         )
 
+    def test_aperture_selection(self, tmp_path):
+        """
+        Check that only the particles in the aperture are loaded, accounting for the
+        periodic box.
+        """
+        h5py = pytest.importorskip(
+            "h5py", reason="h5py (optional dependency) not available."
+        )
+        from martini.sources import SimbaSource
+
+        rng = np.random.default_rng(seed=0)
+        n, a, h, lbox = 1000, 1.0, 0.7, 1000.0
+        xyz = rng.uniform(0, lbox, size=(n, 3))
+        masses = rng.uniform(size=n)
+        centre = np.array([10.0, 500.0, 990.0])  # near the box edges
+        with h5py.File(tmp_path / "snap.hdf5", "w") as f:
+            f.create_group("Header")
+            f["Header"].attrs.update(dict(Time=a, HubbleParam=h, BoxSize=lbox))
+            gas = f.create_group("PartType0")
+            gas["Coordinates"] = xyz
+            gas["Velocities"] = rng.normal(size=(n, 3))
+            gas["Metallicity"] = np.tile([0.01, 0.25, 0.0], (n, 1))
+            gas["ElectronAbundance"] = np.ones(n)
+            gas["InternalEnergy"] = np.ones(n) * 1e3
+            gas["SmoothingLength"] = np.ones(n)
+            gas["Masses"] = masses
+            gas["GrackleHI"] = np.ones(n) * 0.5
+        with h5py.File(tmp_path / "groups.hdf5", "w") as f:
+            f["galaxy_data/GroupID"] = np.array([3, 7])
+            f["galaxy_data/minpotpos"] = np.array([np.zeros(3), centre])
+            f["galaxy_data/vel"] = np.zeros((2, 3))
+        aperture = 300 * U.kpc
+        source = SimbaSource(
+            snapPath=str(tmp_path),
+            snapName="snap.hdf5",
+            groupPath=str(tmp_path),
+            groupName="groups.hdf5",
+            groupID=7,
+            aperture=aperture,
+        )
+        # minpotpos has no h^-1, coordinates do
+        offsets = xyz / h - centre
+        offsets = (offsets + lbox / h / 2) % (lbox / h) - lbox / h / 2
+        expected = np.sum((offsets * a) ** 2, axis=1) < aperture.to_value(U.kpc) ** 2
+        assert 0 < np.count_nonzero(expected) < n
+        assert source.npart == np.count_nonzero(expected)
+        assert U.allclose(
+            source.mHI_g.sum(),
+            np.sum(masses[expected] * 0.74 * 0.5) * 1e10 / h * U.Msun,
+        )
+        assert (
+            np.sqrt(np.sum(source.coordinates_g.get_xyz() ** 2, axis=0)) < aperture
+        ).all()
+
     @pytest.mark.skipif(
         not os.path.isfile("examples/m25n512_151.hdf5")
         or not os.path.isfile("examples/snap_m25n512_151.hdf5"),
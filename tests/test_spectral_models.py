@@ -1,7 +1,7 @@
 import pytest
 import numpy as np
-from martini import DataCube
-from martini.spectral_models import GaussianSpectrum, DiracDeltaSpectrum
+from martini.datacube import DataCube, HIfreq
+from martini.spectral_models import GaussianSpectrum, DiracDeltaSpectrum, _BaseSpectrum
 from astropy import units as U
 
 spectral_models = GaussianSpectrum, DiracDeltaSpectrum
@@ -81,7 +81,8 @@ class TestGaussianSpectrum:
         for column in extra_data["sigma"].T:
             assert U.allclose(column, spectral_model.half_width(source))
         expected_rows = 1 if sigma != "thermal" else source.npart
-        assert extra_data["sigma"].shape == (expected_rows, datacube.n_channels)
+        # broadcasts against channel edges, not expanded to full shape:
+        assert extra_data["sigma"].shape == (expected_rows, 1)
 
 
 class TestDiracDeltaSpectrum:
@@ -176,3 +177,212 @@ class TestParallelSpectra:
         assert U.allclose(
             spectral_model_serial.spectra, spectral_model_parallel.spectra
         )
+
+    @pytest.mark.parametrize(
+        "SpectralModel, kwargs",
+        (
+            (GaussianSpectrum, dict()),
+            (GaussianSpectrum, dict(sigma="thermal")),
+            (DiracDeltaSpectrum, dict()),
+        ),
+    )
+    def test_thread_spectra(self, SpectralModel, kwargs, many_particle_source):
+        """
+        Check that spectra calculated with a thread pool are consistent with serial,
+        including when the spectral model uses per-particle extra data.
+        """
+        source = many_particle_source()
+        source._init_skycoords()
+        datacube = DataCube()
+        spectral_model_serial = SpectralModel(**kwargs)
+        spectral_model_threaded = SpectralModel(
+            ncpu=2, chunk_size=7, backend="thread", **kwargs
+        )
+        spectral_model_serial.init_spectra(source, datacube)
+        spectral_model_threaded.init_spectra(source, datacube)
+        assert U.allclose(
+            spectral_model_serial.spectra, spectral_model_threaded.spectra
+        )
+
+    def test_invalid_backend(self):
+        """
+        Check that an unknown parallel backend raises.
+        """
+        with pytest.raises(ValueError, match="backend must be one of"):
+            GaussianSpectrum(backend="mpi")
+
+
+class TestBandedSpectra:
+    @pytest.mark.parametrize(
+        "SpectralModel, kwargs",
+        (
+            (GaussianSpectrum, dict(sigma=7.0 * U.km / U.s)),
+            (GaussianSpectrum, dict(sigma="thermal")),
+            (DiracDeltaSpectrum, dict()),
+        ),
+    )
+    @pytest.mark.parametrize("freq_channels", (False, True))
+    def test_banded_consistent_with_dense(
+        self, SpectralModel, kwargs, freq_channels, many_particle_source
+    ):
+        """
+        Check that banded spectra match the full spectra within their bands, and that
+        the full spectra are negligible outside of the bands.
+        """
+        source = many_particle_source()
+        source._init_skycoords()
+        spectral_centre = source.vsys
+        if freq_channels:
+            spectral_centre = spectral_centre.to(
+                U.Hz, equivalencies=U.doppler_radio(HIfreq)
+            )
+        datacube = DataCube(
+            n_channels=64, channel_width=4 * U.km / U.s, spectral_centre=spectral_centre
+        )
+        spectral_model_dense = SpectralModel(**kwargs)
+        spectral_model_banded = SpectralModel(banded=True, **kwargs)
+        spectral_model_dense.init_spectra(source, datacube)
+        spectral_model_banded.init_spectra(source, datacube)
+        band_width = spectral_model_banded.band_width
+        assert band_width < datacube.n_channels
+        assert spectral_model_banded.spectra.shape == (source.npart, band_width)
+        offsets = spectral_model_banded.spectra_offsets
+        assert (offsets >= 0).all()
+        assert (offsets + band_width <= datacube.n_channels).all()
+        expanded = np.zeros(spectral_model_dense.spectra.shape) * U.Jy
+        for ip in range(source.npart):
+            expanded[ip, offsets[ip] : offsets[ip] + band_width] = (
+                spectral_model_banded.spectra[ip]
+            )
+        assert U.allclose(
+            expanded,
+            spectral_model_dense.spectra,
+            atol=1.0e-8 * spectral_model_dense.spectra.max(),
+        )
+
+    def test_banded_falls_back_to_dense(self, single_particle_source):
+        """
+        Check that full spectra are stored if the band would be wider than the cube.
+        """
+        source = single_particle_source()
+        source._init_skycoords()
+        spectral_model = GaussianSpectrum(sigma=50 * U.km / U.s, banded=True)
+        datacube = DataCube(
+            n_channels=16, channel_width=4 * U.km / U.s, spectral_centre=source.vsys
+        )
+        spectral_model.init_spectra(source, datacube)
+        assert spectral_model.spectra_offsets is None
+        assert spectral_model.band_width is None
+        assert spectral_model.spectra.shape == (source.npart, datacube.n_channels)
+
+
+class TestChunkedSpectra:
+    @pytest.mark.parametrize("SpectralModel", spectral_models)
+    @pytest.mark.parametrize("banded", (False, True))
+    @pytest.mark.parametrize("chunk_size", (1, 7, 1000))
+    def test_chunked_consistent_with_unchunked(
+        self, SpectralModel, banded, chunk_size, many_particle_source
+    ):
+        """
+        Check that evaluating spectra in blocks of particles gives the same result as
+        evaluating them all at once.
+        """
+        source = many_particle_source()
+        source._init_skycoords()
+        datacube = DataCube(
+            n_channels=64, channel_width=4 * U.km / U.s, spectral_centre=source.vsys
+        )
+        spectral_model = SpectralModel(banded=banded)
+        spectral_model_chunked = SpectralModel(banded=banded, chunk_size=chunk_size)
+        spectral_model.init_spectra(source, datacube)
+        spectral_model_chunked.init_spectra(source, datacube)
+        assert spectral_model_chunked.spectra.shape == spectral_model.spectra.shape
+        assert U.allclose(spectral_model_chunked.spectra, spectral_model.spectra)
+
+    @pytest.mark.parametrize("SpectralModel", spectral_models)
+    def test_parallel_chunked_spectra(self, SpectralModel, many_particle_source):
+        """
+        Check that spectra evaluated in blocks in parallel are consistent with serial.
+        """
+        pytest.importorskip(
+            "multiprocess", reason="multiprocess (optional dependency) not available."
+        )
+        source = many_particle_source()
+        source._init_skycoords()
+        datacube = DataCube()
+        spectral_model_serial = SpectralModel()
+        spectral_model_parallel = SpectralModel(ncpu=2, chunk_size=30)
+        spectral_model_serial.init_spectra(source, datacube)
+        spectral_model_parallel.init_spectra(source, datacube)
+        assert U.allclose(
+            spectral_model_serial.spectra, spectral_model_parallel.spectra
+        )
+
+
+class TestGlobalSpectrum:
+    @pytest.mark.parametrize(
+        "SpectralModel, kwargs",
+        (
+            (GaussianSpectrum, dict(sigma=7.0 * U.km / U.s)),
+            (GaussianSpectrum, dict(sigma="thermal")),
+            (DiracDeltaSpectrum, dict()),
+        ),
+    )
+    @pytest.mark.parametrize("freq_channels", (False, True))
+    @pytest.mark.parametrize("chunk_size", (None, 7))
+    @pytest.mark.parametrize("generic", (False, True))
+    def test_global_spectrum(
+        self,
+        SpectralModel,
+        kwargs,
+        freq_channels,
+        chunk_size,
+        generic,
+        many_particle_source,
+    ):
+        """
+        Check that the global spectrum is the sum of the spectra of the particles, for
+        the spectral models' own implementations and for the generic implementation.
+        """
+        source = many_particle_source()
+        source._init_skycoords()
+        spectral_centre = source.vsys
+        if freq_channels:
+            spectral_centre = spectral_centre.to(
+                U.Hz, equivalencies=U.doppler_radio(HIfreq)
+            )
+        datacube = DataCube(
+            n_channels=16, channel_width=4 * U.km / U.s, spectral_centre=spectral_centre
+        )
+        spectral_model = SpectralModel(**kwargs)
+        spectral_model.init_spectra(source, datacube)
+        spectral_model_global = SpectralModel(chunk_size=chunk_size, **kwargs)
+        if generic:
+            global_spectrum = _BaseSpectrum.global_spectrum(
+                spectral_model_global, source, datacube
+            )
+        else:
+            global_spectrum = spectral_model_global.global_spectrum(source, datacube)
+        assert global_spectrum.shape == (datacube.n_channels,)
+        assert U.allclose(global_spectrum, spectral_model.spectra.sum(axis=0))
+
+    @pytest.mark.parametrize("SpectralModel", spectral_models)
+    def test_banded_global_spectrum(self, SpectralModel, many_particle_source):
+        """
+        Check that the global spectrum accumulated from banded spectra is consistent
+        with the sum of the full spectra.
+        """
+        source = many_particle_source()
+        source._init_skycoords()
+        datacube = DataCube(
+            n_channels=64, channel_width=4 * U.km / U.s, spectral_centre=source.vsys
+        )
+        spectral_model = SpectralModel()
+        spectral_model.init_spectra(source, datacube)
+        spectral_model_banded = SpectralModel(banded=True)
+        global_spectrum = _BaseSpectrum.global_spectrum(
+            spectral_model_banded, source, datacube
+        )
+        assert spectral_model_banded.band_width < datacube.n_channels
+        expected = spectral_model.spectra.sum(axis=0)
+        assert U.allclose(global_spectrum, expected, atol=1.0e-8 * expected.max())
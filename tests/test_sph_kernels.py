@@ -1,3 +1,6 @@
+import os
+import sys
+import subprocess
 import pytest
 import numpy as np
 from martini import Martini, DataCube
@@ -17,6 +20,7 @@ from martini.sph_kernels import (
     QuarticSplineKernel,
     WendlandC6Kernel,
 )
+from martini import _kernel_accel
 from astropy import units as U
 
 # kernels that have a well-defined FWHM, i.e. not dirac-delta, adaptive
@@ -37,6 +41,21 @@ recommended_kernels = (
 )
 adaptive_kernels = recommended_kernels + (_AdaptiveKernel,)
 all_kernels = simple_kernels + adaptive_kernels
+# kernels offering a tabulated integral, with the documented accuracy bound
+tabulated_kernels = (
+    (_WendlandC2Kernel, 1e-7),
+    (_WendlandC6Kernel, 1e-6),
+    (_CubicSplineKernel, 2e-4),
+    (_QuarticSplineKernel, 1e-7),
+)
+# kernels offering a compiled integral, with the name of the integral
+compiled_kernels = (
+    (_WendlandC2Kernel, "wendland_c2"),
+    (_WendlandC6Kernel, "wendland_c6"),
+    (_CubicSplineKernel, "cubic_spline"),
+    (_QuarticSplineKernel, "quartic_spline"),
+    (_GaussianKernel, "gaussian"),
+)
 
 
 def total_kernel_weight(k, h, ngrid=50):
@@ -257,6 +276,166 @@ class TestSPHKernels:
             else:
                 m.sph_kernel._confirm_validation(quiet=True)  # should not raise
 
+    @pytest.mark.parametrize("kernel", simple_kernels)
+    def test_px_weight_value(self, kernel):
+        """
+        Check that the unitless kernel weights match those with units.
+        """
+        k = kernel()
+        rng = np.random.default_rng(seed=0)
+        dij = rng.uniform(-2, 2, size=(2, 100))
+        sm_lengths = rng.uniform(0.1, 2, size=100)
+        k.sm_lengths = sm_lengths * U.pix
+        mask = np.arange(0, 100, 3)
+        weights = k._px_weight(dij[:, mask] * U.pix, mask=mask)
+        weights_value = k._px_weight_value(dij[:, mask], sm_lengths, mask=mask)
+        assert isinstance(weights_value, np.ndarray)
+        assert not isinstance(weights_value, U.Quantity)
+        assert np.allclose(weights.to_value(U.pix**-2), weights_value)
+        assert weights_value.sum() > 0
+
+    def test_quantity_kernel_integral(self):
+        """
+        Check that kernels defined outside of martini with a kernel integral operating
+        on Quantity still work, and that martini's own kernels skip the units.
+        """
+
+        class QuantityKernel(_WendlandC2Kernel):
+            unitless_integral = False
+
+            def _kernel_integral(self, dij, h, mask=np.s_[...]):
+                assert isinstance(dij, U.Quantity) and isinstance(h, U.Quantity)
+                return (
+                    super()._kernel_integral(dij.to_value(U.pix), h.to_value(U.pix))
+                    * U.pix**-2
+                )
+
+        assert all(kernel.unitless_integral for kernel in all_kernels)
+        assert not QuantityKernel.unitless_integral
+        rng = np.random.default_rng(seed=0)
+        dij = rng.uniform(-2, 2, size=(2, 100))
+        sm_lengths = rng.uniform(0.1, 2, size=100)
+        for tabulate in (False, True):
+            assert np.allclose(
+                QuantityKernel(tabulate=tabulate)._px_weight_value(dij, sm_lengths),
+                _WendlandC2Kernel(tabulate=tabulate)._px_weight_value(dij, sm_lengths),
+            )
+
+    @pytest.mark.parametrize(("kernel", "bound"), tabulated_kernels)
+    def test_tabulated_integral(self, kernel, bound):
+        """
+        Check that the tabulated kernel integral agrees with the exact integral within
+        the documented accuracy.
+        """
+        k = kernel(tabulate=True)
+        rng = np.random.default_rng(seed=0)
+        h = rng.uniform(0.5, 5, size=100000)
+        # include offsets beyond the kernel support
+        dij = rng.uniform(-1.2, 1.2, size=(2, 100000)) * h
+        tabulated = k._pixel_integral(dij, h)
+        exact = k._kernel_integral(dij.copy(), h)
+        central = k._kernel_integral(np.zeros((2, 1)), np.ones(1))
+        assert np.all(np.abs(tabulated - exact) * h**2 < bound * central)
+        assert np.all(tabulated[np.sqrt(np.sum(dij**2, axis=0)) >= h] == 0)
+        # the table is shared between instances
+        assert kernel(tabulate=True)._kernel_table() is k._kernel_table()
+
+    @pytest.mark.parametrize(("kernel", "bound"), tabulated_kernels)
+    def test_tabulated_total_weight(self, kernel, bound):
+        """
+        Check that the tabulated kernel integral sums to 1 like the exact integral.
+        """
+        for h in (1.5, 3.0, 10.0):
+            assert np.isclose(
+                total_kernel_weight(kernel(tabulate=True), h),
+                total_kernel_weight(kernel(), h),
+                rtol=1e-4,
+            )
+
+    @pytest.mark.parametrize(("kernel", "name"), compiled_kernels)
+    def test_scalar_integral(self, kernel, name, monkeypatch):
+        """
+        Check that the single-pair kernel integrals, that are compiled if numba is
+        available, agree with the numpy kernel integrals.
+        """
+        monkeypatch.setattr(_kernel_accel, "use_compiled", False)
+        k = kernel()
+        rng = np.random.default_rng(seed=0)
+        h = rng.uniform(0.5, 5, size=10000)
+        dij = rng.uniform(-2.5, 2.5, size=(2, 10000)) * h
+        # include particles centred on the pixel
+        dij[:, :10] = 0
+        integral, nargs = _kernel_accel._integrals[name]
+        extra_args = (k.truncate, k.norm) if nargs == 5 else tuple()
+        assert np.allclose(
+            np.vectorize(integral)(dij[0], dij[1], h, *extra_args),
+            k._kernel_integral(dij.copy(), h),
+            rtol=1e-10,
+            atol=1e-10,
+        )
+
+    @pytest.mark.parametrize(("kernel", "name"), compiled_kernels)
+    def test_compiled_integral(self, kernel, name, monkeypatch):
+        """
+        Check that the compiled kernel integrals agree with the numpy kernel integrals.
+        """
+        pytest.importorskip("numba")
+        k = kernel()
+        rng = np.random.default_rng(seed=0)
+        h = rng.uniform(0.5, 5, size=10000)
+        dij = rng.uniform(-2.5, 2.5, size=(2, 10000)) * h
+        dij[:, :10] = 0
+        monkeypatch.setattr(_kernel_accel, "use_compiled", True)
+        assert _kernel_accel.compiled_integral(name) is not None
+        compiled = k._kernel_integral(dij.copy(), h)
+        monkeypatch.setattr(_kernel_accel, "use_compiled", False)
+        assert _kernel_accel.compiled_integral(name) is None
+        assert np.allclose(
+            compiled, k._kernel_integral(dij.copy(), h), rtol=1e-10, atol=1e-10
+        )
+
+    @pytest.mark.parametrize(("kernel", "name"), compiled_kernels)
+    @pytest.mark.parametrize("use_compiled", (True, False))
+    def test_integral_float32(self, kernel, name, use_compiled, monkeypatch):
+        """
+        Check that the kernel integrals stay in single precision for single precision
+        inputs, with and without the compiled integrals, and agree with the double
+        precision integrals within 1e-3 of the peak value (the closed form of the
+        Wendland C6 integral has the largest round-off errors).
+        """
+        if use_compiled:
+            pytest.importorskip("numba")
+        monkeypatch.setattr(_kernel_accel, "use_compiled", use_compiled)
+        k = kernel()
+        rng = np.random.default_rng(seed=0)
+        h = rng.uniform(0.5, 5, size=10000)
+        dij = rng.uniform(-2.5, 2.5, size=(2, 10000)) * h
+        dij[:, :10] = 0
+        expected = k._kernel_integral(dij.copy(), h)
+        result = k._kernel_integral(dij.astype(np.float32), h.astype(np.float32))
+        assert result.dtype == np.float32
+        assert np.allclose(result, expected, rtol=0, atol=1e-3 * expected.max())
+
+    @pytest.mark.parametrize(("value", "disabled"), (("1", True), ("0", False)))
+    def test_no_numba_environment_variable(self, value, disabled):
+        """
+        Check that setting MARTINI_NO_NUMBA disables the compiled kernel integrals
+        without importing numba, and that the kernels still work.
+        """
+        code = (
+            "import sys\n"
+            "import numpy as np\n"
+            "from martini import _kernel_accel\n"
+            "from martini.sph_kernels import _WendlandC2Kernel\n"
+            "assert _kernel_accel._no_numba is {disabled}\n"
+            "if {disabled}:\n"
+            "    assert 'numba' not in sys.modules\n"
+            "    assert _kernel_accel.compiled_integral('wendland_c2') is None\n"
+            "assert _WendlandC2Kernel()._kernel_integral(np.zeros((2, 1)), np.ones(1))"
+        ).format(disabled=disabled)
+        env = dict(os.environ, MARTINI_NO_NUMBA=value)
+        subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
 
 class TestAdaptiveKernels:
     @pytest.mark.parametrize(
@@ -292,6 +471,69 @@ class TestAdaptiveKernels:
         k._init_sm_lengths(source=source, datacube=adaptive_kernel_test_datacube)
         assert all(k.kernel_indices == np.array([0, 0, 2, 1]))
 
+    @pytest.mark.parametrize(
+        "kernel",
+        (
+            WendlandC2Kernel,
+            WendlandC6Kernel,
+            CubicSplineKernel,
+            QuarticSplineKernel,
+        ),
+    )
+    def test_tabulated_adaptive_kernel(
+        self, kernel, adaptive_kernel_test_source, adaptive_kernel_test_datacube
+    ):
+        """
+        Test that tabulation applies to the preferred kernel, and that weights match
+        those of the kernel without tabulation.
+        """
+        source = adaptive_kernel_test_source()
+        source._init_skycoords()
+        weights = list()
+        for tabulate in (False, True):
+            k = kernel(tabulate=tabulate)
+            assert k.kernels[0].tabulate == tabulate
+            assert not any(K.tabulate for K in k.kernels[1:])
+            k._init_sm_lengths(source=source, datacube=adaptive_kernel_test_datacube)
+            dij = np.vstack((np.linspace(0, 3, source.npart), np.zeros(source.npart)))
+            weights.append(
+                k._px_weight_value(
+                    dij, k.sm_lengths.to_value(U.pix), mask=np.arange(source.npart)
+                )
+            )
+        assert np.allclose(weights[1], weights[0], rtol=1e-3)
+
+    @pytest.mark.parametrize("kernel", recommended_kernels)
+    @pytest.mark.parametrize("engine", ("pixel", "particle"))
+    def test_presorted_adaptive_kernel(
+        self, kernel, engine, adaptive_kernel_test_source, adaptive_kernel_test_datacube
+    ):
+        """
+        Test that sorting the particles by kernel gives the same datacube, and that the
+        particles using each kernel are then contiguous.
+        """
+        arrays = list()
+        for presort in (False, True):
+            m = Martini(
+                source=adaptive_kernel_test_source(),
+                datacube=adaptive_kernel_test_datacube.copy(),
+                sph_kernel=kernel(presort=presort),
+                spectral_model=GaussianSpectrum(),
+                quiet=True,
+            )
+            if presort:
+                assert np.all(np.diff(m.sph_kernel.kernel_indices) >= 0)
+                assert np.all(
+                    m.sph_kernel.kernel_indices[m.sph_kernel._kernel_starts[1:-1]]
+                    >= np.arange(len(m.sph_kernel.kernels))
+                )
+                assert m.sph_kernel._kernel_starts[-1] == m.source.npart
+            else:
+                assert m.sph_kernel._kernel_starts is None
+            m.insert_source_in_cube(progressbar=False, engine=engine)
+            arrays.append(m._datacube._array)
+        assert U.allclose(arrays[1], arrays[0])
+
     def test_kernel_selection_Gaussian(
         self, adaptive_kernel_test_source, adaptive_kernel_test_datacube
     ):